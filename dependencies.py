@@ -1,19 +1,184 @@
 # dependencies.py
 import os
+import json
+import math
+import time
+import hashlib
+import threading
 from fastapi import Security, HTTPException
 from fastapi.security.api_key import APIKeyHeader
-from starlette.status import HTTP_403_FORBIDDEN
+from starlette.status import HTTP_403_FORBIDDEN, HTTP_429_TOO_MANY_REQUESTS
 from dotenv import load_dotenv
 
 load_dotenv('.env', override=True)
 API_KEY_HEADER = APIKeyHeader(name="x-api-key", auto_error=True)
 ACCESS_KEY = os.getenv('X_API_KEY')
 
+# Limit default per kelas route: rate (request/menit), burst (kapasitas bucket), concurrency
+DEFAULT_LIMITS = {
+    "llm": {"rate_per_minute": 20, "burst": 5, "concurrency": 2},
+    "forecast": {"rate_per_minute": 60, "burst": 20, "concurrency": 4},
+    "default": {"rate_per_minute": 300, "burst": 60, "concurrency": 16},
+}
+
+
+def _load_api_keys():
+    """
+    Key yang diterima: X_API_KEY (key lama, limit default) ditambah API_KEYS (JSON), contoh:
+    {"<key>": {"name": "dashboard", "limits": {"llm": {"rate_per_minute": 60, "concurrency": 4}}}}
+    """
+    keys = {}
+    if ACCESS_KEY:
+        keys[ACCESS_KEY] = {"name": "default", "limits": {}}
+    for key, config in json.loads(os.getenv("API_KEYS", "{}")).items():
+        keys[key] = {"name": config.get("name", key[:6]), "limits": config.get("limits", {})}
+    return keys
+
+
+API_KEYS = _load_api_keys()
+
+
+def bucket_id(api_key):
+    """
+    Identitas bucket per key: nama (agar stats mudah dibaca) + hash key. Bukan nama saja,
+    agar key berbeda dengan nama sama tidak berbagi limit; key aslinya tidak ikut tersimpan.
+    """
+    return f"{API_KEYS[api_key]['name']}:{hashlib.sha256(api_key.encode()).hexdigest()[:12]}"
+
+
+def limits_for(api_key, route_class):
+    limits = dict(DEFAULT_LIMITS.get(route_class, DEFAULT_LIMITS["default"]))
+    limits.update(API_KEYS.get(api_key, {}).get("limits", {}).get(route_class, {}))
+    return limits
+
+
+class TokenBucket:
+    """Token bucket: terisi `rate` token per detik sampai `capacity`, satu request = satu token."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now=None):
+        """
+        Returns:
+            tuple: (diizinkan, detik sampai token berikutnya tersedia)
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def refund(self):
+        """Kembalikan token dari take() yang request-nya tetap ditolak."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class InMemoryRateLimitBackend:
+    """
+    State rate limit di memori proses. Backend lain (mis. Redis untuk beberapa worker)
+    cukup mengimplementasikan take(), refund(), acquire() dan release() dengan signature yang sama.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._active = {}
+
+    def take(self, key, rate_per_minute, burst):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            rate = rate_per_minute / 60.0
+            if bucket is None or bucket.rate != rate or bucket.capacity != burst:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+            return bucket.take()
+
+    def refund(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.refund()
+
+    def acquire(self, key, limit):
+        with self._lock:
+            active = self._active.get(key, 0)
+            if active >= limit:
+                return False
+            self._active[key] = active + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._active[key] = max(0, self._active.get(key, 0) - 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": {"/".join(k): round(b.tokens, 2) for k, b in self._buckets.items()},
+                "in_flight": {"/".join(k): v for k, v in self._active.items() if v}
+            }
+
+
+_backend = InMemoryRateLimitBackend()
+
+
+def set_rate_limit_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def get_rate_limit_backend():
+    return _backend
+
+
 async def get_api_key(api_key_header: str = Security(API_KEY_HEADER)):
-    if api_key_header == ACCESS_KEY:
+    if api_key_header in API_KEYS:
         return api_key_header
     else:
         raise HTTPException(
             status_code=HTTP_403_FORBIDDEN,
             detail="Could not validate API KEY"
-        )
\ No newline at end of file
+        )
+
+
+def rate_limit(route_class="default"):
+    """
+    Dependency: validasi API key lalu admission control per (key, kelas route).
+    Request ditolak dengan 429 + Retry-After jika token bucket habis atau slot
+    concurrency penuh, sehingga burst satu client tidak menambah latency client lain.
+
+    Usage:
+        x_api_key: str = Depends(rate_limit("forecast"))
+    """
+    async def dependency(api_key: str = Security(get_api_key)):
+        limits = limits_for(api_key, route_class)
+        key = (bucket_id(api_key), route_class)
+        backend = get_rate_limit_backend()
+
+        allowed, retry_after = backend.take(key, limits["rate_per_minute"], limits["burst"])
+        if not allowed:
+            raise HTTPException(
+                status_code=HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for {route_class} routes",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+        if not backend.acquire(key, limits["concurrency"]):
+            # Ditolak karena concurrency: token rate tidak ikut terpakai
+            backend.refund(key)
+            raise HTTPException(
+                status_code=HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many concurrent {route_class} requests",
+                headers={"Retry-After": "1"}
+            )
+
+        try:
+            yield api_key
+        finally:
+            backend.release(key)
+
+    return dependency
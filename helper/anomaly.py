@@ -0,0 +1,253 @@
+import os
+import threading
+import warnings
+from loguru import logger
+from utils import lazy_import
+from helper.bahan_pokok import TARGET_MAPPING, read_actuals, forecast_row_mask, model_forecast_path
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# Ambang anomali: z-score terhadap rolling window dan selisih relatif terhadap forecast model
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+FORECAST_TOLERANCE = float(os.getenv("ANOMALY_FORECAST_TOLERANCE", "0.15"))
+# Std minimum relatif terhadap mean, agar harga yang lama flat tidak menghasilkan z tak hingga
+MIN_RELATIVE_STD = 0.001
+# Forecast hanya dibandingkan sampai horizon ini dari tanggal terakhir model
+MAX_FORECAST_HORIZON = 60
+RESYNC_EVERY = 1000
+
+
+def _as_actual(values):
+    """Harga 0 di workbook/batch berarti tidak ada data, bukan harga; diperlakukan seperti NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(values == 0, np.nan, values)
+
+
+class RollingWindow:
+    """
+    Mean/std geser satu window untuk banyak series sekaligus: ring buffer + update Welford,
+    O(1) per series per hari (nilai lama dikeluarkan, nilai baru dimasukkan).
+    """
+
+    def __init__(self, n_series, window):
+        self.window = window
+        self.buffer = np.full((n_series, window), np.nan)
+        self.head = np.zeros(n_series, dtype=np.int64)
+        self.count = np.zeros(n_series, dtype=np.int64)
+        self.mean = np.zeros(n_series)
+        self.m2 = np.zeros(n_series)
+        self._updates = 0
+
+    def update(self, values):
+        """Masukkan satu nilai per series; NaN (tidak ada data hari itu) dilewati."""
+        rows = np.flatnonzero(~np.isnan(values))
+        x = values[rows]
+        full = self.count[rows] == self.window
+
+        # Window belum penuh: Welford tambah nilai
+        r, xa = rows[~full], x[~full]
+        self.count[r] += 1
+        delta = xa - self.mean[r]
+        self.mean[r] += delta / self.count[r]
+        self.m2[r] += delta * (xa - self.mean[r])
+
+        # Window penuh: ganti nilai terlama
+        r, xr = rows[full], x[full]
+        old = self.buffer[r, self.head[r]]
+        new_mean = self.mean[r] + (xr - old) / self.window
+        self.m2[r] += (xr - old) * (xr - new_mean + old - self.mean[r])
+        self.mean[r] = new_mean
+        np.maximum(self.m2, 0, out=self.m2)
+
+        self.buffer[rows, self.head[rows]] = x
+        self.head[rows] = (self.head[rows] + 1) % self.window
+
+        self._updates += 1
+        if self._updates % RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        # Hitung ulang dari buffer untuk membuang akumulasi error floating point
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # series yang belum punya data
+            self.mean = np.nan_to_num(np.nanmean(self.buffer, axis=1))
+            self.m2 = np.nan_to_num(np.nanvar(self.buffer, axis=1)) * self.count
+
+    @property
+    def std(self):
+        """Std populasi (ddof=0), sama dengan fitur rolling_std model."""
+        return np.sqrt(self.m2 / np.maximum(self.count, 1))
+
+
+class AnomalyDetector:
+    """
+    Statistik rolling per komoditas (window = rolling_windows model) untuk satu region,
+    di-seed dari histori model dan dimajukan setiap kali batch harian di-commit.
+    """
+
+    def __init__(self, model_data):
+        self.model_data = model_data
+        self.targets = list(model_data["target_columns"])
+        self.windows = sorted(model_data["rolling_windows"])
+        self.stats = {w: RollingWindow(len(self.targets), w) for w in self.windows}
+        self.previous = np.full(len(self.targets), np.nan)
+        last_data = model_data["last_data"]
+        self.model_last_date = pd.Timestamp(last_data["Tanggal"].iloc[-1])
+        self.last_date = None
+        self._forecast_path = np.empty((0, len(self.targets)))
+        self.push(last_data["Tanggal"], last_data[self.targets].to_numpy(dtype=np.float64))
+
+    def push(self, dates, values):
+        """Majukan statistik dengan baris-baris harian (urut tanggal) [n_hari, n_target]; harga 0 dilewati."""
+        for date, row in zip(pd.DatetimeIndex(dates), _as_actual(np.atleast_2d(values))):
+            for stat in self.stats.values():
+                stat.update(row)
+            self.previous = np.where(np.isnan(row), self.previous, row)
+            self.last_date = date
+
+    def forecast_path(self, horizon):
+        """Prediksi model hari 1..horizon setelah tanggal terakhir model [horizon, n_target], di-cache."""
+        if len(self._forecast_path) < horizon:
+            self._forecast_path = model_forecast_path(self.model_data, self.targets, horizon)
+        return self._forecast_path[:horizon]
+
+    def forecast_for(self, date):
+        """Prediksi model untuk tanggal tertentu (semua target), None jika di luar horizon."""
+        horizon = (date - self.model_last_date).days
+        if horizon < 1 or horizon > MAX_FORECAST_HORIZON:
+            return None
+        return self.forecast_path(horizon)[horizon - 1]
+
+    def forecast_rows(self, dates, values):
+        """
+        Mask baris workbook yang berisi forecast model (ditulis route with_excel, dibulatkan ke rupiah),
+        bukan harga aktual: semua harga yang terisi sama dengan prediksi model untuk tanggal itu.
+        """
+        return forecast_row_mask(dates, values, self.model_last_date, self.forecast_path,
+                                 max_horizon=MAX_FORECAST_HORIZON)
+
+    def score(self, date, values):
+        """
+        Skor satu batch harian untuk semua komoditas sekaligus (tanpa mengubah state).
+
+        Returns:
+            dict: array kolumnar per komoditas (z per window, selisih forecast, flag anomali)
+        """
+        floor = MIN_RELATIVE_STD * np.abs(values)
+        z = {}
+        for window, stat in self.stats.items():
+            std = np.maximum(stat.std, floor)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z[window] = np.where(stat.count > 1, (values - stat.mean) / std, np.nan)
+
+        forecast = self.forecast_for(date)
+        if forecast is None:
+            forecast = np.full(len(self.targets), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            forecast_error = (values - forecast) / forecast
+            change = (values - self.previous) / self.previous
+
+        z_matrix = np.vstack([z[w] for w in self.windows])
+        history_flag = np.any(np.abs(z_matrix) > Z_THRESHOLD, axis=0)
+        forecast_flag = np.abs(forecast_error) > FORECAST_TOLERANCE
+        return {
+            "targets": self.targets,
+            "value": values,
+            "previous": self.previous.copy(),
+            "change_pct": np.round(change * 100, 2),
+            "z": {str(w): np.round(z[w], 3) for w in self.windows},
+            "rolling_mean": {str(w): np.round(self.stats[w].mean, 2) for w in self.windows},
+            "forecast": np.round(forecast, 0),
+            "forecast_error_pct": np.round(forecast_error * 100, 2),
+            "history_anomaly": history_flag,
+            "forecast_anomaly": forecast_flag,
+            "anomaly": (history_flag | forecast_flag) & ~np.isnan(values)
+        }
+
+
+_detectors = {}
+_detector_locks = {}
+# Lock global hanya untuk lookup lock per region; batch region yang berbeda tidak saling menunggu
+_detectors_lock = threading.Lock()
+
+
+def _detector_lock(region):
+    with _detectors_lock:
+        lock = _detector_locks.get(region)
+        if lock is None:
+            lock = _detector_locks[region] = threading.Lock()
+        return lock
+
+
+def _batch_values(targets, prices):
+    """dict harga (nama target model atau nama kolom Excel) -> array sesuai urutan target."""
+    by_column = {TARGET_MAPPING.get(t, t): t for t in targets}
+    values = np.full(len(targets), np.nan)
+    index = {t: i for i, t in enumerate(targets)}
+    for name, value in prices.items():
+        target = name if name in index else by_column.get(name)
+        if target is None:
+            raise ValueError(f"Komoditas '{name}' tidak dikenal")
+        values[index[target]] = np.nan if value is None else float(value)
+    return _as_actual(values)
+
+
+def score_daily_batch(model_data, region, date, prices=None, excel_path=None, commit=True):
+    """
+    Deteksi anomali harga satu hari untuk semua komoditas dalam satu panggilan vektor.
+
+    Args:
+        model_data: model bahan pokok region (sumber histori, rolling_windows dan forecast)
+        region: key state detector
+        date: tanggal batch
+        prices: dict komoditas -> harga; None = ambil baris tanggal itu dari workbook
+        excel_path: workbook harga harian (untuk mengejar hari yang terlewat dan batch dari file)
+        commit: masukkan batch ke statistik rolling setelah di-skor
+
+    Returns:
+        dict: hasil score() + tanggal dan status commit
+    """
+    date = pd.Timestamp(date).normalize()
+    with _detector_lock(region):
+        detector = _detectors.get(region)
+        # Model baru (refresh/retrain) -> state di-seed ulang dari histori model baru
+        if detector is None or detector.model_data is not model_data:
+            detector = _detectors[region] = AnomalyDetector(model_data)
+
+        # Hari antara state terakhir dan batch ini diambil dari workbook, jika ada
+        if excel_path is not None and date - detector.last_date > pd.Timedelta(days=1) and os.path.exists(excel_path):
+            gap = read_actuals(excel_path, detector.targets, after=detector.last_date,
+                               until=date - pd.Timedelta(days=1))
+            if not gap.empty:
+                gap = gap.reindex(columns=["Tanggal"] + detector.targets)
+                gap_values = gap[detector.targets].to_numpy(dtype=np.float64)
+                # Baris forecast yang ditulis ke workbook bukan harga aktual, tidak ikut statistik
+                actual = ~detector.forecast_rows(gap["Tanggal"], gap_values)
+                detector.push(gap["Tanggal"][actual], gap_values[actual])
+                logger.info(f"Anomaly state {region or 'default'} caught up {int(actual.sum())} days "
+                            f"({int((~actual).sum())} forecast rows skipped)")
+
+        if prices is None:
+            if excel_path is None:
+                raise ValueError("prices atau workbook diperlukan")
+            row = read_actuals(excel_path, detector.targets, after=date - pd.Timedelta(days=1), until=date)
+            if not row.empty:
+                row = row.reindex(columns=["Tanggal"] + detector.targets)
+                row = row[~detector.forecast_rows(row["Tanggal"], row[detector.targets].to_numpy(dtype=np.float64))]
+            if row.empty:
+                raise ValueError(f"Tidak ada data harga untuk {date.strftime('%Y-%m-%d')}")
+            prices = row.iloc[-1].drop("Tanggal").to_dict()
+
+        values = _batch_values(detector.targets, prices)
+        result = detector.score(date, values)
+
+        committed = commit and date > detector.last_date
+        if committed:
+            detector.push([date], values[None, :])
+
+    n_anomalies = int(result["anomaly"].sum())
+    if n_anomalies:
+        flagged = [t for t, a in zip(result["targets"], result["anomaly"]) if a]
+        logger.warning(f"Price anomalies {region or 'default'} {date.strftime('%Y-%m-%d')}: {flagged}")
+    return {"date": date.strftime('%Y-%m-%d'), "committed": committed, **result}
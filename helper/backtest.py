@@ -0,0 +1,361 @@
+import os
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from helper.bahan_pokok import build_series, recursive_forecast
+from helper.ihk import COLUMN_MAPPING
+from helper.compact import MONTH_NAMES
+from helper.training import load_training_history, build_feature_matrix
+from helper.model_store import resolve_model_path, data_path, normalize_region
+from helper.model_artifact import load_model
+
+BACKTEST_DIR = "./models/backtests"
+# Origin per proses: cukup besar agar satu predict per booster per hari mencakup banyak origin
+ORIGINS_PER_CHUNK = 64
+
+
+def forecast_metrics(forecasts, actuals, targets):
+    """
+    MAPE dan RMSE per target dan horizon.
+
+    Args:
+        forecasts, actuals: array [n_origin, n_target, horizon]
+
+    Returns:
+        dict: target -> {"mape": [horizon], "rmse": [horizon], "mape_overall", "rmse_overall"}
+    """
+    error = forecasts - actuals
+    valid = ~np.isnan(error) & (actuals != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ape = np.where(valid, np.abs(error) / np.abs(actuals), np.nan)
+    squared = np.where(valid, error ** 2, np.nan)
+    mape = np.nanmean(ape, axis=0)
+    rmse = np.sqrt(np.nanmean(squared, axis=0))
+    return {
+        target: {
+            "mape": np.round(mape[t], 6).tolist(),
+            "rmse": np.round(rmse[t], 4).tolist(),
+            "mape_overall": round(float(np.nanmean(ape[:, t])), 6),
+            "rmse_overall": round(float(np.sqrt(np.nanmean(squared[:, t]))), 4)
+        }
+        for t, target in enumerate(targets)
+    }
+
+
+def rolling_origins(n_rows, min_history, horizon, step=1, start=0):
+    """Index origin (baris terakhir yang diketahui) yang punya histori cukup dan aktual sepanjang horizon."""
+    first = max(min_history - 1, start)
+    return np.arange(first, n_rows - horizon, step)
+
+
+# --- Bahan pokok --------------------------------------------------------------
+
+# State per worker process: model, histori dan template series di-cache sekali untuk semua origin
+_worker = {}
+
+
+def _init_worker(model_path, values, dates, targets):
+    model_data = load_model(model_path)
+    template = build_series(model_data, targets=targets)
+    # Fitur histori (lag/rolling) dari workbook, untuk fill per origin seperti last_data saat serving
+    history = pd.DataFrame(values.T, columns=targets)
+    history.insert(0, "Tanggal", dates)
+    features, names = build_feature_matrix(history, targets, model_data["lag_periods"], model_data["rolling_windows"])
+    feature_cols = list(model_data["feature_cols"])
+    last_columns = set(model_data["last_data"].columns)
+    position = {name: i for i, name in enumerate(names)}
+    fill_cols = [i for i, col in enumerate(feature_cols) if col in last_columns and col in position]
+    _worker.update(template=template, values=values, dates=dates, rows={t: i for i, t in enumerate(targets)},
+                   features=features[:, [position[feature_cols[i]] for i in fill_cols]], fill_cols=fill_cols)
+
+
+def _origin_fill(origin, hist_len):
+    """
+    Fill fitur per origin: rata-rata fitur atas hist_len baris sampai origin, sama seperti
+    build_series() atas last_data. Kolom tanpa histori di workbook tetap memakai fill model.
+    """
+    template, features, fill_cols = _worker["template"], _worker["features"], _worker["fill_cols"]
+    fill = template[0]["fill"].copy()
+    window = features[max(origin - hist_len + 1, 0):origin + 1]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # kolom yang seluruhnya NaN di awal histori
+        means = np.nanmean(window, axis=0)
+    fill[fill_cols] = np.where(np.isnan(means), 0.0, means)
+    return fill
+
+
+def _forecast_chunk(origins, horizon):
+    """Forecast rekursif semua target untuk sekumpulan origin dalam satu pass ter-vektorisasi."""
+    template, values, dates, rows = _worker["template"], _worker["values"], _worker["dates"], _worker["rows"]
+    hist_len = len(template[0]["history"])
+    series = []
+    for origin in origins:
+        last_date = pd.Timestamp(dates[origin])
+        # Hanya data sampai origin yang dipakai (history dan fill), tidak ada informasi sesudahnya
+        fill = _origin_fill(origin, hist_len)
+        for s in template:
+            history = values[rows[s["target"]], origin - hist_len + 1:origin + 1]
+            series.append(dict(s, history=history, last_date=last_date, fill=fill))
+    outputs = recursive_forecast(series, horizon)
+    forecasts = np.stack([v for _, _, v in outputs]).reshape(len(origins), len(template), horizon)
+    return origins, forecasts
+
+
+def backtest_bahan_pokok(model_path, excel_path, horizon=30, step=7, start=None, end=None, max_workers=None,
+                         in_sample=False):
+    """
+    Rolling-origin backtest model bahan pokok: forecast rekursif diulang dari banyak tanggal origin
+    di histori workbook lalu dibandingkan dengan aktual. Origin dibagi ke process pool,
+    semua target (dan semua origin dalam satu chunk) diprediksi bersamaan.
+    Default hanya origin mulai tanggal terakhir data training model (out-of-sample); origin
+    sebelumnya menilai model pada data yang sudah dilihatnya saat training.
+
+    Args:
+        model_path: artifact model (native atau pickle)
+        excel_path: workbook harga harian (sumber histori dan aktual)
+        horizon: jumlah hari forecast per origin
+        step: jarak antar origin (hari)
+        start, end: rentang tanggal origin (YYYY-MM-DD), default seluruh histori
+        max_workers: jumlah proses (default: jumlah core, 1 = tanpa pool)
+        in_sample: izinkan origin sebelum akhir data training
+
+    Returns:
+        dict: metrik per target/horizon dan info origin
+    """
+    model_data = load_model(model_path)
+    training_end = pd.Timestamp(model_data["last_data"]["Tanggal"].iloc[-1])
+    history, targets = load_training_history(excel_path, list(model_data["target_columns"]), until=end,
+                                             model_data=model_data)
+    targets = [t for t in model_data["target_columns"] if t in targets]
+    hist_len = len(model_data["last_data"])
+    values = np.ascontiguousarray(history[targets].to_numpy(dtype=np.float64).T)
+    dates = history["Tanggal"].to_numpy()
+
+    start_row = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start)))) if start else 0
+    if not in_sample:
+        start_row = max(start_row, int(np.searchsorted(dates, np.datetime64(training_end))))
+    origins = rolling_origins(len(dates), hist_len, horizon, step, start_row)
+    if len(origins) == 0:
+        raise ValueError(f"Histori terlalu pendek untuk backtest (butuh {hist_len} + {horizon} hari"
+                         f"{'' if in_sample else f' setelah akhir data training {training_end:%Y-%m-%d}'})")
+
+    chunks = [origins[i:i + ORIGINS_PER_CHUNK] for i in range(0, len(origins), ORIGINS_PER_CHUNK)]
+    logger.info(f"Backtest bahan pokok: {len(origins)} origins x {len(targets)} targets x {horizon} days, "
+                f"{len(chunks)} chunks")
+    started = time.time()
+
+    forecasts = np.empty((len(origins), len(targets), horizon))
+    position = {o: i for i, o in enumerate(origins)}
+    workers = max_workers or os.cpu_count()
+    if workers == 1 or len(chunks) == 1:
+        _init_worker(model_path, values, dates, targets)
+        results = (_forecast_chunk(chunk, horizon) for chunk in chunks)
+        for chunk_origins, chunk_forecasts in results:
+            forecasts[[position[o] for o in chunk_origins]] = chunk_forecasts
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker,
+                                 initargs=(model_path, values, dates, targets)) as pool:
+            for chunk_origins, chunk_forecasts in pool.map(_forecast_chunk, chunks, [horizon] * len(chunks)):
+                forecasts[[position[o] for o in chunk_origins]] = chunk_forecasts
+
+    # Aktual [origin, target, horizon]: baris origin+1 .. origin+horizon
+    actual_index = origins[:, None] + np.arange(1, horizon + 1)[None, :]
+    actuals = values[:, actual_index].transpose(1, 0, 2)
+
+    elapsed = time.time() - started
+    logger.info(f"Backtest bahan pokok finished in {elapsed:.1f}s")
+    return {
+        "kind": "bahan_pokok",
+        "horizon": horizon,
+        "unit": "day",
+        "origins": {
+            "count": int(len(origins)),
+            "first": pd.Timestamp(dates[origins[0]]).strftime('%Y-%m-%d'),
+            "last": pd.Timestamp(dates[origins[-1]]).strftime('%Y-%m-%d'),
+            "step": step
+        },
+        "trained_at": model_data.get("trained_at"),
+        "training_end": training_end.strftime('%Y-%m-%d'),
+        "in_sample": bool(dates[origins[0]] < np.datetime64(training_end)),
+        "elapsed_seconds": round(elapsed, 2),
+        "metrics": forecast_metrics(forecasts, actuals, targets)
+    }
+
+
+# --- IHK ----------------------------------------------------------------------
+
+def load_ihk_history(excel_path, target_cols):
+    """Histori bulanan IHK urut (Tahun, Bulan) dengan nama kolom target model."""
+    df = pd.read_excel(excel_path)
+    df["Bulan_num"] = df["Bulan"].map({name: i + 1 for i, name in enumerate(MONTH_NAMES)})
+    df = df.dropna(subset=["Bulan_num"]).sort_values(["Tahun", "Bulan_num"]).reset_index(drop=True)
+    rename = {COLUMN_MAPPING.get(t, t): t for t in target_cols}
+    missing = [c for c in rename if c not in df.columns]
+    if missing:
+        raise ValueError(f"Kolom IHK tidak ditemukan di workbook: {missing}")
+    return df[["Tahun", "Bulan_num"] + list(rename)].rename(columns=rename)
+
+
+def ihk_training_end(model_data, history):
+    """
+    Index baris histori yang menjadi bulan terakhir data training model IHK, None jika tidak ditemukan.
+    Model IHK hanya menyimpan last_data/second_last_data (dua bulan terakhir training): dipakai
+    Tahun/Bulan_num jika ikut tersimpan di Series, selain itu dicari dua baris berurutan di histori
+    yang nilainya sama dengan second_last_data lalu last_data (toleransi untuk model float32).
+    """
+    target_cols = list(model_data["target_cols"])
+    last, second_last = model_data["last_data"], model_data["second_last_data"]
+    tahun = history["Tahun"].to_numpy(dtype=np.int64)
+    bulan = history["Bulan_num"].to_numpy(dtype=np.int64)
+
+    if "Tahun" in last.index and "Bulan_num" in last.index:
+        rows = np.flatnonzero((tahun == int(last["Tahun"])) & (bulan == int(last["Bulan_num"])))
+        return int(rows[-1]) if len(rows) else None
+
+    values = history[target_cols].to_numpy(dtype=np.float64)
+    lag1 = np.asarray(last[target_cols], dtype=np.float64)
+    lag2 = np.asarray(second_last[target_cols], dtype=np.float64)
+    is_last = np.all(np.isclose(values, lag1, rtol=1e-5, equal_nan=True), axis=1)
+    is_second_last = np.all(np.isclose(values, lag2, rtol=1e-5, equal_nan=True), axis=1)
+    rows = np.flatnonzero(is_last[1:] & is_second_last[:-1]) + 1
+    return int(rows[-1]) if len(rows) else None
+
+
+def backtest_ihk(model_data, excel_path, horizon=6, start=None, in_sample=False):
+    """
+    Rolling-origin backtest model IHK: setiap bulan histori menjadi origin, dan semua origin
+    dimajukan bersamaan (satu predict per langkah horizon) dengan lag 1 dan 2 bulan.
+    Default hanya origin mulai bulan terakhir data training, sehingga semua aktual yang dinilai
+    belum pernah dilihat model.
+
+    Args:
+        model_data: model IHK (model, target_cols, last_data, second_last_data)
+        excel_path: workbook IHK
+        horizon: jumlah bulan forecast per origin
+        start: tahun origin pertama (default seluruh histori)
+        in_sample: izinkan origin sebelum akhir data training
+
+    Returns:
+        dict: metrik per target/horizon dan info origin
+    """
+    target_cols = list(model_data["target_cols"])
+    history = load_ihk_history(excel_path, target_cols)
+    values = history[target_cols].to_numpy(dtype=np.float64)
+    tahun = history["Tahun"].to_numpy(dtype=np.int64)
+    bulan = history["Bulan_num"].to_numpy(dtype=np.int64)
+
+    training_end = ihk_training_end(model_data, history)
+    start_row = int(np.searchsorted(tahun, int(start))) if start else 0
+    if not in_sample:
+        if training_end is None:
+            raise ValueError("Akhir data training model IHK tidak ditemukan di workbook; "
+                             "gunakan in_sample untuk backtest seluruh histori")
+        start_row = max(start_row, training_end)
+    origins = rolling_origins(len(values), 2, horizon, 1, start_row)
+    if len(origins) == 0:
+        end_note = "" if in_sample else f" setelah akhir data training {tahun[training_end]}-{bulan[training_end]:02d}"
+        raise ValueError(f"Histori IHK terlalu pendek untuk backtest horizon {horizon} bulan{end_note}")
+
+    started = time.time()
+    lag1, lag2 = values[origins], values[origins - 1]
+    period_tahun, period_bulan = tahun[origins].copy(), bulan[origins].copy()
+    forecasts = np.empty((len(origins), len(target_cols), horizon))
+    for h in range(horizon):
+        period_bulan += 1
+        rollover = period_bulan > 12
+        period_bulan[rollover] = 1
+        period_tahun[rollover] += 1
+
+        # Urutan kolom sama dengan forecast_multiple_periods()
+        features = {"Tahun": period_tahun, "Bulan_num": period_bulan}
+        for j, col in enumerate(target_cols):
+            features[f"{col}_lag1"] = lag1[:, j]
+            features[f"{col}_lag2"] = lag2[:, j]
+        predicted = np.asarray(model_data["model"].predict(pd.DataFrame(features)), dtype=np.float64)
+        forecasts[:, :, h] = predicted
+        lag2, lag1 = lag1, predicted
+
+    actual_index = origins[:, None] + np.arange(1, horizon + 1)[None, :]
+    actuals = values[actual_index].transpose(0, 2, 1)
+
+    elapsed = time.time() - started
+    return {
+        "kind": "ihk",
+        "horizon": horizon,
+        "unit": "month",
+        "origins": {
+            "count": int(len(origins)),
+            "first": f"{tahun[origins[0]]}-{bulan[origins[0]]:02d}",
+            "last": f"{tahun[origins[-1]]}-{bulan[origins[-1]]:02d}",
+            "step": 1
+        },
+        "training_end": None if training_end is None else f"{tahun[training_end]}-{bulan[training_end]:02d}",
+        "in_sample": bool(training_end is None or origins[0] < training_end),
+        "elapsed_seconds": round(elapsed, 2),
+        "metrics": forecast_metrics(forecasts, actuals, target_cols)
+    }
+
+
+# --- Laporan ------------------------------------------------------------------
+
+def report_path(kind, region=None, backtest_dir=BACKTEST_DIR):
+    return os.path.join(backtest_dir, kind, f"{normalize_region(region) or 'default'}.json")
+
+
+def write_report(report, kind, region=None, backtest_dir=BACKTEST_DIR):
+    """Simpan hasil backtest terbaru per (kind, region), dibaca oleh endpoint laporan."""
+    path = report_path(kind, region, backtest_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    report = {**report, "region": normalize_region(region) or "default",
+              "created_at": pd.Timestamp.now().isoformat(timespec="seconds")}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+    logger.info(f"Backtest report written: {path}")
+    return path
+
+
+def read_report(kind, region=None, backtest_dir=BACKTEST_DIR):
+    with open(report_path(kind, region, backtest_dir)) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest model forecasting")
+    parser.add_argument("kind", choices=["bahan_pokok", "ihk"])
+    parser.add_argument("--region", default=None, help="kode region (default: model global)")
+    parser.add_argument("--excel", default=None, help="workbook histori (default: temp_uploads/<region>/)")
+    parser.add_argument("--horizon", type=int, default=None, help="default: 30 hari / 6 bulan")
+    parser.add_argument("--step", type=int, default=7, help="jarak antar origin (hari, bahan pokok)")
+    parser.add_argument("--start", default=None, help="origin pertama (YYYY-MM-DD / tahun untuk IHK)")
+    parser.add_argument("--end", default=None, help="tanggal data terakhir (YYYY-MM-DD, bahan pokok)")
+    parser.add_argument("--in-sample", action="store_true",
+                        help="izinkan origin sebelum akhir data training")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=BACKTEST_DIR)
+    args = parser.parse_args()
+
+    model_path = resolve_model_path(args.kind, args.region)
+    if args.kind == "bahan_pokok":
+        excel_path = args.excel or data_path("Harga_pangan_harian.xlsx", args.region)
+        report = backtest_bahan_pokok(model_path, excel_path, horizon=args.horizon or 30, step=args.step,
+                                      start=args.start, end=args.end, max_workers=args.workers,
+                                      in_sample=args.in_sample)
+    else:
+        excel_path = args.excel or data_path("IHK.xlsx", args.region)
+        report = backtest_ihk(load_model(model_path), excel_path, horizon=args.horizon or 6, start=args.start,
+                              in_sample=args.in_sample)
+
+    write_report(report, args.kind, args.region, args.output)
+    for target, metric in report["metrics"].items():
+        print(f"{target:45s} MAPE {metric['mape_overall'] * 100:6.2f}%  RMSE {metric['rmse_overall']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
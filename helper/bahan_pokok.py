@@ -1,10 +1,198 @@
 import pickle
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
 from loguru import logger
+from utils import lazy_import
+from helper.compact import read_excel_compact, upcast_int_columns
+from helper.excel_export import write_frame
 
-def load_model_and_forecast(n_days=30, model_path="./models/lgbm_forecasting_hph_model.pkl"):
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# Mapping nama target model ke nama kolom Excel
+TARGET_MAPPING = {
+    "Beras_Premium": "Beras Premium",
+    "Beras_Medium": "Beras Medium",
+    "Beras_SPHP": "Beras SPHP",
+    "Jagung_Tk_Peternak": "Jagung Tk Peternak",
+    "Kedelai_Biji_Kering_Impor": "Kedelai Biji Kering (Impor)",
+    "Bawang_Merah": "Bawang Merah",
+    "Bawang_Putih_Bonggol": "Bawang Putih Bonggol",
+    "Cabai_Merah_Keriting": "Cabai Merah Keriting",
+    "Cabai_Merah_Besar": "Cabai Merah Besar",
+    "Daging_Sapi": "Daging Sapi Murni",
+    "Cabai_Rawit_Merah": "Cabai Rawit Merah",
+    "Daging_Ayam_Ras": "Daging Ayam Ras",
+    "Telur_Ayam_Ras": "Telur Ayam Ras",
+    "Gula_Konsumsi": "Gula Konsumsi",
+    "Minyak_Goreng_Kemasan": "Minyak Goreng Kemasan",
+    "Minyak_Goreng_Curah": "Minyak Goreng Curah",
+    "Tepung_Terigu_Curah": "Tepung Terigu (Curah)",
+    "Minyakita": "Minyakita",
+    "Tepung_Terigu_Kemasan": "Tepung Terigu Kemasan",
+    "Ikan_Kembung": "Ikan Kembung",
+    "Ikan_Tongkol": "Ikan Tongkol",
+    "Ikan_Bandeng": "Ikan Bandeng",
+    "Garam_Konsumsi": "Garam Konsumsi",
+    "Daging_Kerbau_Beku_Impor": "Daging Kerbau Beku (Impor Luar Negeri)",
+    "Daging_Kerbau_Segar_Lokal": "Daging Kerbau Segar (Lokal)"
+}
+
+# Baris forecast di workbook hanya dicari sampai horizon ini dari tanggal terakhir model
+FORECAST_ROW_HORIZON = 60
+
+CALENDAR_FEATURES = ["year", "month", "day", "dayofweek", "quarter", "weekofyear"]
+
+
+def _calendar_features(dates):
+    """Fitur kalender untuk setiap tanggal forecast (sama untuk semua series pada tanggal itu)."""
+    dates = pd.DatetimeIndex(dates)
+    return {
+        "year": dates.year.values,
+        "month": dates.month.values,
+        "day": dates.day.values,
+        "dayofweek": dates.dayofweek.values,
+        "quarter": dates.quarter.values,
+        "weekofyear": dates.isocalendar().week.values.astype(np.int64)
+    }
+
+
+def build_series(model_data, targets=None, key=None):
+    """
+    Siapkan state rekursif per target dari model_data, untuk diproses oleh recursive_forecast().
+
+    Args:
+        model_data: dict model (target_columns, feature_cols, lag_periods, rolling_windows, last_data, forecast_results)
+        targets: subset target yang diprediksi (default: semua target_columns)
+        key: identitas tambahan per series (mis. region)
+
+    Returns:
+        list: satu dict per target
+    """
+    last_data = model_data["last_data"]
+    feature_cols = list(model_data["feature_cols"])
+    targets = targets or model_data["target_columns"]
+
+    # Fitur milik target lain diisi rata-rata historis (sama seperti loop per-row sebelumnya)
+    fill = np.zeros(len(feature_cols))
+    for i, col in enumerate(feature_cols):
+        if col in last_data.columns:
+            fill[i] = last_data[col].mean()
+
+    series = []
+    for target_col in targets:
+        if target_col not in model_data["target_columns"]:
+            continue
+        series.append({
+            "key": key,
+            "target": target_col,
+            "model": model_data["forecast_results"][target_col]["model"],
+            "history": last_data[target_col].to_numpy(dtype=np.float64),
+            "last_date": pd.Timestamp(last_data["Tanggal"].iloc[-1]),
+            "feature_cols": feature_cols,
+            "feature_index": model_data.get("feature_index"),
+            "lag_periods": list(model_data["lag_periods"]),
+            "rolling_windows": list(model_data["rolling_windows"]),
+            "fill": fill
+        })
+    return series
+
+
+def recursive_forecast(series, n_days):
+    """
+    Forecast rekursif banyak series sekaligus. Series dengan panjang histori dan konfigurasi
+    fitur yang sama ditumpuk menjadi satu matrix dan dimajukan per hari (tanggal awal boleh
+    berbeda per series, mis. banyak origin backtest); baris dengan booster yang sama diprediksi
+    dalam satu panggilan predict.
+
+    Returns:
+        list: (series, forecast_dates, forecasted_values) dengan urutan sama seperti input
+    """
+    groups = {}
+    for idx, s in enumerate(series):
+        group_key = (len(s["history"]), tuple(s["feature_cols"]),
+                     tuple(s["lag_periods"]), tuple(s["rolling_windows"]))
+        groups.setdefault(group_key, []).append(idx)
+
+    outputs = [None] * len(series)
+    date_ranges = {}
+    for (hist_len, feature_cols, lag_periods, rolling_windows), members in groups.items():
+        for idx in members:
+            last_date = series[idx]["last_date"]
+            if last_date not in date_ranges:
+                date_ranges[last_date] = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=n_days, freq="D")
+        # Fitur kalender per hari: [n_series] jika tanggal awal berbeda, skalar jika sama
+        starts = {series[idx]["last_date"] for idx in members}
+        if len(starts) == 1:
+            calendar = {name: values[:, None] for name, values in _calendar_features(date_ranges[starts.pop()]).items()}
+        else:
+            per_start = {start: _calendar_features(date_ranges[start]) for start in starts}
+            calendar = {
+                name: np.stack([per_start[series[idx]["last_date"]][name] for idx in members], axis=1)
+                for name in CALENDAR_FEATURES
+            }
+        # Artifact hasil training menyimpan index fitur yang sudah jadi
+        col_index = series[members[0]]["feature_index"] or {col: i for i, col in enumerate(feature_cols)}
+        n_series = len(members)
+        rows = np.arange(n_series)
+        L = hist_len
+
+        # Histori + slot prediksi, satu baris per series
+        values = np.empty((n_series, L + n_days))
+        for r, idx in enumerate(members):
+            values[r, :L] = series[idx]["history"]
+
+        X = np.vstack([series[idx]["fill"] for idx in members]).astype(np.float64)
+
+        def target_columns(name_fn):
+            cols = np.array([col_index.get(name_fn(series[idx]["target"]), -1) for idx in members])
+            return cols, cols >= 0
+
+        lag_cols = {lag: target_columns(lambda t, lag=lag: f"{t}_lag_{lag}") for lag in lag_periods}
+        rolling_cols = {
+            window: {stat: target_columns(lambda t, w=window, st=stat: f"{t}_rolling_{st}_{w}")
+                     for stat in ("mean", "std", "min", "max")}
+            for window in rolling_windows
+        }
+
+        # Kelompokkan baris per booster agar predict dipanggil sekali per booster per hari
+        booster_rows = {}
+        for r, idx in enumerate(members):
+            booster_rows.setdefault(id(series[idx]["model"]), (series[idx]["model"], []))[1].append(r)
+
+        for day in range(n_days):
+            pos = L + day
+
+            for name, col_values in calendar.items():
+                if name in col_index:
+                    X[:, col_index[name]] = col_values[day]
+
+            for lag, (cols, mask) in lag_cols.items():
+                lag_idx = pos - lag
+                X[rows[mask], cols[mask]] = values[mask, lag_idx if lag_idx >= 0 else 0]
+
+            for window, stats in rolling_cols.items():
+                window_data = values[:, max(0, pos - window):pos]
+                computed = {
+                    "mean": window_data.mean(axis=1),
+                    "std": window_data.std(axis=1),
+                    "min": window_data.min(axis=1),
+                    "max": window_data.max(axis=1)
+                }
+                for stat, (cols, mask) in stats.items():
+                    X[rows[mask], cols[mask]] = computed[stat][mask]
+
+            for model, model_rows in booster_rows.values():
+                pred_log = model.predict(X[model_rows], num_iteration=model.best_iteration)
+                # Inverse transform (dari log scale ke harga asli)
+                values[model_rows, pos] = np.exp(pred_log)
+
+        for r, idx in enumerate(members):
+            outputs[idx] = (series[idx], date_ranges[series[idx]["last_date"]], values[r, L:].copy())
+
+    return outputs
+
+
+def load_model_and_forecast(n_days=30, model_path="./models/lgbm_forecasting_hph_model.pkl", model_data=None):
     """
     Load model dan forecast untuk n_days ke depan.
     Setiap target diprediksi secara independent mulai dari day 1.
@@ -12,117 +200,57 @@ def load_model_and_forecast(n_days=30, model_path="./models/lgbm_forecasting_hph
     Args:
         n_days: jumlah hari yang akan diprediksi
         model_path: path ke file model yang sudah disave
+        model_data: model yang sudah di-load (mis. dari ModelStore), jika ada model_path diabaikan
     
     Returns:
         dict: forecast_results dengan key = target_name, value = DataFrame
     """
-    logger.info(f"Loading model from: {model_path}")
-    
-    with open(model_path, "rb") as f:
-        model_data = pickle.load(f)
+    if model_data is None:
+        logger.info(f"Loading model from: {model_path}")
+        with open(model_path, "rb") as f:
+            model_data = pickle.load(f)
 
-    forecast_results = {}
     target_columns = model_data["target_columns"]
-    feature_cols = model_data["feature_cols"]
-    lag_periods = model_data["lag_periods"]
-    rolling_windows = model_data["rolling_windows"]
-    original_last_data = model_data["last_data"].copy()  # Data asli, tidak diubah
-
-    # Generate forecast dates
-    forecast_dates = pd.date_range(
-        start=original_last_data["Tanggal"].iloc[-1] + pd.Timedelta(days=1),
-        periods=n_days,
-        freq="D"
-    )
-
     logger.info(f"Forecasting for {len(target_columns)} targets, {n_days} days")
 
-    # Forecast setiap target secara independent
-    for target_col in target_columns:
-        logger.info(f"Forecasting {target_col}...")
-        
-        model = model_data["forecast_results"][target_col]["model"]
-        forecasted_values = []
-        
-        # Reset last_values untuk setiap target (independent)
-        last_values = original_last_data.copy()
-
-        for day in range(n_days):
-            # Create base forecast data structure
-            forecast_data = {
-                "Tanggal": forecast_dates[day],
-                "year": forecast_dates[day].year,
-                "month": forecast_dates[day].month,
-                "day": forecast_dates[day].day,
-                "dayofweek": forecast_dates[day].dayofweek,
-                "quarter": forecast_dates[day].quarter,
-                "weekofyear": forecast_dates[day].isocalendar().week
-            }
-
-            # Create lag features
-            for lag in lag_periods:
-                if day < lag:
-                    # Gunakan data historis
-                    lag_idx = len(last_values) - lag + day
-                    if lag_idx >= 0:
-                        forecast_data[f"{target_col}_lag_{lag}"] = last_values.iloc[lag_idx][target_col]
-                    else:
-                        forecast_data[f"{target_col}_lag_{lag}"] = last_values.iloc[0][target_col]
-                else:
-                    # Gunakan hasil prediksi sebelumnya untuk target yang sama
-                    forecast_data[f"{target_col}_lag_{lag}"] = forecasted_values[day - lag]
-
-            # Create rolling features (selalu dari data historis + prediksi sebelumnya)
-            for window in rolling_windows:
-                if day == 0:
-                    # Hari pertama: pakai data historis
-                    window_data = last_values[target_col].tail(window).values
-                else:
-                    # Kombinasi data historis + prediksi sebelumnya
-                    if day >= window:
-                        # Jika sudah cukup prediksi, pakai prediksi saja
-                        window_data = forecasted_values[day-window:day]
-                    else:
-                        # Kombinasi historis + prediksi
-                        hist_needed = window - day
-                        hist_data = last_values[target_col].tail(hist_needed).tolist()
-                        pred_data = forecasted_values[:day]
-                        window_data = hist_data + pred_data
-                
-                forecast_data[f"{target_col}_rolling_mean_{window}"] = np.mean(window_data)
-                forecast_data[f"{target_col}_rolling_std_{window}"] = np.std(window_data)
-                forecast_data[f"{target_col}_rolling_min_{window}"] = np.min(window_data)
-                forecast_data[f"{target_col}_rolling_max_{window}"] = np.max(window_data)
-
-            # Fill missing features dengan rata-rata dari data historis
-            for col in feature_cols:
-                if col not in forecast_data:
-                    if col in last_values.columns:
-                        forecast_data[col] = last_values[col].mean()
-                    else:
-                        forecast_data[col] = 0  # fallback
-
-            # Create DataFrame in one go to avoid fragmentation
-            temp_df = pd.DataFrame([forecast_data])
-
-            # Make prediction
-            X_forecast = temp_df[feature_cols]
-            pred_value_log = model.predict(X_forecast, num_iteration=model.best_iteration)[0]
-            
-            # Inverse transform (dari log scale ke harga asli)
-            pred_value = np.exp(pred_value_log)
-            forecasted_values.append(pred_value)
-
-        # Save results untuk target ini
-        forecast_results[target_col] = pd.DataFrame({
+    forecast_results = {}
+    for s, forecast_dates, forecasted_values in recursive_forecast(build_series(model_data), n_days):
+        forecast_results[s["target"]] = pd.DataFrame({
             "Tanggal": forecast_dates,
-            f"Forecast_{target_col}": forecasted_values
+            f"Forecast_{s['target']}": forecasted_values
         })
 
     logger.info(f"Forecasting completed for {len(target_columns)} targets")
     return forecast_results
 
 
+def forecast_fleet(model_datas, n_days=7, targets=None):
+    """
+    Forecast semua (region, komoditas) dalam satu pass rekursif yang ter-vektorisasi.
+
+    Args:
+        model_datas: dict region -> model_data
+        n_days: jumlah hari forecast
+        targets: subset komoditas (default: semua)
+
+    Returns:
+        dict: layout kolumnar {region, target, start_date, values}
+    """
+    series = []
+    for region, model_data in model_datas.items():
+        series.extend(build_series(model_data, targets=targets, key=region))
+
+    logger.info(f"Fleet forecast: {len(series)} series, {n_days} days")
+    outputs = recursive_forecast(series, n_days)
+
+    return {
+        "region": [s["key"] for s, _, _ in outputs],
+        "target": [s["target"] for s, _, _ in outputs],
+        "start_date": [dates[0].strftime('%Y-%m-%d') for _, dates, _ in outputs],
+        "values": np.vstack([v for _, _, v in outputs]) if outputs else np.empty((0, n_days))
+    }
+
+
 def update_excel_with_forecast(forecast_results, excel_path="./temp_uploads/Harga_pangan_harian.xlsx", 
                               output_path="./temp_uploads/Harga_pangan_harian.xlsx"):
     """
@@ -138,10 +266,8 @@ def update_excel_with_forecast(forecast_results, excel_path="./temp_uploads/Harg
     """
     try:
         logger.info(f"Reading Excel file: {excel_path}")
-        df_excel = pd.read_excel(excel_path)
-        
-        # Convert Tanggal column to datetime
-        df_excel['Tanggal'] = pd.to_datetime(df_excel['Tanggal'], format='%d/%m/%y')
+        # Tanggal di-parse ke datetime; harga tetap float64 karena workbook ditulis ulang
+        df_excel = read_excel_compact(excel_path, dates={'Tanggal': '%d/%m/%y'}, float_dtype=None)
         
         logger.info(f"Excel data shape: {df_excel.shape}")
         logger.info(f"Excel date range: {df_excel['Tanggal'].min()} to {df_excel['Tanggal'].max()}")
@@ -153,34 +279,6 @@ def update_excel_with_forecast(forecast_results, excel_path="./temp_uploads/Harg
         updated_count = 0
         extended_count = 0
         
-        # Target mapping yang diperluas untuk mapping nama target ke kolom Excel
-        target_mapping = {
-            "Beras_Premium": "Beras Premium",
-            "Beras_Medium": "Beras Medium", 
-            "Beras_SPHP": "Beras SPHP",
-            "Jagung_Tk_Peternak": "Jagung Tk Peternak",
-            "Kedelai_Biji_Kering_Impor": "Kedelai Biji Kering (Impor)",
-            "Bawang_Merah": "Bawang Merah",
-            "Bawang_Putih_Bonggol": "Bawang Putih Bonggol",
-            "Cabai_Merah_Keriting": "Cabai Merah Keriting",
-            "Cabai_Merah_Besar": "Cabai Merah Besar",
-            "Daging_Sapi": "Daging Sapi Murni",
-            "Cabai_Rawit_Merah": "Cabai Rawit Merah",
-            "Daging_Ayam_Ras": "Daging Ayam Ras",
-            "Telur_Ayam_Ras": "Telur Ayam Ras",
-            "Gula_Konsumsi": "Gula Konsumsi",
-            "Minyak_Goreng_Kemasan": "Minyak Goreng Kemasan",
-            "Minyak_Goreng_Curah": "Minyak Goreng Curah",
-            "Tepung_Terigu_Curah": "Tepung Terigu (Curah)",
-            "Minyakita": "Minyakita",
-            "Tepung_Terigu_Kemasan": "Tepung Terigu Kemasan",
-            "Ikan_Kembung": "Ikan Kembung",
-            "Ikan_Tongkol": "Ikan Tongkol",
-            "Ikan_Bandeng": "Ikan Bandeng",
-            "Garam_Konsumsi": "Garam Konsumsi",
-            "Daging_Kerbau_Beku_Impor": "Daging Kerbau Beku (Impor Luar Negeri)",
-            "Daging_Kerbau_Segar_Lokal": "Daging Kerbau Segar (Lokal)"
-        }
         
         # Collect all dates that need to be added
         all_forecast_dates = set()
@@ -224,7 +322,7 @@ def update_excel_with_forecast(forecast_results, excel_path="./temp_uploads/Harg
         for target, forecast_df in forecast_results.items():
             logger.info(f"Processing target: {target}")
             
-            excel_col = target_mapping.get(target, target)
+            excel_col = TARGET_MAPPING.get(target, target)
             forecast_col = f"Forecast_{target}"
             
             if excel_col not in df_excel.columns:
@@ -248,6 +346,7 @@ def update_excel_with_forecast(forecast_results, excel_path="./temp_uploads/Harg
                     updated_count += 1
         
         # Apply all updates at once to avoid fragmentation
+        df_excel = upcast_int_columns(df_excel, forecast_updates)
         for col, updates in forecast_updates.items():
             for idx, value in updates.items():
                 df_excel.loc[idx, col] = value
@@ -261,8 +360,8 @@ def update_excel_with_forecast(forecast_results, excel_path="./temp_uploads/Harg
         # Convert Tanggal back to the original format for Excel
         df_excel['Tanggal'] = df_excel['Tanggal'].dt.strftime('%d/%m/%y')
         
-        # Save updated Excel file
-        df_excel.to_excel(output_path, index=False)
+        # Save updated Excel file (streaming, write-only)
+        write_frame(df_excel, output_path)
         
         logger.info(f"Excel updated successfully! Updates: {updated_count}, New rows: {extended_count}")
         logger.info(f"Saved to: {output_path}")
@@ -281,4 +380,226 @@ def update_excel_with_forecast(forecast_results, excel_path="./temp_uploads/Harg
         return {"status": "error", "message": f"File not found: {excel_path}"}
     except Exception as e:
         logger.error(f"Error updating Excel: {str(e)}")
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+def read_actuals(excel_path, target_columns, after=None, until=None):
+    """
+    Baca harga aktual dari workbook harian sebagai DataFrame dengan nama kolom target model.
+
+    Args:
+        excel_path: path workbook (kolom Tanggal format '%d/%m/%y')
+        target_columns: nama target model
+        after: hanya tanggal setelah ini
+        until: hanya tanggal sampai dengan ini (baris forecast di masa depan diabaikan)
+    """
+    # Presisi asli dipertahankan: hasilnya jadi histori model/label training dan dibandingkan
+    # persis dengan forecast yang dibulatkan
+    df_excel = read_excel_compact(excel_path, dates={'Tanggal': '%d/%m/%y'}, float_dtype=None)
+
+    rename = {TARGET_MAPPING.get(t, t): t for t in target_columns if TARGET_MAPPING.get(t, t) in df_excel.columns}
+    actuals = df_excel[['Tanggal'] + list(rename)].rename(columns=rename)
+
+    if after is not None:
+        actuals = actuals[actuals['Tanggal'] > after]
+    if until is not None:
+        actuals = actuals[actuals['Tanggal'] <= until]
+    targets = list(rename.values())
+    return actuals.dropna(subset=targets, how='all').sort_values('Tanggal').reset_index(drop=True)
+
+
+def forecast_row_mask(dates, values, model_last_date, forecast_path, max_horizon=FORECAST_ROW_HORIZON):
+    """
+    Mask baris workbook yang berisi forecast model (ditulis route with_excel, dibulatkan ke rupiah),
+    bukan harga aktual: semua harga yang terisi sama dengan prediksi model untuk tanggal itu.
+
+    Args:
+        dates: tanggal tiap baris
+        values: harga [n_baris, n_target], 0/NaN = kosong
+        model_last_date: tanggal terakhir histori model
+        forecast_path: fungsi horizon -> prediksi model hari 1..horizon [horizon, n_target]
+        max_horizon: baris lebih jauh dari ini tidak dianggap forecast
+    """
+    values = np.asarray(np.atleast_2d(values), dtype=np.float64)
+    values = np.where(values == 0, np.nan, values)
+    horizons = np.asarray((pd.DatetimeIndex(dates) - model_last_date).days)
+    in_range = (horizons >= 1) & (horizons <= max_horizon)
+    mask = np.zeros(len(values), dtype=bool)
+    if not in_range.any():
+        return mask
+    predicted = np.round(forecast_path(int(horizons[in_range].max()))[horizons[in_range] - 1], 0)
+    rows = values[in_range]
+    present = ~np.isnan(rows)
+    mask[in_range] = present.any(axis=1) & np.all(~present | (rows == predicted), axis=1)
+    return mask
+
+
+def model_forecast_path(model_data, targets, horizon):
+    """Prediksi model hari 1..horizon setelah tanggal terakhirnya [horizon, len(targets)], NaN untuk target lain."""
+    outputs = recursive_forecast(build_series(model_data), horizon)
+    predicted = {s["target"]: values for s, _, values in outputs}
+    return np.column_stack([
+        np.asarray(predicted[t], dtype=np.float64) if t in predicted else np.full(horizon, np.nan)
+        for t in targets
+    ])
+
+
+def drop_forecast_rows(actuals, model_data):
+    """
+    Buang baris hasil read_actuals() yang berisi forecast model_data sendiri, supaya forecast
+    yang pernah ditulis ke workbook tidak dipakai sebagai histori atau label training.
+    """
+    targets = [c for c in actuals.columns if c != 'Tanggal']
+    if actuals.empty or not targets:
+        return actuals
+    model_last_date = pd.Timestamp(model_data["last_data"]["Tanggal"].iloc[-1])
+    mask = forecast_row_mask(actuals['Tanggal'], actuals[targets].to_numpy(dtype=np.float64), model_last_date,
+                             lambda horizon: model_forecast_path(model_data, targets, horizon))
+    if mask.any():
+        logger.info(f"Skipped {int(mask.sum())} forecast rows in workbook")
+    return actuals[~mask].reset_index(drop=True)
+
+
+def _history_features(history, new_rows, target_col, lag_periods, rolling_windows):
+    """
+    Lag dan rolling features untuk baris baru saja, dihitung dari ekor histori
+    (bukan seluruh histori), dengan konvensi yang sama dengan recursive_forecast().
+    """
+    lookback = max(list(lag_periods) + list(rolling_windows))
+    combined = pd.concat([history[target_col].tail(lookback), new_rows[target_col]], ignore_index=True)
+    n_new = len(new_rows)
+    features = {}
+    for lag in lag_periods:
+        features[f"{target_col}_lag_{lag}"] = combined.shift(lag).to_numpy()[-n_new:]
+    for window in rolling_windows:
+        rolled = combined.shift(1).rolling(window, min_periods=1)
+        features[f"{target_col}_rolling_mean_{window}"] = rolled.mean().to_numpy()[-n_new:]
+        features[f"{target_col}_rolling_std_{window}"] = rolled.std(ddof=0).to_numpy()[-n_new:]
+        features[f"{target_col}_rolling_min_{window}"] = rolled.min().to_numpy()[-n_new:]
+        features[f"{target_col}_rolling_max_{window}"] = rolled.max().to_numpy()[-n_new:]
+    return features
+
+
+def refresh_model_with_actuals(model_data, excel_path="./temp_uploads/Harga_pangan_harian.xlsx", until=None,
+                               refit=False, refit_window=90, num_boost_round=20):
+    """
+    Tambahkan harga aktual terbaru ke buffer histori model (last_data) tanpa retrain penuh.
+    Lag dan rolling features hanya dihitung untuk hari-hari baru.
+
+    Args:
+        model_data: dict model bahan pokok (tidak diubah, hasil berupa salinan)
+        excel_path: workbook harga harian
+        until: tanggal aktual terakhir yang dipakai (default: hari ini, baris forecast diabaikan)
+        refit: lanjutkan boosting (init_model) tiap target pada window terbaru
+        refit_window: jumlah hari terakhir untuk refit
+        num_boost_round: jumlah boosting round tambahan saat refit
+
+    Returns:
+        tuple: (model_data baru, dict ringkasan refresh)
+    """
+    last_data = model_data["last_data"]
+    target_columns = model_data["target_columns"]
+    lag_periods = model_data["lag_periods"]
+    rolling_windows = model_data["rolling_windows"]
+    last_date = pd.Timestamp(last_data["Tanggal"].iloc[-1])
+    until = pd.Timestamp(until) if until is not None else pd.Timestamp(datetime.today().date())
+
+    # Baris forecast yang ditulis route with_excel bukan harga aktual
+    actuals = drop_forecast_rows(read_actuals(excel_path, target_columns, after=last_date, until=until), model_data)
+    if actuals.empty:
+        logger.info(f"No new actuals after {last_date.date()}")
+        return model_data, {"new_days": 0, "last_date": last_date.strftime('%Y-%m-%d'), "refitted_targets": []}
+
+    # Hari tanpa data (libur, belum diinput) diisi nilai terakhir agar lag tetap berjarak harian.
+    # Harga 0 berarti tidak ada data (sama seperti load_training_history), bukan harga aktual
+    full_dates = pd.date_range(last_date + pd.Timedelta(days=1), actuals['Tanggal'].max(), freq="D")
+    actuals = actuals.set_index('Tanggal').reindex(full_dates).reindex(columns=target_columns)
+    last_known = last_data[target_columns].replace(0, np.nan).ffill().iloc[-1]
+    actuals = actuals.replace(0, np.nan).ffill().fillna(last_known)
+    new_rows = actuals.rename_axis('Tanggal').reset_index()
+
+    features = {}
+    calendar = _calendar_features(new_rows['Tanggal'])
+    for name in CALENDAR_FEATURES:
+        features[name] = calendar[name]
+    for target_col in target_columns:
+        features.update(_history_features(last_data, new_rows, target_col, lag_periods, rolling_windows))
+
+    # Semua kolom dirakit sekali (ratusan kolom fitur), bukan di-assign satu per satu ke DataFrame
+    columns = {}
+    for col in last_data.columns:
+        if col in features:
+            columns[col] = features[col]
+        elif col in new_rows.columns:
+            columns[col] = new_rows[col].to_numpy()
+        else:
+            columns[col] = np.full(len(new_rows), np.nan)
+    new_rows = pd.DataFrame(columns)
+
+    # Buffer histori tetap sepanjang aslinya (hanya ekor yang dipakai forecast)
+    updated_last_data = pd.concat([last_data, new_rows], ignore_index=True).tail(len(last_data)).reset_index(drop=True)
+
+    refreshed = dict(model_data)
+    refreshed["last_data"] = updated_last_data
+
+    refitted = []
+    if refit:
+        refreshed["forecast_results"] = {t: dict(v) for t, v in model_data["forecast_results"].items()}
+        refitted = _continue_boosting(refreshed, refit_window, num_boost_round)
+
+    summary = {
+        "new_days": len(new_rows),
+        "previous_last_date": last_date.strftime('%Y-%m-%d'),
+        "last_date": updated_last_data["Tanggal"].iloc[-1].strftime('%Y-%m-%d'),
+        "refitted_targets": refitted
+    }
+    logger.info(f"Model history refreshed: {summary}")
+    return refreshed, summary
+
+
+# Alias parameter LightGBM untuk jumlah iterasi dan early stopping
+ITERATION_PARAMS = ("num_iterations", "num_iteration", "n_iter", "num_tree", "num_trees", "num_round", "num_rounds",
+                    "nrounds", "num_boost_round", "n_estimators", "max_iter", "early_stopping_round",
+                    "early_stopping_rounds", "early_stopping", "n_iter_no_change")
+
+
+def _continue_boosting(model_data, refit_window, num_boost_round):
+    """Lanjutkan boosting setiap target dengan init_model pada window histori terbaru."""
+    import lightgbm as lgb
+
+    feature_cols = model_data["feature_cols"]
+    recent = model_data["last_data"].tail(refit_window)
+    missing = [c for c in feature_cols if c not in recent.columns]
+    if missing:
+        logger.warning(f"Refit skipped: last_data tidak memuat {len(missing)} feature columns")
+        return []
+
+    recent = recent.dropna(subset=feature_cols)
+    refitted = []
+    for target_col in model_data["target_columns"]:
+        entry = model_data["forecast_results"][target_col]
+        model = entry["model"]
+        params = dict(getattr(model, "params", None) or {"objective": "regression"})
+        params["verbose"] = -1
+        # Jumlah round/early stopping dari training awal akan menimpa num_boost_round
+        for key in ITERATION_PARAMS:
+            params.pop(key, None)
+
+        # Label log(harga): harga 0/kosong menghasilkan -inf/NaN dan tidak ikut refit
+        with np.errstate(divide="ignore", invalid="ignore"):
+            labels = np.log(recent[target_col].to_numpy(dtype=np.float64))
+        valid = np.isfinite(labels)
+        if not valid.any():
+            logger.warning(f"Refit {target_col} skipped: tidak ada harga valid di window refit")
+            continue
+
+        # Lanjutkan dari model sampai best_iteration saja (tree setelah titik early stopping dibuang)
+        if model.best_iteration > 0:
+            model = lgb.Booster(model_str=model.model_to_string(num_iteration=model.best_iteration))
+        train_set = lgb.Dataset(recent[feature_cols][valid], labels[valid])
+        booster = lgb.train(params, train_set, num_boost_round=num_boost_round,
+                            init_model=model, keep_training_booster=True)
+        booster.best_iteration = booster.current_iteration()
+        entry["model"] = booster
+        refitted.append(target_col)
+    return refitted
+
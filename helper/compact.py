@@ -0,0 +1,135 @@
+import os
+from loguru import logger
+from utils import lazy_import
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+MONTH_NAMES = ["Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli", "Agustus",
+               "September", "Oktober", "November", "Desember"]
+# Dtype harga/indeks di memori; kosongkan (COMPACT_FLOAT_DTYPE=) untuk tetap float64
+FLOAT_DTYPE = os.getenv("COMPACT_FLOAT_DTYPE", "float32") or None
+
+
+def nbytes(obj):
+    """Memori DataFrame/Series (deep, termasuk string object) atau ndarray."""
+    memory_usage = getattr(obj, "memory_usage", None)
+    if callable(memory_usage):
+        usage = memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    return int(getattr(obj, "nbytes", 0))
+
+
+def _report(before, after):
+    return {"bytes_before": before, "bytes_after": after, "bytes_saved": before - after}
+
+
+def month_category(values):
+    """
+    Nama bulan Indonesia -> categorical terurut (kode int8), sehingga bisa di-sort langsung.
+    Kolom dengan nilai di luar MONTH_NAMES dikembalikan apa adanya.
+    """
+    series = pd.Series(values)
+    present = series.dropna()
+    if present.empty or not present.isin(MONTH_NAMES).all():
+        return values
+    return pd.Categorical(series, categories=MONTH_NAMES, ordered=True)
+
+
+def compact_frame(df, float_dtype=FLOAT_DTYPE, dates=None):
+    """
+    Layout ringkas DataFrame: kolom float menjadi satu blok float32 kontigu (satu baris per kolom,
+    sehingga histori per target kontigu), integer di-downcast, kolom Bulan menjadi categorical,
+    dan kolom tanggal string di-parse ke datetime64.
+
+    Args:
+        df: DataFrame sumber (tidak diubah)
+        float_dtype: dtype kolom float, None untuk tidak mengubah presisi kolom numerik (float dan
+            integer tetap apa adanya, mis. workbook yang ditulis ulang)
+        dates: dict kolom -> format tanggal (mis. {"Tanggal": "%d/%m/%y"})
+
+    Returns:
+        tuple: (DataFrame ringkas, dict laporan bytes)
+    """
+    before = nbytes(df)
+    dates = dates or {}
+    float_cols = [c for c in df.columns if pd.api.types.is_float_dtype(df[c])] if float_dtype else []
+
+    if float_cols:
+        block = np.ascontiguousarray(df[float_cols].to_numpy(dtype=float_dtype).T)
+        compacted = pd.DataFrame(block.T, index=df.index, columns=float_cols, copy=False)
+    else:
+        compacted = pd.DataFrame(index=df.index)
+
+    others = {}
+    for col in df.columns:
+        if col in float_cols:
+            continue
+        values = df[col]
+        if col in dates and not pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.to_datetime(values, format=dates[col])
+        elif float_dtype and pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            values = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            values = month_category(values)
+        others[col] = values
+    if others:
+        compacted = pd.concat([compacted, pd.DataFrame(others, index=df.index)], axis=1)
+    compacted = compacted[list(df.columns)]
+
+    return compacted, _report(before, nbytes(compacted))
+
+
+def compact_model_data(model_data, float_dtype=FLOAT_DTYPE):
+    """
+    Salinan model_data dengan state histori dalam layout ringkas:
+    - bahan pokok: last_data lewat compact_frame
+    - IHK: last_data/second_last_data menjadi view dari satu blok [2, target] float32,
+      hanya berisi target_cols (satu-satunya entri yang dibaca saat forecast)
+
+    Returns:
+        tuple: (model_data, dict laporan bytes)
+    """
+    if not isinstance(model_data, dict) or float_dtype is None:
+        return model_data, _report(0, 0)
+
+    compacted = dict(model_data)
+    last_data = model_data.get("last_data")
+    second_last_data = model_data.get("second_last_data")
+
+    if isinstance(last_data, pd.DataFrame):
+        compacted["last_data"], report = compact_frame(last_data, float_dtype)
+        return compacted, report
+
+    if isinstance(last_data, pd.Series) and isinstance(second_last_data, pd.Series) and "target_cols" in model_data:
+        targets = list(model_data["target_cols"])
+        before = nbytes(last_data) + nbytes(second_last_data)
+        block = np.vstack([
+            pd.to_numeric(last_data[targets]).to_numpy(dtype=np.float64),
+            pd.to_numeric(second_last_data[targets]).to_numpy(dtype=np.float64)
+        ]).astype(float_dtype)
+        index = pd.Index(targets)
+        compacted["last_data"] = pd.Series(block[0], index=index, name=last_data.name, copy=False)
+        compacted["second_last_data"] = pd.Series(block[1], index=index, name=second_last_data.name, copy=False)
+        return compacted, _report(before, nbytes(compacted["last_data"]) + nbytes(compacted["second_last_data"]))
+
+    return model_data, _report(0, 0)
+
+
+def upcast_int_columns(df, columns):
+    """
+    Kolom integer yang akan ditimpa nilai forecast dijadikan float64. Kolom harga di workbook bisa
+    ter-load sebagai int64, dan pandas 3 menolak assignment nilai pecahan/di luar range ke kolom integer.
+    """
+    columns = [c for c in columns if c in df.columns and pd.api.types.is_integer_dtype(df[c])
+               and not pd.api.types.is_bool_dtype(df[c])]
+    if columns:
+        df = df.astype({c: np.float64 for c in columns})
+    return df
+
+
+def read_excel_compact(path, dates=None, float_dtype=FLOAT_DTYPE):
+    """pd.read_excel + compact_frame, dengan log bytes yang dihemat."""
+    df, report = compact_frame(pd.read_excel(path), float_dtype=float_dtype, dates=dates)
+    logger.info(f"Workbook {path} compacted: {report['bytes_before']} -> {report['bytes_after']} bytes")
+    return df
@@ -0,0 +1,276 @@
+import os
+import re
+import asyncio
+import sqlite3
+import difflib
+import threading
+import time
+from collections import OrderedDict
+from loguru import logger
+from utils import CHECKLIST_FILENAME_MAPPING
+from helper.file_events import subscribe
+
+DEFAULT_ROOT = "./temp_uploads"
+WATCH_INTERVAL_SECONDS = 10
+# Jumlah root directory yang index-nya disimpan (root default selalu dipertahankan)
+MAX_INDEXES = int(os.getenv("DOCUMENT_INDEX_MAX_ROOTS", "16"))
+
+# Satu file DB (DOCUMENT_INDEX_DB) bisa dipakai banyak root, jadi setiap baris menyimpan root-nya
+SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    dir TEXT NOT NULL,
+    project TEXT NOT NULL,
+    name TEXT NOT NULL,
+    norm_name TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    PRIMARY KEY (root, path)
+);
+CREATE INDEX IF NOT EXISTS idx_documents_project_name ON documents(root, project, name);
+CREATE INDEX IF NOT EXISTS idx_documents_dir ON documents(root, dir);
+CREATE TABLE IF NOT EXISTS directories (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime REAL,
+    PRIMARY KEY (root, path)
+);
+"""
+
+
+def _init_schema(conn):
+    # Index hanya cache dari disk: schema lama cukup dibuang dan dibangun ulang
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        conn.executescript("DROP TABLE IF EXISTS documents; DROP TABLE IF EXISTS directories;")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.executescript(_SCHEMA)
+
+
+def normalize_name(name):
+    """Normalisasi nama file untuk fuzzy matching: lowercase, tanpa ekstensi dan tanda baca."""
+    stem = os.path.splitext(name)[0].lower()
+    return re.sub(r"[^a-z0-9]+", " ", stem).strip()
+
+
+class DocumentIndex:
+    """
+    Index dokumen hasil upload per project (subfolder pertama di bawah root) di SQLite.
+    Di-update lewat upsert saat upload dan polling mtime direktori (hanya direktori yang berubah
+    yang di-scan ulang), sehingga query checklist tidak perlu menyentuh disk.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, db_path=":memory:"):
+        self.root = os.path.abspath(root)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        _init_schema(self._conn)
+        self._last_refresh = None
+
+    def _project_of(self, path):
+        rel = os.path.relpath(path, self.root)
+        parts = rel.split(os.sep)
+        return parts[0] if len(parts) > 1 else ""
+
+    def _scan_directory(self, dirpath):
+        rows = []
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                if entry.name.startswith((".", "~$")) or not entry.is_file():
+                    continue
+                st = entry.stat()
+                rows.append((self.root, entry.path, dirpath, self._project_of(entry.path), entry.name,
+                             normalize_name(entry.name), st.st_size, st.st_mtime))
+        self._conn.execute("DELETE FROM documents WHERE root = ? AND dir = ?", (self.root, dirpath))
+        self._conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._conn.execute("INSERT OR REPLACE INTO directories VALUES (?, ?, ?)",
+                           (self.root, dirpath, os.stat(dirpath).st_mtime))
+
+    def refresh(self):
+        """
+        Sinkronkan index dengan disk. Hanya direktori yang mtime-nya berubah yang di-scan ulang.
+
+        Returns:
+            int: jumlah direktori yang di-scan ulang
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, mtime FROM directories WHERE root = ?", (self.root,)))
+            seen = set()
+            rescanned = 0
+            for dirpath, dirnames, _ in os.walk(self.root):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                seen.add(dirpath)
+                mtime = os.stat(dirpath).st_mtime
+                if known.get(dirpath) != mtime:
+                    self._scan_directory(dirpath)
+                    rescanned += 1
+            for removed in set(known) - seen:
+                self._conn.execute("DELETE FROM directories WHERE root = ? AND path = ?", (self.root, removed))
+                self._conn.execute("DELETE FROM documents WHERE root = ? AND dir = ?", (self.root, removed))
+            self._conn.commit()
+            self._last_refresh = time.monotonic()
+        if rescanned:
+            logger.debug(f"Document index refreshed: {rescanned} directories rescanned")
+        return rescanned
+
+    def _ensure_fresh(self, max_age=WATCH_INTERVAL_SECONDS):
+        # Tanpa watcher yang jalan, index tetap di-refresh paling lambat tiap max_age detik
+        if self._last_refresh is None or time.monotonic() - self._last_refresh > max_age:
+            self.refresh()
+
+    def upsert_file(self, path):
+        """Update index untuk satu file (dipanggil setelah upload), tanpa scan direktori."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if os.path.isfile(path):
+                st = os.stat(path)
+                name = os.path.basename(path)
+                self._conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (self.root, path, os.path.dirname(path), self._project_of(path), name,
+                                    normalize_name(name), st.st_size, st.st_mtime))
+            else:
+                self._conn.execute("DELETE FROM documents WHERE root = ? AND path = ?", (self.root, path))
+            self._conn.commit()
+
+    def _find_first(self, prefix, extension, project):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM documents WHERE root = ? AND project = ? AND name GLOB ? ORDER BY name LIMIT 1",
+                (self.root, project, f"{prefix}*{extension}")
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_first(self, prefix, extension, project=""):
+        """
+        Padanan Path.glob(f"{prefix}*{extension}") dalam satu project, dari index.
+        Tidak ada di index berarti tidak ada (index dijaga watcher dan file_events); disk hanya
+        dicek ulang jika path dari index ternyata sudah terhapus.
+        """
+        self._ensure_fresh()
+        path = self._find_first(prefix, extension, project)
+        if path is not None and not os.path.isfile(path):
+            self.refresh()
+            path = self._find_first(prefix, extension, project)
+        return path
+
+    def project_names(self, projects):
+        """Nama file per project untuk banyak project dalam satu query."""
+        self._ensure_fresh()
+        names = {p: [] for p in projects}
+        if not projects:
+            return names
+        placeholders = ",".join("?" * len(projects))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT project, name FROM documents WHERE root = ? AND project IN ({placeholders}) "
+                "ORDER BY project, name",
+                [self.root] + list(projects)
+            ).fetchall()
+        for project, name in rows:
+            names[project].append(name)
+        return names
+
+    def list_projects(self):
+        self._ensure_fresh()
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT DISTINCT project FROM documents WHERE root = ? ORDER BY project", (self.root,))]
+
+    def _validate_projects(self, projects):
+        # Nama project dari request: hanya subfolder yang dikenal index, tanpa path traversal
+        known = None
+        for project in projects:
+            if not project:
+                continue
+            if os.sep in project or "/" in project or ".." in project:
+                raise ValueError(f"Invalid project name: {project}")
+            if known is None:
+                known = set(self.list_projects())
+            if project not in known:
+                raise ValueError(f"Unknown project: {project}")
+
+    def check_checklist(self, items, projects=("",), fuzzy=False, cutoff=0.8):
+        """
+        Cek kelengkapan checklist dokumen untuk banyak project sekaligus.
+
+        Args:
+            items: nama item checklist (mis. "BA Test Commissioning")
+            projects: daftar project ("" = root directory)
+            fuzzy: cocokkan nama file yang mirip jika nama persisnya tidak ada
+            cutoff: batas kemiripan untuk fuzzy matching (0-1)
+
+        Returns:
+            dict: project -> list hasil per item (format sama dengan check_files_in_directory)
+
+        Raises:
+            ValueError: nama project tidak valid atau tidak ada di index
+        """
+        projects = list(projects)
+        self._validate_projects(projects)
+        names_by_project = self.project_names(projects)
+        results = {}
+        for project, names in names_by_project.items():
+            name_set = set(names)
+            norm_to_name = {normalize_name(n): n for n in names}
+            project_result = []
+            for item in items:
+                expected_file = CHECKLIST_FILENAME_MAPPING.get(item)
+                if expected_file is None:
+                    project_result.append({"item": item, "exists": False, "note": "No mapping defined"})
+                    continue
+                if expected_file in name_set:
+                    project_result.append({"item": item, "exists": True})
+                    continue
+                entry = {"item": item, "exists": False}
+                if fuzzy:
+                    match = difflib.get_close_matches(normalize_name(expected_file), list(norm_to_name), n=1, cutoff=cutoff)
+                    if match:
+                        entry = {"item": item, "exists": True, "matched_file": norm_to_name[match[0]], "fuzzy": True}
+                project_result.append(entry)
+            results[project] = project_result
+        return results
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_document_index(root=DEFAULT_ROOT):
+    """Instance DocumentIndex bersama per root directory (LRU, maksimal MAX_INDEXES root)."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = DocumentIndex(root, db_path=os.getenv("DOCUMENT_INDEX_DB", ":memory:"))
+        _indexes.move_to_end(root)
+        default_root = os.path.abspath(DEFAULT_ROOT)
+        for old_root in list(_indexes):
+            if len(_indexes) <= MAX_INDEXES:
+                break
+            if old_root not in (root, default_root):
+                del _indexes[old_root]
+        return _indexes[root]
+
+
+@subscribe
+def _on_file_changed(path):
+    # Upload baru langsung masuk index tanpa menunggu polling berikutnya
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        if path.startswith(index.root + os.sep):
+            index.upsert_file(path)
+
+
+async def watch_document_index(root=DEFAULT_ROOT, interval=WATCH_INTERVAL_SECONDS):
+    """Background task: polling perubahan direktori dan update index secara incremental."""
+    index = get_document_index(root)
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, index.refresh)
+        except Exception as e:
+            logger.error(f"Error refreshing document index: {str(e)}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,180 @@
+import os
+import io
+import asyncio
+import hashlib
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from helper.file_events import subscribe, notify_file_changed
+
+CACHE_DIR = Path("./temp_uploads/.ocr_cache")
+PAGE_SEPARATOR = "\f"
+DEFAULT_DPI = 300
+DEFAULT_LANG = "ind+eng"
+# Halaman dengan text layer sependek ini dianggap hasil scan dan tetap di-OCR
+MIN_TEXT_LAYER_CHARS = 20
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+    return _pool
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _ocr_image(png_bytes, lang):
+    """OCR satu gambar halaman dengan binary tesseract (terpasang di image Docker)."""
+    proc = subprocess.run(
+        ["tesseract", "stdin", "stdout", "-l", lang],
+        input=png_bytes,
+        capture_output=True,
+        check=True
+    )
+    return proc.stdout.decode("utf-8", errors="replace")
+
+
+def _process_page(pdf_path, page_index, dpi, lang, cache_dir):
+    """
+    Worker (jalan di process pool): ambil text layer jika ada, jika tidak render + OCR.
+    Hasil OCR di-cache berdasarkan hash isi halaman yang dirender.
+    """
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        page = pdf[page_index]
+        try:
+            textpage = page.get_textpage()
+            text = textpage.get_text_range()
+            textpage.close()
+            if len(text.strip()) >= MIN_TEXT_LAYER_CHARS:
+                return {"page": page_index, "text": text, "source": "text_layer"}
+
+            image = page.render(scale=dpi / 72).to_pil().convert("L")
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+    # Hasil OCR bergantung pada gambar (sudah mencakup dpi) dan bahasa tesseract
+    page_hash = hashlib.sha256(image.tobytes() + lang.encode()).hexdigest()
+    cache_file = Path(cache_dir) / "pages" / f"{page_hash}.txt"
+    if cache_file.exists():
+        return {"page": page_index, "text": cache_file.read_text(encoding="utf-8"), "source": "cache"}
+
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    text = _ocr_image(buf.getvalue(), lang)
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, cache_file)
+    return {"page": page_index, "text": text, "source": "ocr"}
+
+
+def convert_pdf_to_text(pdf_path, output_path=None, dpi=DEFAULT_DPI, lang=DEFAULT_LANG, cache_dir=CACHE_DIR):
+    """
+    Convert PDF ke teks secara lokal, halaman diproses paralel di process pool.
+
+    Args:
+        pdf_path: path file PDF
+        output_path: path file .txt hasil (default: sama dengan PDF, ekstensi .txt)
+        dpi: resolusi render untuk OCR
+        lang: bahasa tesseract
+        cache_dir: direktori cache hasil OCR
+
+    Returns:
+        dict: teks hasil, path output dan statistik sumber per halaman
+    """
+    import pypdfium2 as pdfium
+
+    pdf_path = str(pdf_path)
+    output_path = str(output_path or Path(pdf_path).with_suffix(".txt"))
+    cache_dir = Path(cache_dir)
+
+    # Dokumen yang sama persis (re-upload) dengan dpi/bahasa yang sama langsung dari cache, tanpa render/OCR
+    doc_hash = file_sha256(pdf_path)
+    doc_cache = cache_dir / "documents" / f"{doc_hash}-{dpi}-{lang}.txt"
+    if doc_cache.exists():
+        text = doc_cache.read_text(encoding="utf-8")
+        if not os.path.exists(output_path):
+            Path(output_path).write_text(text, encoding="utf-8")
+            notify_file_changed(output_path)
+        logger.info(f"Document cache hit for {pdf_path}")
+        return {
+            "text": text,
+            "output_path": output_path,
+            "sha256": doc_hash,
+            "pages": text.count(PAGE_SEPARATOR) + 1,
+            "sources": {"document_cache": 1}
+        }
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    n_pages = len(pdf)
+    pdf.close()
+
+    logger.info(f"Converting {pdf_path}: {n_pages} pages")
+    pool = _get_pool()
+    futures = [
+        pool.submit(_process_page, pdf_path, i, dpi, lang, str(cache_dir))
+        for i in range(n_pages)
+    ]
+    pages = sorted((f.result() for f in futures), key=lambda p: p["page"])
+
+    text = PAGE_SEPARATOR.join(p["text"] for p in pages)
+    sources = {}
+    for p in pages:
+        sources[p["source"]] = sources.get(p["source"], 0) + 1
+
+    doc_cache.parent.mkdir(parents=True, exist_ok=True)
+    doc_cache.write_text(text, encoding="utf-8")
+    Path(output_path).write_text(text, encoding="utf-8")
+    notify_file_changed(output_path)
+
+    logger.info(f"Converted {pdf_path} -> {output_path} ({sources})")
+    return {
+        "text": text,
+        "output_path": output_path,
+        "sha256": doc_hash,
+        "pages": n_pages,
+        "sources": sources
+    }
+
+
+async def convert_pdf_to_text_async(pdf_path, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: convert_pdf_to_text(pdf_path, **kwargs))
+
+
+def find_pending_pdfs(directory="./temp_uploads"):
+    """PDF yang belum punya file .txt atau .txt-nya lebih lama dari PDF-nya."""
+    pending = []
+    for pdf in Path(directory).rglob("*.pdf"):
+        if any(part.startswith(".") for part in pdf.parts):
+            continue
+        txt = pdf.with_suffix(".txt")
+        if not txt.exists() or txt.stat().st_mtime < pdf.stat().st_mtime:
+            pending.append(pdf)
+    return sorted(pending)
+
+
+@subscribe
+def _invalidate_converted_text(path):
+    # PDF baru/berubah: hapus .txt turunan yang sudah basi (hasil OCR per halaman tetap di cache)
+    if path.lower().endswith(".pdf"):
+        txt = Path(path).with_suffix(".txt")
+        if txt.exists() and txt.stat().st_mtime < Path(path).stat().st_mtime:
+            txt.unlink()
+            logger.info(f"Removed stale converted text: {txt}")
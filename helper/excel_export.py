@@ -0,0 +1,128 @@
+import os
+import math
+import stat
+import tempfile
+from datetime import date, datetime
+from loguru import logger
+from utils import lazy_import
+from helper.file_events import notify_file_changed
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+DATE_FORMAT = "%d/%m/%y"
+STREAM_CHUNK_SIZE = 64 * 1024
+# Workbook untuk download ditahan di memori sampai ukuran ini, selebihnya di file temporary sistem
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Permission workbook baru (mkstemp selalu 0600); file yang sudah ada mempertahankan permission-nya
+NEW_FILE_MODE = int(os.getenv("EXCEL_FILE_MODE", "644"), 8)
+
+
+def _cell_value(value, date_format):
+    """Nilai cell Excel: NaN/NaT -> kosong, tanggal -> teks date_format, scalar NumPy -> Python."""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date, np.datetime64)):
+        if pd.isna(value):
+            return None
+        return pd.Timestamp(value).strftime(date_format) if date_format else pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def iter_frame_rows(df):
+    """Baris DataFrame sebagai tuple tanpa membuat salinan per baris (itertuples)."""
+    return df.itertuples(index=False, name=None)
+
+
+def iter_column_rows(columns):
+    """Baris dari dict kolom -> array (semua array sama panjang), dibaca per baris."""
+    return zip(*columns.values())
+
+
+def _write(target, headers, rows, sheet_title, date_format):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    # write_only: baris langsung di-serialize ke file sheet, tidak ada object model per cell
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=str(header))
+        cell.font = Font(bold=True)  # sama seperti header pandas.to_excel
+        header_cells.append(cell)
+    sheet.append(header_cells)
+
+    count = 0
+    for row in rows:
+        sheet.append([_cell_value(v, date_format) for v in row])
+        count += 1
+    workbook.save(target)
+    return count
+
+
+def _target_mode(path):
+    """Permission file hasil: sama dengan file lama, atau NEW_FILE_MODE untuk file baru."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return NEW_FILE_MODE
+
+
+def write_workbook(path, headers, rows, sheet_title="Sheet1", date_format=DATE_FORMAT):
+    """
+    Tulis workbook secara streaming (memori konstan terhadap jumlah baris).
+    File ditulis ke .tmp lalu di-rename, sehingga pembaca tidak pernah melihat file setengah jadi.
+
+    Args:
+        path: file .xlsx tujuan
+        headers: nama kolom (header Bahasa Indonesia seperti workbook sumber)
+        rows: iterable baris (tuple/list), boleh generator
+        sheet_title: nama sheet
+        date_format: format teks kolom tanggal (None = simpan sebagai tanggal Excel)
+
+    Returns:
+        int: jumlah baris data yang ditulis
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx.tmp", dir=directory)
+    os.close(fd)
+    try:
+        count = _write(tmp_path, headers, rows, sheet_title, date_format)
+        os.chmod(tmp_path, _target_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Workbook written (streaming): {path}, {count} rows")
+    notify_file_changed(path)
+    return count
+
+
+def write_frame(df, path, sheet_title="Sheet1", date_format=DATE_FORMAT):
+    """Pengganti df.to_excel(path, index=False) dengan writer streaming."""
+    return write_workbook(path, list(df.columns), iter_frame_rows(df), sheet_title, date_format)
+
+
+def stream_workbook(headers, rows, sheet_title="Sheet1", date_format=DATE_FORMAT, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Workbook sebagai generator potongan bytes untuk StreamingResponse, tanpa file di temp_uploads.
+    Format xlsx (zip) baru lengkap setelah semua baris ditulis, jadi workbook dibangun dulu di
+    SpooledTemporaryFile (memori, pindah ke disk jika besar) lalu dikirim per chunk.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buffer:
+        _write(buffer, headers, rows, sheet_title, date_format)
+        buffer.seek(0)
+        while True:
+            chunk = buffer.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
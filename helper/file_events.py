@@ -0,0 +1,28 @@
+import os
+import threading
+from loguru import logger
+
+_subscribers = []
+_lock = threading.Lock()
+
+
+def subscribe(callback):
+    """
+    Daftarkan callback(path) yang dipanggil setiap kali file input berubah
+    (upload baru / file ditimpa), untuk invalidasi cache yang bergantung pada file tersebut.
+    """
+    with _lock:
+        _subscribers.append(callback)
+    return callback
+
+
+def notify_file_changed(path):
+    """Panggil semua subscriber untuk file yang berubah. Error subscriber hanya di-log."""
+    path = os.path.abspath(path)
+    with _lock:
+        callbacks = list(_subscribers)
+    for callback in callbacks:
+        try:
+            callback(path)
+        except Exception as e:
+            logger.error(f"Error in file change subscriber {getattr(callback, '__name__', callback)}: {str(e)}")
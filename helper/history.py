@@ -0,0 +1,218 @@
+import os
+import threading
+from loguru import logger
+from utils import lazy_import
+from helper.bahan_pokok import TARGET_MAPPING
+from helper.ihk import COLUMN_MAPPING
+from helper.compact import MONTH_NAMES
+from helper.model_store import data_path
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# kind -> (workbook, mapping nama model -> header Excel, granularity yang tersedia)
+HISTORY_SOURCES = {
+    "bahan_pokok": ("Harga_pangan_harian.xlsx", TARGET_MAPPING, ("daily", "weekly", "monthly")),
+    "ihk": ("IHK.xlsx", COLUMN_MAPPING, ("monthly",)),
+}
+ROLLUP_STATS = ("mean", "min", "max", "last", "count")
+SKIP_COLUMNS = {"No", "Tahun", "Bulan"}
+
+
+def period_start(days, granularity):
+    """Awal periode (datetime64[D]) untuk setiap tanggal: minggu mulai Senin, bulan mulai tanggal 1."""
+    if granularity == "weekly":
+        # 1970-01-01 adalah hari Kamis -> (hari + 3) % 7 = 0 untuk Senin
+        offset = (days.astype(np.int64) + 3) % 7
+        return days - offset.astype("timedelta64[D]")
+    if granularity == "monthly":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Granularity '{granularity}' tidak dikenal")
+
+
+def rollup(days, values, granularity):
+    """
+    Agregat per periode untuk baris harian yang sudah urut tanggal.
+    NaN (tidak ada data) diabaikan di semua statistik.
+
+    Returns:
+        tuple: (awal periode [n_periode], dict stat -> array [n_periode, n_kolom])
+    """
+    periods = period_start(days, granularity)
+    keys, starts = np.unique(periods, return_index=True)
+    if len(keys) == 0:
+        empty = np.empty((0, values.shape[1]))
+        return keys, {stat: empty for stat in ROLLUP_STATS}
+
+    present = ~np.isnan(values)
+    count = np.add.reduceat(present.astype(np.int64), starts, axis=0)
+    total = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+    # fmin/fmax mengabaikan NaN; periode tanpa data tetap NaN
+    minimum = np.fmin.reduceat(values, starts, axis=0)
+    maximum = np.fmax.reduceat(values, starts, axis=0)
+    row_index = np.where(present, np.arange(len(values))[:, None], -1)
+    last_row = np.maximum.reduceat(row_index, starts, axis=0)
+    last = np.where(last_row >= 0, values[np.maximum(last_row, 0), np.arange(values.shape[1])], np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, total / count, np.nan)
+    return keys, {"mean": mean, "min": minimum, "max": maximum, "last": last, "count": count}
+
+
+class HistoryIndex:
+    """
+    Index histori satu workbook: tanggal urut (datetime64[D]) + matriks nilai [tanggal, kolom],
+    dengan rollup mingguan/bulanan yang sudah dihitung. Query range = dua binary search + slice.
+    """
+
+    def __init__(self, kind, path):
+        self.kind = kind
+        self.path = path
+        _, mapping, self.granularities = HISTORY_SOURCES[kind]
+        self._to_target = {excel: target for target, excel in mapping.items()}
+        self.version = None
+        self.columns = []
+        self.days = np.empty(0, dtype="datetime64[D]")
+        self.values = np.empty((0, 0))
+        self.rollups = {}
+        self.lock = threading.Lock()
+
+    def _read(self):
+        df = pd.read_excel(self.path)
+        if self.kind == "ihk":
+            month = df["Bulan"].map({name: i + 1 for i, name in enumerate(MONTH_NAMES)})
+            df = df[month.notna()]
+            days = pd.to_datetime(pd.DataFrame({"year": df["Tahun"], "month": month[month.notna()], "day": 1}))
+        else:
+            days = pd.to_datetime(df["Tanggal"], format="%d/%m/%y")
+        columns = [c for c in df.columns if c not in SKIP_COLUMNS and pd.api.types.is_numeric_dtype(df[c])]
+        order = np.argsort(days.to_numpy(), kind="stable")
+        values = df[columns].to_numpy(dtype=np.float64)
+        # Harga/indeks 0 = tidak ada data; sebagai NaN agar tidak ikut mean/min/count rollup
+        values = np.where(values == 0, np.nan, values)
+        return (days.to_numpy().astype("datetime64[D]")[order],
+                values[order],
+                [self._to_target.get(c, c) for c in columns])
+
+    def refresh(self, version):
+        """
+        Sinkronkan dengan workbook. Jika kolom sama, hanya periode mulai dari baris pertama yang
+        berubah (baris baru / forecast yang ditimpa) yang dihitung ulang; selebihnya rollup lama dipakai.
+        """
+        days, values, columns = self._read()
+        first_changed = 0
+        if columns == self.columns and len(self.days):
+            n = min(len(days), len(self.days))
+            same = (days[:n] == self.days[:n]) & np.all(
+                (values[:n] == self.values[:n]) | (np.isnan(values[:n]) & np.isnan(self.values[:n])), axis=1)
+            first_changed = n if same.all() else int(np.argmin(same))
+            if first_changed == len(days) == len(self.days):
+                self.version = version
+                return 0
+            # Hanya baris akhir yang dihapus: periode baris terakhir yang tersisa ikut dihitung ulang
+            first_changed = min(first_changed, max(len(days) - 1, 0))
+
+        rollups = {}
+        for granularity in self.granularities[1:]:  # granularity pertama = data mentah workbook
+            keys, stats = self.rollups.get(granularity, (np.empty(0, dtype="datetime64[D]"), None))
+            if first_changed == 0 or stats is None:
+                rollups[granularity] = rollup(days, values, granularity)
+                continue
+            # Periode yang memuat baris pertama yang berubah dan sesudahnya dihitung ulang
+            changed_period = period_start(days[first_changed:first_changed + 1], granularity)[0]
+            keep = int(np.searchsorted(keys, changed_period))
+            start_row = int(np.searchsorted(days, changed_period))
+            new_keys, new_stats = rollup(days[start_row:], values[start_row:], granularity)
+            rollups[granularity] = (
+                np.concatenate([keys[:keep], new_keys]),
+                {stat: np.concatenate([stats[stat][:keep], new_stats[stat]]) for stat in ROLLUP_STATS}
+            )
+
+        self.days, self.values, self.columns, self.rollups = days, values, columns, rollups
+        self.version = version
+        logger.info(f"History index {self.kind} {self.path}: {len(days)} rows, recomputed from row {first_changed}")
+        return len(days) - first_changed
+
+    def column_indices(self, commodities):
+        """Nama target model atau header Excel -> posisi kolom; None = semua kolom."""
+        if not commodities:
+            return list(range(len(self.columns)))
+        lookup = {name: i for i, name in enumerate(self.columns)}
+        indices = []
+        for name in commodities:
+            target = self._to_target.get(name, name)
+            if target not in lookup:
+                raise ValueError(f"Komoditas '{name}' tidak ada di histori {self.kind}")
+            indices.append(lookup[target])
+        return indices
+
+    def query(self, commodities=None, start=None, end=None, granularity="daily", stats=("mean",)):
+        """
+        Range query [start, end] (inklusif) dalam layout kolumnar.
+
+        Args:
+            commodities: daftar komoditas (None = semua)
+            start, end: batas tanggal (None = tanpa batas)
+            granularity: daily/weekly/monthly (sesuai yang tersedia untuk kind)
+            stats: statistik rollup yang dikembalikan untuk weekly/monthly
+
+        Returns:
+            dict: tanggal (awal periode) dan nilai per komoditas
+        """
+        if granularity not in self.granularities:
+            raise ValueError(f"granularity untuk {self.kind} harus salah satu dari {list(self.granularities)}")
+        invalid = [s for s in stats if s not in ROLLUP_STATS]
+        if invalid:
+            raise ValueError(f"stats harus dari {list(ROLLUP_STATS)}")
+        columns = self.column_indices(commodities)
+        names = [self.columns[i] for i in columns]
+
+        native = granularity == self.granularities[0]
+        keys = self.days if native else self.rollups[granularity][0]
+        lo, hi = 0, len(keys)
+        if start is not None:
+            start = np.array([start], dtype="datetime64[D]")
+            if granularity != "daily":
+                start = period_start(start, granularity)  # periode yang memuat start ikut
+            lo = int(np.searchsorted(keys, start[0]))
+        if end is not None:
+            hi = int(np.searchsorted(keys, np.datetime64(end, "D"), side="right"))
+
+        result = {"granularity": granularity, "tanggal": np.datetime_as_string(keys[lo:hi], unit="D").tolist()}
+        if native:
+            block = self.values[lo:hi, columns]
+            result["values"] = {name: block[:, j] for j, name in enumerate(names)}
+        else:
+            rolled = self.rollups[granularity][1]
+            result["values"] = {
+                stat: {name: rolled[stat][lo:hi, i] for name, i in zip(names, columns)} for stat in stats
+            }
+        return result
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _file_version(path):
+    stat = os.stat(path)  # FileNotFoundError jika workbook belum di-upload
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_history(kind, region=None):
+    """
+    HistoryIndex untuk (kind, region), di-load saat pertama dipakai dan di-update
+    secara inkremental saat workbook berubah (mtime/ukuran).
+    """
+    if kind not in HISTORY_SOURCES:
+        raise ValueError(f"kind harus salah satu dari {list(HISTORY_SOURCES)}")
+    path = os.path.abspath(data_path(HISTORY_SOURCES[kind][0], region))
+    version = _file_version(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = HistoryIndex(kind, path)
+    with index.lock:
+        if index.version != version:
+            index.refresh(version)
+    return index
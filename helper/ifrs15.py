@@ -0,0 +1,280 @@
+import re
+from datetime import datetime
+from loguru import logger
+from utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Nama field hasil ekstraksi LLM (json_parse) yang diterima untuk setiap input
+FIELD_ALIASES = {
+    "contract_id": ("contract_id", "nomor_kontrak", "nomor_dokumen", "id"),
+    "transaction_price": ("transaction_price", "nilai_kontrak", "contract_value", "value"),
+    "start_date": ("start_date", "tanggal_mulai", "tanggal_awal"),
+    "end_date": ("end_date", "tanggal_selesai", "tanggal_akhir"),
+    "performance_obligations": ("performance_obligations", "kewajiban_pelaksanaan", "obligations"),
+}
+PO_ALIASES = {
+    "name": ("name", "nama", "deskripsi"),
+    "standalone_selling_price": ("standalone_selling_price", "ssp", "harga_jual_berdiri_sendiri", "nilai"),
+    "recognition": ("recognition", "pengakuan"),
+    "start_date": ("start_date", "tanggal_mulai"),
+    "end_date": ("end_date", "tanggal_selesai"),
+    "date": ("date", "satisfaction_date", "tanggal", "tanggal_serah_terima"),
+}
+POINT_IN_TIME = {"point_in_time", "point in time", "pada suatu waktu", "at a point in time"}
+
+BULAN = {
+    "januari": 1, "februari": 2, "maret": 3, "april": 4, "mei": 5, "juni": 6, "juli": 7,
+    "agustus": 8, "september": 9, "oktober": 10, "november": 11, "desember": 12,
+    "agu": 8, "agt": 8, "okt": 10, "des": 12, "jan": 1, "feb": 2, "mar": 3, "apr": 4,
+    "jun": 6, "jul": 7, "sep": 9, "nov": 11,
+}
+
+
+def _field(data, aliases, default=None):
+    for key in aliases:
+        if key in data and data[key] not in (None, ""):
+            return data[key]
+    return default
+
+
+def parse_amount(value):
+    """
+    Nilai rupiah dari angka atau teks hasil ekstraksi ("Rp 1.200.000.000,50", "Rp 1.000.000,-", "1,2 M", "1.5 juta",
+    "500 ribu"). Satuan miliar harus "M" (huruf besar) atau "miliar"/"milyar"; "m" kecil ditolak karena ambigu
+    (juta/meter). Huruf lain yang tersisa (mis. "10m2", "USD") juga ditolak.
+    """
+    if value is None:
+        raise ValueError("Nilai kosong")
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = re.sub(r"(?i)\b(rp|idr)\.?", "", str(value)).strip()
+    # Penulisan rupiah tanpa sen: "1.000.000,-" / "1.000.000.-"
+    text = re.sub(r"[.,]\s*-$", "", text).strip()
+    multiplier = 1
+    if text.endswith("M"):
+        multiplier = 1e9
+        text = text[:-1].strip()
+    else:
+        lowered = text.lower()
+        for suffix, factor in (("triliun", 1e12), ("miliar", 1e9), ("milyar", 1e9), ("juta", 1e6), ("jt", 1e6),
+                               ("ribu", 1e3), ("rb", 1e3)):
+            if lowered.endswith(suffix):
+                multiplier = factor
+                text = text[: -len(suffix)].strip()
+                break
+        else:
+            if re.search(r"\d\s*m$", text):
+                raise ValueError(f"Satuan 'm' pada '{value}' ambigu, gunakan 'M', 'miliar' atau 'juta'")
+    if re.search(r"[^\W\d_]", text):
+        raise ValueError(f"Satuan pada '{value}' tidak dikenal")
+    text = re.sub(r"[^\d.,-]", "", text)
+    if "," in text and "." in text:
+        # Format Indonesia: titik pemisah ribuan, koma desimal
+        text = text.replace(".", "").replace(",", ".") if text.rfind(",") > text.rfind(".") else text.replace(",", "")
+    elif "," in text:
+        text = text.replace(",", ".") if len(text.split(",")[-1]) != 3 else text.replace(",", "")
+    elif text.count(".") > 1 or (text.count(".") == 1 and len(text.split(".")[-1]) == 3 and multiplier == 1):
+        text = text.replace(".", "")
+    if not text:
+        raise ValueError(f"Nilai '{value}' tidak bisa dibaca")
+    return float(text) * multiplier
+
+
+def parse_date(value):
+    """Tanggal dari ISO, dd/mm/yyyy, atau format Indonesia ("1 Januari 2024")."""
+    if value is None:
+        raise ValueError("Tanggal kosong")
+    if isinstance(value, datetime):
+        return np.datetime64(value.date(), "D")
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y"):
+        try:
+            return np.datetime64(datetime.strptime(text, fmt).date(), "D")
+        except ValueError:
+            pass
+    match = re.match(r"^(\d{1,2})\s+([A-Za-z]+)\.?\s+(\d{4})$", text)
+    if match and match.group(2).lower() in BULAN:
+        day, month, year = int(match.group(1)), BULAN[match.group(2).lower()], int(match.group(3))
+        return np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", "D")
+    raise ValueError(f"Tanggal '{value}' tidak dikenali")
+
+
+def _flatten(contracts):
+    """Kontrak -> array per performance obligation (PO) untuk perhitungan vektor."""
+    contract_ids, prices = [], []
+    po_contract, po_names, po_ssp, po_start, po_end, po_point = [], [], [], [], [], []
+
+    for c_idx, contract in enumerate(contracts):
+        contract_id = str(_field(contract, FIELD_ALIASES["contract_id"], c_idx))
+        price = parse_amount(_field(contract, FIELD_ALIASES["transaction_price"]))
+        start = _field(contract, FIELD_ALIASES["start_date"])
+        end = _field(contract, FIELD_ALIASES["end_date"])
+        obligations = _field(contract, FIELD_ALIASES["performance_obligations"]) or [
+            {"name": "Kontrak", "standalone_selling_price": price}
+        ]
+        contract_ids.append(contract_id)
+        prices.append(price)
+
+        for po in obligations:
+            if isinstance(po, str):
+                po = {"name": po}
+            point = str(_field(po, PO_ALIASES["recognition"], "over_time")).lower().replace("-", "_") in POINT_IN_TIME
+            if point:
+                date = parse_date(_field(po, PO_ALIASES["date"], _field(po, PO_ALIASES["end_date"], end)))
+                po_start.append(date)
+                po_end.append(date)
+            else:
+                po_start.append(parse_date(_field(po, PO_ALIASES["start_date"], start)))
+                po_end.append(parse_date(_field(po, PO_ALIASES["end_date"], end)))
+            if po_end[-1] < po_start[-1]:
+                raise ValueError(f"Kontrak {contract_id}: tanggal selesai sebelum tanggal mulai")
+            po_contract.append(c_idx)
+            po_names.append(str(_field(po, PO_ALIASES["name"], f"PO {len(po_names) + 1}")))
+            # Tanpa SSP: dialokasikan rata antar PO
+            ssp = _field(po, PO_ALIASES["standalone_selling_price"])
+            po_ssp.append(parse_amount(ssp) if ssp is not None else 1.0)
+            po_point.append(point)
+
+    return {
+        "contract_ids": contract_ids,
+        "prices": np.array(prices, dtype=np.float64),
+        "po_contract": np.array(po_contract, dtype=np.int64),
+        "po_names": po_names,
+        "po_ssp": np.array(po_ssp, dtype=np.float64),
+        "po_start": np.array(po_start, dtype="datetime64[D]"),
+        "po_end": np.array(po_end, dtype="datetime64[D]"),
+        "po_point": np.array(po_point, dtype=bool),
+    }
+
+
+def _largest_remainder(exact_cents, group, group_totals):
+    """Bulatkan ke sen sehingga jumlah per grup tepat sama dengan total grup (deterministik)."""
+    floored = np.floor(exact_cents).astype(np.int64)
+    shortfall = group_totals - np.bincount(group, weights=floored, minlength=len(group_totals)).astype(np.int64)
+    # Urut per grup, sisa pecahan terbesar dulu (tie: urutan asli)
+    order = np.lexsort((np.arange(len(group)), -(exact_cents - floored), group))
+    first_in_group = np.searchsorted(group[order], group[order], side="left")
+    rank = np.arange(len(order)) - first_in_group
+    bump = np.zeros(len(group), dtype=np.int64)
+    bump[order] = (rank < shortfall[group[order]]).astype(np.int64)
+    return floored + bump
+
+
+def allocate_transaction_price(flat):
+    """Step 4: alokasi harga transaksi ke PO proporsional terhadap standalone selling price."""
+    price_cents = np.rint(flat["prices"] * 100).astype(np.int64)
+    ssp_total = np.bincount(flat["po_contract"], weights=flat["po_ssp"], minlength=len(price_cents))
+    if np.any(ssp_total[flat["po_contract"]] <= 0):
+        raise ValueError("Total standalone selling price harus lebih dari 0")
+    exact = price_cents[flat["po_contract"]] * flat["po_ssp"] / ssp_total[flat["po_contract"]]
+    return _largest_remainder(exact, flat["po_contract"], price_cents)
+
+
+def recognition_schedule(flat, allocated_cents):
+    """
+    Step 5: jadwal pengakuan pendapatan bulanan untuk semua PO sekaligus.
+    Over time: garis lurus per hari kalender; point in time: seluruhnya di bulan serah terima.
+
+    Returns:
+        tuple: (array awal bulan, matrix sen [n_po, n_bulan])
+    """
+    first = flat["po_start"].min().astype("datetime64[M]")
+    last = flat["po_end"].max().astype("datetime64[M]")
+    months = np.arange(first, last + 1)
+    month_start = months.astype("datetime64[D]")
+    month_end = (months + 1).astype("datetime64[D]")  # eksklusif
+
+    start = flat["po_start"][:, None]
+    end = flat["po_end"][:, None] + np.timedelta64(1, "D")  # eksklusif
+    overlap = (np.minimum(end, month_end[None, :]) - np.maximum(start, month_start[None, :])).astype(np.int64)
+    overlap = np.clip(overlap, 0, None).astype(np.float64)
+    total_days = overlap.sum(axis=1, keepdims=True)
+    share = overlap / total_days
+
+    # Pembulatan kumulatif: setiap baris tepat berjumlah nilai alokasinya
+    cumulative = np.rint(np.cumsum(share, axis=1) * allocated_cents[:, None]).astype(np.int64)
+    schedule = np.diff(cumulative, axis=1, prepend=0)
+    return months, schedule
+
+
+def compute_ifrs15(contracts, frequency="monthly"):
+    """
+    Alokasi harga transaksi dan jadwal pengakuan pendapatan untuk banyak kontrak sekaligus,
+    dari field hasil ekstraksi dokumen (lihat FIELD_ALIASES / PO_ALIASES).
+
+    Args:
+        contracts: list dict kontrak
+        frequency: "monthly" atau "quarterly"
+
+    Returns:
+        dict: per kontrak (alokasi + jadwal) dan total portofolio per periode
+    """
+    if frequency not in ("monthly", "quarterly"):
+        raise ValueError("frequency harus 'monthly' atau 'quarterly'")
+    if not contracts:
+        raise ValueError("Daftar kontrak kosong")
+
+    flat = _flatten(contracts)
+    allocated = allocate_transaction_price(flat)
+    months, schedule = recognition_schedule(flat, allocated)
+
+    periods = pd.PeriodIndex(months.astype("datetime64[ns]"), freq="M")
+    if frequency == "quarterly":
+        column_group, labels = pd.factorize(periods.asfreq("Q"))
+        aggregated = np.zeros((schedule.shape[0], len(labels)), dtype=np.int64)
+        np.add.at(aggregated.T, column_group, schedule.T)
+        schedule = aggregated
+        period_labels = [str(q) for q in labels]
+    else:
+        period_labels = [str(p) for p in periods]
+
+    n_contracts = len(flat["contract_ids"])
+    contract_schedule = np.zeros((n_contracts, schedule.shape[1]), dtype=np.int64)
+    np.add.at(contract_schedule, flat["po_contract"], schedule)
+
+    results = []
+    for c_idx, contract_id in enumerate(flat["contract_ids"]):
+        rows = np.flatnonzero(flat["po_contract"] == c_idx)
+        nonzero = np.flatnonzero(contract_schedule[c_idx])
+        results.append({
+            "contract_id": contract_id,
+            "transaction_price": flat["prices"][c_idx],
+            "allocation": [
+                {
+                    "performance_obligation": flat["po_names"][r],
+                    "standalone_selling_price": flat["po_ssp"][r],
+                    "allocated_price": allocated[r] / 100,
+                    "recognition": "point_in_time" if flat["po_point"][r] else "over_time",
+                    "start_date": str(flat["po_start"][r]),
+                    "end_date": str(flat["po_end"][r]),
+                }
+                for r in rows
+            ],
+            "schedule": {period_labels[i]: contract_schedule[c_idx, i] / 100 for i in nonzero},
+        })
+
+    logger.info(f"IFRS 15 computed for {n_contracts} contracts, {len(flat['po_names'])} obligations, "
+                f"{len(period_labels)} periods")
+    return {
+        "contracts": results,
+        "portfolio": {
+            "periods": period_labels,
+            "revenue": (contract_schedule.sum(axis=0) / 100).tolist(),
+            "total_transaction_price": float(flat["prices"].sum()),
+        },
+    }
+
+
+def format_calculation(result):
+    """Ringkasan hasil compute_ifrs15 sebagai konteks prompt, supaya LLM cukup menarasikan angka."""
+    lines = []
+    for contract in result["contracts"]:
+        lines.append(f"Kontrak {contract['contract_id']}: transaction price Rp {contract['transaction_price']:,.2f}")
+        for po in contract["allocation"]:
+            period = po["end_date"] if po["recognition"] == "point_in_time" else f"{po['start_date']} s.d. {po['end_date']}"
+            lines.append(f"- {po['performance_obligation']}: SSP Rp {po['standalone_selling_price']:,.2f}, "
+                         f"alokasi Rp {po['allocated_price']:,.2f}, {po['recognition']} ({period})")
+        lines.append("  Jadwal pengakuan: " + ", ".join(f"{k}: Rp {v:,.2f}" for k, v in contract["schedule"].items()))
+    return "\n".join(lines)
@@ -1,17 +1,40 @@
 import pickle
-import pandas as pd
-import numpy as np
 from datetime import datetime
 from loguru import logger
+from utils import lazy_import
+from helper.compact import read_excel_compact, upcast_int_columns
+from helper.excel_export import write_frame
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# Column mapping dari nama forecast ke nama Excel
+COLUMN_MAPPING = {
+    "Umum": "Umum",
+    "Makanan_Minuman_dan_Tembakau": "Makanan, Minuman dan Tembakau",
+    "Pakaian_dan_Alas_Kaki": "Pakaian dan Alas Kaki",
+    "Perumahan_Air_Listrik_dan_Bahan_Bakar_Rumah_Tangga": "Perumahan, Air, Listrik dan Bahan Bakar Rumah Tangga",
+    "Perlengkapan_Peralatan_dan_Pemeliharaan_Rutin_Rumah_Tangga": "Perlengkapan, Peralatan dan Pemeliharaan Rutin Rumah Tangga",
+    "Kesehatan": "Kesehatan",
+    "Transportasi": "Transportasi",
+    "Informasi_Komunikasi_dan_Jasa_Keuangan": "Informasi, Komunikasi dan Jasa Keuangan",
+    "Rekreasi_Olahraga_dan_Budaya": "Rekreasi, Olahraga dan Budaya",
+    "Pendidikan": "Pendidikan",
+    "Penyediaan_Makanan_dan_Minuman__Restoran": "Penyediaan Makanan dan Minuman/ Restoran",
+    "Perawatan_Pribadi_da_Jasa_Lainnya": "Perawatan Pribadi da Jasa Lainnya"
+}
+
 
 # Load model dan forecast
-def load_model_and_forecast(tahun, bulan, model_path='./models/lgbm_forecasting_model.pkl'):
+def load_model_and_forecast(tahun, bulan, model_path='./models/lgbm_forecasting_model.pkl', model_data=None):
     """
     Load model dan forecast untuk periode tertentu
+    (model_data: model yang sudah di-load, mis. dari ModelStore)
     """
     # Load model
-    with open(model_path, 'rb') as f:
-        model_data = pickle.load(f)
+    if model_data is None:
+        with open(model_path, 'rb') as f:
+            model_data = pickle.load(f)
 
     model = model_data['model']
     target_cols = model_data['target_cols']
@@ -66,13 +89,15 @@ def get_month_name(bulan_num):
     return bulan_names.get(bulan_num, 'Unknown')
 
 
-def forecast_multiple_periods(start_tahun, start_bulan, n_periods, model_path='./models/lgbm_forecasting_model.pkl'):
+def forecast_multiple_periods(start_tahun, start_bulan, n_periods, model_path='./models/lgbm_forecasting_model.pkl',
+                              model_data=None):
     """
     Forecast multiple periods sekaligus
     """
     # Load model
-    with open(model_path, 'rb') as f:
-        model_data = pickle.load(f)
+    if model_data is None:
+        with open(model_path, 'rb') as f:
+            model_data = pickle.load(f)
 
     model = model_data['model']
     target_cols = model_data['target_cols']
@@ -149,26 +174,12 @@ def update_excel_with_forecast(forecast_df, excel_path="./temp_uploads/IHK.xlsx"
     """
     try:
         logger.info(f"Reading Excel file: {excel_path}")
-        df_excel = pd.read_excel(excel_path)
+        # Bulan menjadi categorical; nilai indeks tetap float64 karena workbook ditulis ulang
+        df_excel = read_excel_compact(excel_path, float_dtype=None)
         
         logger.info(f"Excel data shape: {df_excel.shape}")
         logger.info(f"Excel columns: {df_excel.columns.tolist()}")
         
-        # Column mapping dari nama forecast ke nama Excel
-        column_mapping = {
-            "Umum": "Umum",
-            "Makanan_Minuman_dan_Tembakau": "Makanan, Minuman dan Tembakau",
-            "Pakaian_dan_Alas_Kaki": "Pakaian dan Alas Kaki",
-            "Perumahan_Air_Listrik_dan_Bahan_Bakar_Rumah_Tangga": "Perumahan, Air, Listrik dan Bahan Bakar Rumah Tangga",
-            "Perlengkapan_Peralatan_dan_Pemeliharaan_Rutin_Rumah_Tangga": "Perlengkapan, Peralatan dan Pemeliharaan Rutin Rumah Tangga",
-            "Kesehatan": "Kesehatan",
-            "Transportasi": "Transportasi",
-            "Informasi_Komunikasi_dan_Jasa_Keuangan": "Informasi, Komunikasi dan Jasa Keuangan",
-            "Rekreasi_Olahraga_dan_Budaya": "Rekreasi, Olahraga dan Budaya",
-            "Pendidikan": "Pendidikan",
-            "Penyediaan_Makanan_dan_Minuman__Restoran": "Penyediaan Makanan dan Minuman/ Restoran",
-            "Perawatan_Pribadi_da_Jasa_Lainnya": "Perawatan Pribadi da Jasa Lainnya"
-        }
         
         # Get current data info
         if 'Tahun' in df_excel.columns and 'Bulan' in df_excel.columns:
@@ -180,6 +191,9 @@ def update_excel_with_forecast(forecast_df, excel_path="./temp_uploads/IHK.xlsx"
         added_rows = 0
         processed_periods = 0
         
+        # Kolom target yang ter-load integer harus float agar nilai forecast (2 desimal) bisa ditulis
+        df_excel = upcast_int_columns(df_excel, COLUMN_MAPPING.values())
+
         # Process each forecast row
         for idx, forecast_row in forecast_df.iterrows():
             forecast_tahun = forecast_row['Tahun']
@@ -196,7 +210,7 @@ def update_excel_with_forecast(forecast_df, excel_path="./temp_uploads/IHK.xlsx"
                 row_idx = df_excel.index[existing_mask][0]
                 
                 # Update all target columns using mapping
-                for forecast_col, excel_col in column_mapping.items():
+                for forecast_col, excel_col in COLUMN_MAPPING.items():
                     if forecast_col in forecast_row and excel_col in df_excel.columns:
                         old_value = df_excel.loc[row_idx, excel_col]
                         new_value = round(forecast_row[forecast_col], 2)
@@ -214,7 +228,7 @@ def update_excel_with_forecast(forecast_df, excel_path="./temp_uploads/IHK.xlsx"
                 }
                 
                 # Map forecast columns to Excel columns
-                for forecast_col, excel_col in column_mapping.items():
+                for forecast_col, excel_col in COLUMN_MAPPING.items():
                     if forecast_col in forecast_row and excel_col in df_excel.columns:
                         new_row[excel_col] = round(forecast_row[forecast_col], 2)
                 
@@ -240,7 +254,7 @@ def update_excel_with_forecast(forecast_df, excel_path="./temp_uploads/IHK.xlsx"
         df_excel = df_excel.sort_values(['Tahun', 'Bulan_num']).drop('Bulan_num', axis=1).reset_index(drop=True)
         
         # Save updated Excel file
-        df_excel.to_excel(output_path, index=False)
+        write_frame(df_excel, output_path)
         
         logger.info(f"Excel updated successfully!")
         logger.info(f"Updates: {updated_count}, Added rows: {added_rows}, Processed periods: {processed_periods}")
@@ -266,7 +280,8 @@ def update_excel_with_forecast(forecast_df, excel_path="./temp_uploads/IHK.xlsx"
 
 def load_and_forecast_with_excel_update(tahun, bulan, excel_path="./temp_uploads/IHK.xlsx", 
                                        output_path="./temp_uploads/IHK_updated.xlsx",
-                                       model_path='./models/lgbm_forecasting_model.pkl'):
+                                       model_path='./models/lgbm_forecasting_model.pkl',
+                                       model_data=None):
     """
     Combined function: Load model, forecast, dan update Excel untuk satu periode
     """
@@ -274,7 +289,7 @@ def load_and_forecast_with_excel_update(tahun, bulan, excel_path="./temp_uploads
         logger.info(f"Starting forecast for {tahun} {bulan}")
         
         # Generate forecast
-        forecast_result = load_model_and_forecast(tahun, bulan, model_path)
+        forecast_result = load_model_and_forecast(tahun, bulan, model_path, model_data=model_data)
         
         # Update Excel
         excel_update_result = update_excel_with_forecast(
@@ -296,7 +311,8 @@ def load_and_forecast_with_excel_update(tahun, bulan, excel_path="./temp_uploads
 def forecast_multiple_periods_with_excel_update(start_tahun, start_bulan, n_periods, 
                                               excel_path="./temp_uploads/IHK.xlsx",
                                               output_path="./temp_uploads/IHK_updated.xlsx",
-                                              model_path='./models/lgbm_forecasting_model.pkl'):
+                                              model_path='./models/lgbm_forecasting_model.pkl',
+                                              model_data=None):
     """
     Combined function: Forecast multiple periods dan update Excel
     """
@@ -304,7 +320,8 @@ def forecast_multiple_periods_with_excel_update(start_tahun, start_bulan, n_peri
         logger.info(f"Starting multi-period forecast: {n_periods} periods from {start_tahun} {start_bulan}")
         
         # Generate multi-period forecast
-        forecast_result = forecast_multiple_periods(start_tahun, start_bulan, n_periods, model_path)
+        forecast_result = forecast_multiple_periods(start_tahun, start_bulan, n_periods, model_path,
+                                                    model_data=model_data)
         
         # Update Excel
         excel_update_result = update_excel_with_forecast(
@@ -325,7 +342,8 @@ def forecast_multiple_periods_with_excel_update(start_tahun, start_bulan, n_peri
 
 def get_next_month_forecast(model_path='./models/lgbm_forecasting_model.pkl',
                            excel_path="./temp_uploads/IHK.xlsx", 
-                           output_path="./temp_uploads/IHK_updated.xlsx"):
+                           output_path="./temp_uploads/IHK_updated.xlsx",
+                           model_data=None):
     """
     Helper function untuk forecast bulan depan dan update Excel
     Otomatis deteksi bulan depan dari tanggal sekarang
@@ -350,7 +368,8 @@ def get_next_month_forecast(model_path='./models/lgbm_forecasting_model.pkl',
             bulan=next_month,
             excel_path=excel_path,
             output_path=output_path,
-            model_path=model_path
+            model_path=model_path,
+            model_data=model_data
         )
         
         return result
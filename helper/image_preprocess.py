@@ -0,0 +1,128 @@
+import io
+import time
+import base64
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from utils import lazy_import
+
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+from loguru import logger
+
+# Pillow melepas GIL saat decode/resize/encode, jadi thread pool cukup
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="img-preprocess")
+
+DEFAULT_MAX_LONG_EDGE = 1600
+DEFAULT_QUALITY = 85
+MIN_QUALITY = 40
+
+
+def preprocess_image(image, max_long_edge=DEFAULT_MAX_LONG_EDGE, grayscale=False,
+                     quality=DEFAULT_QUALITY, max_bytes=None, crop_box=None):
+    """
+    Kecilkan gambar sebelum dikirim ke LLM multimodal.
+
+    Args:
+        image: path file atau bytes gambar asli
+        max_long_edge: panjang maksimum sisi terpanjang (pixel), None = tidak di-resize
+        grayscale: convert ke grayscale (cukup untuk cek tanda tangan)
+        quality: kualitas JPEG awal
+        max_bytes: budget ukuran hasil, kualitas diturunkan bertahap sampai muat
+        crop_box: region of interest (left, top, right, bottom) dalam pixel gambar asli,
+                  atau dalam rasio 0-1 jika semua nilai <= 1
+
+    Returns:
+        dict: bytes JPEG hasil, base64, ukuran dan statistik penghematan
+    """
+    start = time.perf_counter()
+
+    if isinstance(image, (bytes, bytearray)):
+        raw = bytes(image)
+    else:
+        with open(image, "rb") as f:
+            raw = f.read()
+
+    img = Image.open(io.BytesIO(raw))
+    source_format = img.format
+    img = ImageOps.exif_transpose(img)
+    original_size = img.size
+
+    if crop_box:
+        left, top, right, bottom = crop_box
+        if all(0 <= v <= 1 for v in crop_box):
+            w, h = img.size
+            left, top, right, bottom = left * w, top * h, right * w, bottom * h
+        img = img.crop((int(left), int(top), int(right), int(bottom)))
+
+    if max_long_edge and max(img.size) > max_long_edge:
+        # thumbnail() menjaga aspect ratio dan memakai draft() untuk JPEG
+        img.thumbnail((max_long_edge, max_long_edge), Image.LANCZOS)
+
+    if grayscale:
+        img = img.convert("L")
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    def _encode(q):
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=q, optimize=True)
+        return buf.getvalue()
+
+    encoded = _encode(quality)
+    while max_bytes and len(encoded) > max_bytes and quality > MIN_QUALITY:
+        quality = max(MIN_QUALITY, quality - 10)
+        encoded = _encode(quality)
+
+    processed_size = list(img.size)
+    # Jangan pernah kirim hasil yang lebih besar dari aslinya; hanya jika aslinya juga JPEG,
+    # karena hasilnya dikirim sebagai image/jpeg
+    if len(encoded) >= len(raw) and not (grayscale or crop_box) and source_format == "JPEG":
+        encoded = raw
+        processed_size = list(original_size)
+        quality = None  # bytes asli, kualitas encode tidak diketahui
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    b64 = base64.b64encode(encoded).decode()
+
+    return {
+        "bytes": encoded,
+        "base64": b64,
+        "stats": {
+            "original_bytes": len(raw),
+            "processed_bytes": len(encoded),
+            "bytes_saved": len(raw) - len(encoded),
+            "base64_bytes": len(b64),
+            "original_size": list(original_size),
+            "processed_size": processed_size,
+            "quality": quality,
+            "grayscale": grayscale,
+            "preprocess_ms": round(elapsed_ms, 2)
+        }
+    }
+
+
+async def preprocess_image_async(image, **kwargs):
+    """
+    Jalankan preprocess_image di thread pool agar event loop tidak terblokir.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, lambda: preprocess_image(image, **kwargs))
+
+
+async def preprocess_images(images, **kwargs):
+    """
+    Preprocess banyak gambar sekaligus secara paralel di thread pool.
+    """
+    results = await asyncio.gather(*(preprocess_image_async(img, **kwargs) for img in images))
+    total_saved = sum(r["stats"]["bytes_saved"] for r in results)
+    logger.info(f"Preprocessed {len(results)} images, saved {total_saved} bytes")
+    return results
+
+
+def estimate_upload_saving_ms(stats, uplink_mbps=10.0):
+    """
+    Estimasi waktu upload yang dihemat (ms) berdasarkan selisih ukuran base64.
+    """
+    saved_b64 = (stats["bytes_saved"] * 4) / 3
+    saved_ms = (saved_b64 * 8) / (uplink_mbps * 1_000_000) * 1000
+    return round(saved_ms - stats["preprocess_ms"], 2)
@@ -0,0 +1,437 @@
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import threading
+from collections.abc import Mapping
+from loguru import logger
+from utils import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+# File yang tidak lagi dirujuk manifest baru dihapus setelah masa tenggang ini,
+# agar model lama yang masih dipakai request berjalan tetap bisa lazy-load booster-nya
+PRUNE_GRACE_SECONDS = 3600
+# Pickle hanya untuk model lama yang belum dikonversi; jika artifact native sudah ada di
+# sampingnya, pickle selalu ditolak (lihat load_model)
+ALLOW_PICKLE = os.getenv("MODEL_ALLOW_PICKLE", "true").lower() == "true"
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def is_native_artifact(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def artifact_mtime(path):
+    """mtime yang menandai versi model: manifest untuk format native, file itu sendiri untuk pickle."""
+    if os.path.isdir(path):
+        return os.stat(os.path.join(path, MANIFEST_NAME)).st_mtime
+    return os.stat(path).st_mtime
+
+
+def artifact_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+    return total
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_blob(root, subdir, data, suffix):
+    """Simpan file content-addressed (nama = sha256), file yang sama tidak ditulis ulang."""
+    digest = _sha256(data)
+    rel = f"{subdir}/{digest}{suffix}"
+    path = os.path.join(root, rel)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return {"file": rel, "sha256": digest}
+
+
+def _read_verified(root, ref):
+    with open(os.path.join(root, ref["file"]), "rb") as f:
+        data = f.read()
+    if _sha256(data) != ref["sha256"]:
+        raise ArtifactError(f"Checksum {ref['file']} tidak cocok dengan manifest")
+    return data
+
+
+def _npy_bytes(array):
+    import io
+    buf = io.BytesIO()
+    np.save(buf, np.ascontiguousarray(array), allow_pickle=False)
+    return buf.getvalue()
+
+
+def _load_npy(root, ref, mmap=True):
+    path = os.path.join(root, ref["file"])
+    if mmap:
+        # Checksum dicek dengan membaca file sekali; array-nya sendiri di-memory-map
+        with open(path, "rb") as f:
+            if _sha256(f.read()) != ref["sha256"]:
+                raise ArtifactError(f"Checksum {ref['file']} tidak cocok dengan manifest")
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    import io
+    return np.load(io.BytesIO(_read_verified(root, ref)), allow_pickle=False)
+
+
+def _to_json_value(value):
+    """Konversi rekursif numpy/pandas (termasuk yang bersarang di dict/list) ke tipe JSON."""
+    if isinstance(value, Mapping):
+        return {str(k): _to_json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_to_json_value(v) for v in value]
+    if isinstance(value, pd.DataFrame):
+        return {str(c): _to_json_value(value[c].tolist()) for c in value.columns}
+    if isinstance(value, (pd.Series, pd.Index, np.ndarray)):
+        return _to_json_value(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+# --- DataFrame / Series -------------------------------------------------------
+
+def _write_frame(root, df):
+    """DataFrame -> satu matrix float64 untuk kolom numerik + array datetime, kolom lain di manifest."""
+    numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+    datetimes = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    others = [c for c in df.columns if c not in numeric and c not in datetimes]
+    spec = {
+        "type": "frame",
+        "columns": [str(c) for c in df.columns],
+        "numeric_columns": [str(c) for c in numeric],
+        "numeric_dtypes": [str(df[c].dtype) for c in numeric],
+        "numeric": _write_blob(root, "arrays", _npy_bytes(df[numeric].to_numpy(dtype=np.float64)), ".npy"),
+        "datetime": {
+            str(c): _write_blob(root, "arrays", _npy_bytes(df[c].to_numpy(dtype="datetime64[ns]").view(np.int64)), ".npy")
+            for c in datetimes
+        },
+        "objects": {str(c): [_to_json_value(v) for v in df[c].tolist()] for c in others}
+    }
+    return spec
+
+
+def _read_frame(root, spec):
+    data = {}
+    numeric = _load_npy(root, spec["numeric"])
+    for i, (col, dtype) in enumerate(zip(spec["numeric_columns"], spec["numeric_dtypes"])):
+        data[col] = numeric[:, i] if dtype == "float64" else numeric[:, i].astype(dtype)
+    for col, ref in spec["datetime"].items():
+        data[col] = pd.to_datetime(np.asarray(_load_npy(root, ref, mmap=False)), unit="ns")
+    for col, values in spec["objects"].items():
+        data[col] = values
+    return pd.DataFrame(data, columns=spec["columns"], copy=False)
+
+
+def _write_series(series):
+    return {
+        "type": "series",
+        "name": _to_json_value(series.name),
+        "index": [_to_json_value(i) for i in series.index],
+        "values": [_to_json_value(v) for v in series.tolist()]
+    }
+
+
+def _read_series(spec):
+    return pd.Series(spec["values"], index=spec["index"], name=spec["name"])
+
+
+# --- Booster ------------------------------------------------------------------
+
+def _booster_of(model):
+    """Booster LightGBM dari Booster langsung atau estimator sklearn (LGBMRegressor)."""
+    import lightgbm as lgb
+    if isinstance(model, lgb.Booster):
+        return model
+    booster = getattr(model, "booster_", None)
+    if isinstance(booster, lgb.Booster):
+        return booster
+    raise ArtifactError(f"Model bertipe {type(model).__name__} belum didukung format native")
+
+
+def _write_booster(root, model):
+    text = _booster_of(model).model_to_string().encode("utf-8")
+    return _write_blob(root, "boosters", text, ".txt")
+
+
+def _load_booster(root, ref):
+    import lightgbm as lgb
+    return lgb.Booster(model_str=_read_verified(root, ref).decode("utf-8"))
+
+
+class LazyBoosters(Mapping):
+    """
+    forecast_results bahan pokok yang booster-nya baru dibaca dari disk saat target itu
+    pertama kali dipakai. Mapping target -> {"model": Booster, ...metadata}.
+    """
+
+    def __init__(self, root, entries):
+        self.root = root
+        self._entries = entries
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, target):
+        entry = self._entries[target]
+        with self._lock:
+            if target not in self._loaded:
+                self._loaded[target] = {**entry.get("metadata", {}), "model": _load_booster(self.root, entry["booster"])}
+            return self._loaded[target]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_loaded(self, target):
+        return target in self._loaded
+
+    def booster_ref(self, target):
+        return self._entries[target]["booster"]
+
+    def loaded_count(self):
+        return len(self._loaded)
+
+
+class MultiBoosterModel:
+    """Pengganti MultiOutputRegressor IHK: satu booster per target, prediksi di-stack per kolom."""
+
+    def __init__(self, root, refs):
+        self.root = root
+        self._refs = refs
+        self._boosters = [None] * len(refs)
+        self._lock = threading.Lock()
+
+    @property
+    def estimators_(self):
+        with self._lock:
+            for i, ref in enumerate(self._refs):
+                if self._boosters[i] is None:
+                    self._boosters[i] = _load_booster(self.root, ref)
+            return list(self._boosters)
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return np.column_stack([booster.predict(X) for booster in self.estimators_])
+
+
+# --- Write / read -------------------------------------------------------------
+
+def _model_refs(root, model_data):
+    """Referensi booster per target; booster lazy yang belum di-load dipakai ulang tanpa dibaca."""
+    forecast_results = model_data["forecast_results"]
+    targets = {}
+    for target in model_data["target_columns"]:
+        if isinstance(forecast_results, LazyBoosters) and not forecast_results.is_loaded(target):
+            ref = forecast_results.booster_ref(target)
+            if os.path.abspath(forecast_results.root) != os.path.abspath(root):
+                with open(os.path.join(forecast_results.root, ref["file"]), "rb") as f:
+                    ref = _write_blob(root, "boosters", f.read(), ".txt")
+            metadata = dict(forecast_results._entries[target].get("metadata", {}))
+        else:
+            entry = forecast_results[target]
+            ref = _write_booster(root, entry["model"])
+            metadata = {k: _to_json_value(v) for k, v in entry.items() if k != "model"}
+        targets[target] = {"booster": ref, "metadata": metadata}
+    return targets
+
+
+def write_native(model_data, path):
+    """
+    Tulis model_data (bahan pokok atau IHK) sebagai artifact native:
+
+        <path>/manifest.json          metadata + checksum setiap file
+        <path>/boosters/<sha>.txt     model LightGBM (text format native), satu per target
+        <path>/arrays/<sha>.npy       histori numerik (memory-mappable)
+
+    File bersifat content-addressed dan manifest diganti secara atomic, jadi reader tidak
+    pernah melihat artifact setengah jadi.
+
+    Returns:
+        dict: manifest yang ditulis
+    """
+    os.makedirs(path, exist_ok=True)
+
+    if "forecast_results" in model_data:
+        kind = "bahan_pokok"
+        body = {
+            "target_columns": list(model_data["target_columns"]),
+            "feature_cols": list(model_data["feature_cols"]),
+            "lag_periods": list(model_data["lag_periods"]),
+            "rolling_windows": list(model_data["rolling_windows"]),
+            "last_data": _write_frame(path, model_data["last_data"]),
+            "targets": _model_refs(path, model_data)
+        }
+    elif "target_cols" in model_data:
+        kind = "ihk"
+        model = model_data["model"]
+        estimators = getattr(model, "estimators_", None) or [model]
+        if len(estimators) != len(model_data["target_cols"]):
+            raise ArtifactError("Jumlah estimator IHK tidak sama dengan jumlah target")
+        if isinstance(model, MultiBoosterModel):
+            refs = list(model._refs) if os.path.abspath(model.root) == os.path.abspath(path) else [
+                _write_booster(path, b) for b in model.estimators_]
+        else:
+            refs = [_write_booster(path, est) for est in estimators]
+        body = {
+            "target_cols": list(model_data["target_cols"]),
+            "bulan_map": model_data["bulan_map"],
+            "boosters": refs,
+            "last_data": _write_series(model_data["last_data"]),
+            "second_last_data": _write_series(model_data["second_last_data"])
+        }
+    else:
+        raise ArtifactError("Format model_data tidak dikenali")
+
+    known = set(body) | {"forecast_results", "model", "feature_index"}
+    extra = {k: _to_json_value(v) for k, v in model_data.items() if k not in known}
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "kind": kind,
+        "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "lightgbm_version": _lightgbm_version(),
+        **body,
+        "extra": extra
+    }
+
+    tmp = os.path.join(path, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(path, MANIFEST_NAME))
+    prune_unreferenced(path, manifest)
+    return manifest
+
+
+def _lightgbm_version():
+    try:
+        import lightgbm as lgb
+        return lgb.__version__
+    except ImportError:
+        return None
+
+
+def _referenced_files(manifest):
+    files = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "file" in node and "sha256" in node:
+                files.add(node["file"])
+            for v in node.values():
+                walk(v)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v)
+
+    walk(manifest)
+    return files
+
+
+def prune_unreferenced(path, manifest=None, grace_seconds=PRUNE_GRACE_SECONDS):
+    """Hapus booster/array yang tidak dirujuk manifest dan sudah lebih tua dari masa tenggang."""
+    if manifest is None:
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    referenced = _referenced_files(manifest)
+    now = time.time()
+    removed = 0
+    for subdir in ("boosters", "arrays"):
+        full = os.path.join(path, subdir)
+        if not os.path.isdir(full):
+            continue
+        for name in os.listdir(full):
+            rel = f"{subdir}/{name}"
+            file_path = os.path.join(full, name)
+            if rel not in referenced and now - os.stat(file_path).st_mtime > grace_seconds:
+                os.remove(file_path)
+                removed += 1
+    return removed
+
+
+def read_native(path):
+    """Load artifact native; booster di-load lazy per target, histori numerik di-memory-map."""
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(f"format_version {manifest.get('format_version')} tidak didukung")
+
+    if manifest["kind"] == "bahan_pokok":
+        model_data = {
+            "target_columns": manifest["target_columns"],
+            "feature_cols": manifest["feature_cols"],
+            "feature_index": {col: i for i, col in enumerate(manifest["feature_cols"])},
+            "lag_periods": manifest["lag_periods"],
+            "rolling_windows": manifest["rolling_windows"],
+            "last_data": _read_frame(path, manifest["last_data"]),
+            "forecast_results": LazyBoosters(path, manifest["targets"])
+        }
+    else:
+        model_data = {
+            "model": MultiBoosterModel(path, manifest["boosters"]),
+            "target_cols": manifest["target_cols"],
+            "bulan_map": manifest["bulan_map"],
+            "last_data": _read_series(manifest["last_data"]),
+            "second_last_data": _read_series(manifest["second_last_data"])
+        }
+    model_data.update(manifest.get("extra", {}))
+    return model_data
+
+
+def load_model(path):
+    """Loader ModelStore: artifact native jika path berupa direktori, selain itu pickle lama."""
+    if os.path.isdir(path):
+        return read_native(path)
+    if not ALLOW_PICKLE:
+        raise ArtifactError(f"Pickle dinonaktifkan (MODEL_ALLOW_PICKLE=false): {path}")
+    if is_native_artifact(os.path.splitext(path)[0]):
+        raise ArtifactError(f"Artifact native sudah ada untuk {path}, pickle tidak di-load")
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def save_model(model_data, path):
+    """Simpan ke format yang sama dengan path tujuan (direktori native atau file pickle), secara atomic."""
+    if not path.endswith(".pkl"):
+        return write_native(model_data, path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(model_data, f)
+    os.replace(tmp_path, path)
+
+
+def convert_pickle(pkl_path, out_path=None):
+    """Konversi pickle model lama ke artifact native di samping file aslinya."""
+    out_path = out_path or os.path.splitext(pkl_path)[0]
+    with open(pkl_path, "rb") as f:
+        model_data = pickle.load(f)
+    manifest = write_native(model_data, out_path)
+    logger.info(f"Converted {pkl_path} -> {out_path} ({manifest['kind']})")
+    return out_path
+
+
+if __name__ == "__main__":
+    # python -m helper.model_artifact models/lgbm_forecasting_hph_model.pkl [output_dir]
+    if len(sys.argv) < 2:
+        print("Usage: python -m helper.model_artifact <model.pkl> [output_dir]")
+        sys.exit(1)
+    convert_pickle(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
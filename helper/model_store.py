@@ -0,0 +1,195 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from loguru import logger
+from helper.model_artifact import load_model, artifact_mtime, artifact_size, is_native_artifact
+from helper.compact import compact_model_data
+
+MODEL_DIR = "./models"
+DATA_DIR = "./temp_uploads"
+MODEL_FILENAMES = {
+    "bahan_pokok": "lgbm_forecasting_hph_model.pkl",
+    "ihk": "lgbm_forecasting_model.pkl",
+}
+DEFAULT_MAX_MODELS = int(os.getenv("MODEL_STORE_MAX_MODELS", "32"))
+DEFAULT_MAX_BYTES = int(os.getenv("MODEL_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+# State histori model disimpan dalam layout ringkas (float32, blok kontigu per target)
+DEFAULT_COMPACT = os.getenv("MODEL_STORE_COMPACT", "true").lower() != "false"
+
+_REGION_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def normalize_region(region):
+    """Region kosong / 'default' berarti model global di root ./models."""
+    if region is None or region == "" or region == "default":
+        return None
+    if not _REGION_PATTERN.match(region):
+        raise ValueError(f"Region '{region}' tidak valid (hanya huruf, angka, '_' dan '-')")
+    return region
+
+
+def model_path(kind, region=None):
+    region = normalize_region(region)
+    filename = MODEL_FILENAMES[kind]
+    if region is None:
+        return os.path.join(MODEL_DIR, filename)
+    return os.path.join(MODEL_DIR, region, filename)
+
+
+def native_model_path(kind, region=None):
+    """Direktori artifact native (manifest + booster text + npy) untuk model yang sama."""
+    return os.path.splitext(model_path(kind, region))[0]
+
+
+def resolve_model_path(kind, region=None):
+    """Artifact native diutamakan jika ada, selain itu pickle lama."""
+    native = native_model_path(kind, region)
+    if is_native_artifact(native):
+        return native
+    return model_path(kind, region)
+
+
+def data_path(filename, region=None):
+    """Path workbook input/output per region (./temp_uploads/<region>/<filename>)."""
+    region = normalize_region(region)
+    if region is None:
+        return os.path.join(DATA_DIR, filename)
+    return os.path.join(DATA_DIR, region, filename)
+
+
+def _estimate_nbytes(model_data, file_size):
+    """Perkiraan memori model: ukuran file (booster) + memori DataFrame/Series di dalamnya."""
+    total = file_size
+    if isinstance(model_data, dict):
+        for value in model_data.values():
+            memory_usage = getattr(value, "memory_usage", None)
+            if callable(memory_usage):
+                try:
+                    usage = memory_usage(deep=True)
+                    total += int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+                except TypeError:
+                    pass
+    return total
+
+
+class ModelStore:
+    """
+    Cache model per (jenis, region) yang di-load saat pertama dipakai, dengan LRU terbatas
+    berdasarkan jumlah model dan perkiraan memori. Model di-reload otomatis jika file berubah.
+    """
+
+    def __init__(self, max_models=DEFAULT_MAX_MODELS, max_bytes=DEFAULT_MAX_BYTES, loader=load_model,
+                 compact=DEFAULT_COMPACT):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self.compact = compact
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, kind, region=None):
+        """Ambil model_data untuk (kind, region), load dari disk jika belum resident."""
+        region = normalize_region(region)
+        key = (kind, region)
+        path = resolve_model_path(kind, region)
+        mtime = artifact_mtime(path)  # FileNotFoundError jika model region belum ada
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["mtime"] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["model_data"]
+
+        # Satu loader per key, request lain untuk key yang sama menunggu hasilnya
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry["mtime"] == mtime:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["model_data"]
+
+            logger.info(f"Loading model {kind} for region {region or 'default'} from: {path}")
+            model_data = self._loader(path)
+            bytes_saved = 0
+            if self.compact:
+                model_data, report = compact_model_data(model_data)
+                bytes_saved = report["bytes_saved"]
+            nbytes = _estimate_nbytes(model_data, artifact_size(path))
+
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = {"model_data": model_data, "nbytes": nbytes, "bytes_saved": bytes_saved,
+                                      "mtime": mtime, "path": path}
+                self._entries.move_to_end(key)
+                self._evict(keep=key)
+            return model_data
+
+    def _evict(self, keep):
+        total = sum(e["nbytes"] for e in self._entries.values())
+        while self._entries and (len(self._entries) > self.max_models or total > self.max_bytes):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            evicted = self._entries.pop(oldest)
+            total -= evicted["nbytes"]
+            self.evictions += 1
+            logger.info(f"Evicted model {oldest[0]} for region {oldest[1] or 'default'} ({evicted['nbytes']} bytes)")
+
+    def invalidate(self, kind=None, region=None):
+        region = normalize_region(region)
+        with self._lock:
+            for key in list(self._entries):
+                if (kind is None or key[0] == kind) and (region is None or key[1] == region):
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident_models": [
+                    {"kind": k[0], "region": k[1] or "default", "nbytes": e["nbytes"], "bytes_saved": e["bytes_saved"]}
+                    for k, e in self._entries.items()
+                ],
+                "resident_bytes": sum(e["nbytes"] for e in self._entries.values()),
+                "bytes_saved": sum(e["bytes_saved"] for e in self._entries.values()),
+                "max_models": self.max_models,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_model_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ModelStore()
+        return _store
+
+
+def list_regions(kind):
+    """Region yang punya model untuk jenis tertentu (subfolder ./models/<region>/)."""
+    regions = []
+    if os.path.exists(resolve_model_path(kind)):
+        regions.append("default")
+    if os.path.isdir(MODEL_DIR):
+        for name in sorted(os.listdir(MODEL_DIR)):
+            if _REGION_PATTERN.match(name) and os.path.isdir(os.path.join(MODEL_DIR, name)) \
+                    and os.path.exists(resolve_model_path(kind, name)):
+                regions.append(name)
+    return regions
@@ -0,0 +1,153 @@
+import re
+import asyncio
+from loguru import logger
+from llm_dispatcher import llm_extract_json
+
+# Estimasi kasar token untuk teks OCR Bahasa Indonesia (tanpa tokenizer upstream)
+CHARS_PER_TOKEN = 3.5
+DEFAULT_MAX_CHUNK_TOKENS = 6000
+
+_PAGE_BREAK = re.compile(
+    r"\f|^\s*(?:<!--\s*page[^>]*-->|(?:page|halaman|hal\.)\s*\d+(?:\s*(?:of|dari)\s*\d+)?)\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+_SECTION_HEADING = re.compile(
+    r"^(?=#{1,6}\s|(?:BAB|PASAL|LAMPIRAN)\b|\d+(?:\.\d+)*\.?\s+[A-Z])",
+    re.MULTILINE
+)
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def _split_on(pattern, text):
+    """Split teks tepat sebelum setiap match (boundary ikut ke potongan berikutnya)."""
+    starts = sorted({m.start() for m in pattern.finditer(text)} | {0})
+    pieces = [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+    return [p for p in pieces if p.strip()]
+
+
+def _split_oversized(text, max_tokens):
+    """Pecah unit yang melebihi budget: per paragraf, per baris, lalu potong paksa."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    for sep in ("\n\n", "\n"):
+        parts = [p + sep for p in text.split(sep) if p.strip()]
+        if len(parts) > 1:
+            return _pack(parts, max_tokens)
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+
+def _pack(units, max_tokens):
+    """Gabungkan unit berurutan secara greedy selama masih dalam budget token."""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if unit_tokens > max_tokens:
+            if current:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(unit, max_tokens))
+            continue
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def split_ocr_text(text, max_tokens=DEFAULT_MAX_CHUNK_TOKENS):
+    """
+    Pecah teks OCR menjadi chunk dalam budget token, mengikuti batas halaman lalu batas section.
+
+    Args:
+        text: teks hasil OCR satu dokumen
+        max_tokens: budget token per chunk (hanya isi dokumen, belum termasuk prompt)
+
+    Returns:
+        list: potongan teks berurutan sesuai dokumen asli
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    units = []
+    for page in _split_on(_PAGE_BREAK, text):
+        if estimate_tokens(page) <= max_tokens:
+            units.append(page)
+        else:
+            units.extend(_split_on(_SECTION_HEADING, page))
+    return _pack(units, max_tokens)
+
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def merge_extractions(results):
+    """
+    Gabungkan hasil ekstraksi JSON per chunk secara deterministik (urut sesuai chunk).
+
+    - scalar: nilai non-kosong pertama yang dipakai
+    - list: digabung, duplikat dibuang, urutan kemunculan dipertahankan
+    - dict: di-merge rekursif dengan aturan yang sama
+    """
+    merged = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        for key, value in result.items():
+            if key not in merged or _is_empty(merged[key]):
+                merged[key] = value
+            elif isinstance(merged[key], dict) and isinstance(value, dict):
+                merged[key] = merge_extractions([merged[key], value])
+            elif isinstance(merged[key], list) and isinstance(value, list):
+                combined = list(merged[key])
+                seen = {repr(v) for v in combined}
+                for v in value:
+                    if repr(v) not in seen:
+                        seen.add(repr(v))
+                        combined.append(v)
+                merged[key] = combined
+    return merged
+
+
+async def extract_chunked(extraction_prompt, ocr_result, max_chunk_tokens=DEFAULT_MAX_CHUNK_TOKENS,
+                          max_concurrency=4, call=llm_extract_json):
+    """
+    Map-reduce ekstraksi untuk dokumen OCR panjang: chunk dikirim paralel lalu hasilnya di-merge.
+    Dokumen pendek (satu chunk) langsung diteruskan tanpa overhead tambahan.
+
+    Returns:
+        dict: hasil ekstraksi gabungan, atau {"error": ...} jika semua chunk gagal
+    """
+    chunks = split_ocr_text(ocr_result, max_chunk_tokens)
+    if len(chunks) == 1:
+        return await call(extraction_prompt, chunks[0])
+
+    logger.info(f"Document split into {len(chunks)} chunks "
+                f"(~{estimate_tokens(ocr_result)} tokens, budget {max_chunk_tokens}/chunk)")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(chunk):
+        async with semaphore:
+            return await call(extraction_prompt, chunk)
+
+    results = await asyncio.gather(*(_run(chunk) for chunk in chunks))
+
+    extracted = [r for r in results if isinstance(r, dict) and "error" not in r]
+    failed = len(results) - len(extracted)
+    if failed:
+        logger.warning(f"{failed}/{len(chunks)} chunks failed to extract")
+    if not extracted:
+        errors = [r for r in results if isinstance(r, dict) and "error" in r]
+        return errors[0] if errors else {"error": "No JSON extracted from any chunk"}
+
+    return merge_extractions(extracted)
@@ -0,0 +1,261 @@
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import threading
+import tracemalloc
+from loguru import logger
+from fastapi.concurrency import run_in_threadpool
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# Tanpa PROFILE_ADMIN_KEY profiling per request (header/query) tidak aktif
+PROFILE_ADMIN_KEY = os.getenv("PROFILE_ADMIN_KEY")
+# Fraksi request yang diprofile otomatis (0 = hanya atas permintaan admin)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "50"))
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+# Satu request diprofile dalam satu waktu: sampler dan tracemalloc bersifat global per proses
+_active_lock = threading.Lock()
+_ring_lock = threading.Lock()
+
+
+def profiling_enabled():
+    return bool(PROFILE_ADMIN_KEY) or PROFILE_SAMPLE_RATE > 0
+
+
+def is_admin(key):
+    # Perbandingan waktu-konstan agar admin key tidak bisa ditebak lewat timing
+    return bool(PROFILE_ADMIN_KEY) and key is not None and hmac.compare_digest(key.encode(), PROFILE_ADMIN_KEY.encode())
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        # Library: cukup nama modul agar stack tetap terbaca di flamegraph
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """
+    Sampling profiler: setiap interval mengambil stack thread request dan thread lain yang sedang
+    menjalankan kode aplikasi, lalu menghitungnya dalam format collapsed stack (flamegraph).
+    """
+
+    def __init__(self, request_thread, interval=SAMPLE_INTERVAL_SECONDS):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.request_thread = request_thread
+        self.interval = interval
+        self.samples = {}
+        self.total = 0
+        self._stop_event = threading.Event()
+
+    def _collect(self):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.ident:
+                continue
+            if frame.f_code.co_filename == _THIS_FILE:
+                continue  # sedang di kode profiling sendiri
+            stack = []
+            in_app = thread_id == self.request_thread
+            while frame is not None:
+                if frame.f_code.co_filename.startswith(PROJECT_ROOT):
+                    in_app = True
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if in_app:
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+        self.total += 1
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self._collect()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _top_allocations(before, after):
+    # Alokasi sampler/tracemalloc sendiri tidak ikut dilaporkan
+    ignore = [tracemalloc.Filter(False, _THIS_FILE), tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "traceback")
+    top = []
+    for stat in stats[:TOP_ALLOCATIONS]:
+        top.append({
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff,
+            "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+        })
+    return top
+
+
+class RequestProfile:
+    """Sampler + tracemalloc untuk satu request; hasil disimpan ke ring di PROFILE_DIR."""
+
+    def __init__(self, method, path, query, reason):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.meta = {"id": self.id, "method": method, "path": path, "query": query, "reason": reason}
+        self._started_tracemalloc = False
+
+    def start(self):
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._snapshot = tracemalloc.take_snapshot()
+        self._sampler = StackSampler(threading.get_ident())
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        self._sampler.start()
+
+    def stop(self):
+        """Hentikan sampler dan catat durasi; murah, dipanggil langsung saat response selesai."""
+        self._sampler.stop()
+        self._duration = time.perf_counter() - self._started
+        self._cpu = time.process_time() - self._cpu_started
+
+    def finish(self, status_code):
+        """Snapshot/compare tracemalloc dan tulis file profile (berat, dijalankan di threadpool)."""
+        duration, cpu = self._duration, self._cpu
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        profile = {
+            **self.meta,
+            "created_at": time.time(),
+            "status_code": status_code,
+            "duration_seconds": round(duration, 4),
+            "cpu_seconds": round(cpu, 4),
+            "sample_interval_ms": round(self._sampler.interval * 1000, 2),
+            "samples": self._sampler.total,
+            "traced_memory_peak": peak,
+            "top_allocations": _top_allocations(self._snapshot, after)
+        }
+        samples = sorted(self._sampler.samples.items(), key=lambda item: item[1], reverse=True)
+        folded = "\n".join(f"{stack} {count}" for stack, count in samples)
+        save_profile(profile, folded)
+        logger.info(f"Profiled {self.meta['method']} {self.meta['path']} in {duration:.3f}s -> {self.id}")
+        return profile
+
+
+def save_profile(profile, folded, profile_dir=PROFILE_DIR, ring_size=PROFILE_RING_SIZE):
+    """Simpan profile (.json) + collapsed stacks (.folded), buang yang terlama di luar ring."""
+    with _ring_lock:
+        os.makedirs(profile_dir, exist_ok=True)
+        base = os.path.join(profile_dir, profile["id"])
+        with open(f"{base}.folded", "w") as f:
+            f.write(folded)
+        with open(f"{base}.json.tmp", "w") as f:
+            json.dump(profile, f)
+        os.replace(f"{base}.json.tmp", f"{base}.json")
+
+        ids = sorted(name[:-5] for name in os.listdir(profile_dir) if name.endswith(".json"))
+        for old_id in ids[:max(0, len(ids) - ring_size)]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(profile_dir, old_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+def list_profiles(profile_dir=PROFILE_DIR):
+    """Ringkasan profile di ring, terbaru dulu."""
+    if not os.path.isdir(profile_dir):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(profile_dir), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(profile_dir, name)) as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            continue
+        profiles.append({k: profile.get(k) for k in ("id", "method", "path", "status_code", "duration_seconds",
+                                                       "cpu_seconds", "samples", "traced_memory_peak", "reason")})
+    return profiles
+
+
+def profile_file(profile_id, suffix, profile_dir=PROFILE_DIR):
+    """Path file profile; id divalidasi agar tidak bisa keluar dari PROFILE_DIR."""
+    if not profile_id.replace("-", "").isalnum():
+        raise ValueError("Profile id tidak valid")
+    path = os.path.join(profile_dir, profile_id + suffix)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return path
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling per request. Aktif jika request membawa X-Profile: 1 (atau ?profile=1)
+    bersama X-Admin-Key yang valid, atau terpilih oleh PROFILE_SAMPLE_RATE.
+    Tanpa konfigurasi profiling, request langsung diteruskan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = profiling_enabled()
+
+    def _reason(self, scope):
+        query = scope.get("query_string", b"")
+        requested = _header(scope, b"x-profile") == "1" or b"profile=1" in query.split(b"&")
+        if requested and is_admin(_header(scope, b"x-admin-key")):
+            return "requested"
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        reason = self._reason(scope)
+        if reason is None or not _active_lock.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"),
+                                 reason)
+        status = {"code": None}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) +
+                           [(b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        try:
+            profile.start()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            try:
+                profile.stop()
+                # Snapshot tracemalloc, compare_to dan penulisan file tidak dijalankan di event loop
+                await run_in_threadpool(profile.finish, status["code"])
+            except Exception as e:
+                logger.error(f"Error saving profile {profile.id}: {str(e)}")
+            finally:
+                _active_lock.release()
@@ -0,0 +1,231 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from helper.file_events import subscribe
+from helper.model_store import resolve_model_path
+from helper.model_artifact import artifact_mtime
+from responses import FastJSONResponse
+
+try:
+    import brotli
+except ImportError:  # brotli opsional, tanpa brotli hanya gzip
+    brotli = None
+
+# Body lebih kecil dari ini dikirim tanpa kompresi (overhead header > hemat)
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+# Client boleh menyimpan response tapi wajib revalidasi (If-None-Match) setiap polling
+CACHE_CONTROL = "private, no-cache"
+
+
+def model_fingerprint(kind, region=None):
+    """Versi model (path artifact + mtime) tanpa me-load model."""
+    path = resolve_model_path(kind, region)
+    return f"{path}:{artifact_mtime(path)}"  # FileNotFoundError jika model belum ada
+
+
+def data_version(path):
+    """Versi workbook input (mtime_ns + ukuran); file yang belum ada -> 'missing'."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return "missing"
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def compute_etag(*parts):
+    """Strong ETag dari komponen versi + parameter request (untuk representasi tanpa kompresi)."""
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def representation_etag(etag, encoding):
+    """ETag per Content-Encoding: body gzip/br berbeda byte-nya, jadi strong ETag-nya juga beda."""
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def matching_etag(if_none_match, etags):
+    """
+    ETag dari `etags` yang cocok dengan If-None-Match (perbandingan weak sesuai RFC 9110:
+    W/ diabaikan, '*' cocok semua), None jika tidak ada.
+    """
+    if not if_none_match:
+        return None
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        for etag in etags:
+            if candidate == "*" or candidate == etag:
+                return etag
+    return None
+
+
+def accepted_encodings(accept_encoding):
+    """Accept-Encoding -> dict encoding -> q-value (nama dan parameter case-insensitive)."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """
+    Encoding dengan q-value tertinggi dari yang tersedia (br jika ada modul brotli, gzip);
+    q sama -> br lebih dulu. q=0 berarti ditolak. None = identity.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    # identity secara implisit selalu diterima kecuali ditolak eksplisit; q lebih tinggi -> tanpa kompresi
+    if best is not None and accepted.get("identity", 0.0) > best_quality:
+        return None
+    return best
+
+
+class ResponseCache:
+    """
+    Body JSON per ETag beserta versi terkompresinya (dibuat sekali per encoding, lalu dipakai ulang).
+    LRU terbatas; entri yang bergantung pada workbook dibuang saat file itu berubah (file_events).
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+                self.hits += 1
+            return entry
+
+    def put(self, etag, body, paths=()):
+        entry = {"body": body, "encoded": {}, "paths": {os.path.abspath(p) for p in paths}}
+        with self._lock:
+            self.misses += 1
+            self._entries[etag] = entry
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def cached_encoding(self, entry, encoding):
+        """Body terkompresi yang sudah ada di entri, None jika belum dibuat."""
+        with self._lock:
+            return entry["encoded"].get(encoding)
+
+    def encoded(self, entry, encoding):
+        """Body terkompresi; kompresi di luar lock, hasil pertama yang disimpan dipakai semua request."""
+        body = self.cached_encoding(entry, encoding)
+        if body is None:
+            if encoding == "br":
+                body = brotli.compress(entry["body"], quality=BROTLI_QUALITY)
+            else:
+                body = gzip.compress(entry["body"], compresslevel=GZIP_LEVEL, mtime=0)
+            with self._lock:
+                body = entry["encoded"].setdefault(encoding, body)
+        return body
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def invalidate_path(self, path):
+        with self._lock:
+            stale = [etag for etag, entry in self._entries.items() if path in entry["paths"]]
+            for etag in stale:
+                del self._entries[etag]
+        if stale:
+            logger.info(f"Response cache: {len(stale)} entries invalidated by {path}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(len(e["body"]) + sum(len(b) for b in e["encoded"].values())
+                             for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "brotli": brotli is not None
+            }
+
+
+_cache = ResponseCache()
+subscribe(_cache.invalidate_path)
+
+
+def get_response_cache():
+    return _cache
+
+
+def _render(build):
+    return FastJSONResponse(build()).body
+
+
+async def cached_json_response(request, etag_parts, build, paths=()):
+    """
+    Response JSON dengan ETag, conditional GET dan kompresi.
+    - If-None-Match cocok -> 304 tanpa memanggil build()
+    - body (dan hasil kompresinya) di-cache per ETag, sehingga polling berulang tidak menghitung ulang
+    - build(), serialisasi dan kompresi dijalankan di threadpool, bukan di event loop
+
+    Args:
+        request: Request FastAPI (header If-None-Match / Accept-Encoding)
+        etag_parts: komponen versi (fingerprint model, versi data, parameter)
+        build: fungsi tanpa argumen yang mengembalikan content dict
+        paths: workbook yang dipakai; perubahan file ini membuang entri cache
+    """
+    etag = compute_etag(*etag_parts)
+    headers = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+
+    # Salinan client (identity atau encoding yang masih diterimanya) masih valid -> 304 dengan ETag salinan itu
+    accepted = accepted_encodings(request.headers.get("accept-encoding"))
+    variants = [etag] + [representation_etag(etag, e) for e in ("br", "gzip")
+                         if accepted.get(e, accepted.get("*", 0.0)) > 0]
+    matched = matching_etag(request.headers.get("if-none-match"), variants)
+    if matched is not None:
+        _cache.record_not_modified()
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+
+    entry = _cache.get(etag)
+    if entry is None:
+        entry = _cache.put(etag, await run_in_threadpool(_render, build), paths)
+
+    body = entry["body"]
+    if len(body) < COMPRESS_MIN_BYTES:
+        encoding = None
+    if encoding is not None:
+        body = _cache.cached_encoding(entry, encoding)
+        if body is None:
+            body = await run_in_threadpool(_cache.encoded, entry, encoding)
+        headers["Content-Encoding"] = encoding
+    headers["ETag"] = representation_etag(etag, encoding)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,232 @@
+import os
+import json
+import math
+import time
+import threading
+from collections import Counter
+from loguru import logger
+from helper.ocr_chunking import split_ocr_text, estimate_tokens
+from helper.file_events import subscribe
+
+DEFAULT_ROOT = "./temp_uploads"
+INDEX_DIRNAME = ".retrieval_index"
+PASSAGE_TOKENS = 350
+REFRESH_INTERVAL_SECONDS = 10
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Kata umum Bahasa Indonesia/Inggris yang tidak membantu ranking
+STOPWORDS = {
+    "yang", "dan", "di", "ke", "dari", "untuk", "dengan", "pada", "ini", "itu", "atau", "dalam", "adalah",
+    "akan", "oleh", "sebagai", "tidak", "ada", "juga", "tersebut", "para", "bahwa", "the", "of", "and",
+    "to", "in", "for", "is", "on", "by", "with", "as", "at", "be", "an", "or", "are", "this", "that", "a"
+}
+
+
+def _analyzer():
+    from sklearn.feature_extraction.text import CountVectorizer
+    # Tokenizer sklearn (lowercase + strip accents); angka dipertahankan (nilai kontrak, tanggal)
+    return CountVectorizer(strip_accents="unicode", token_pattern=r"(?u)\b\w+\b").build_analyzer()
+
+
+class RetrievalIndex:
+    """
+    Index BM25 atas potongan (passage) dokumen kontrak/BA hasil konversi (.txt) di bawah root.
+    Disimpan sebagai JSON di <root>/.retrieval_index/ dan di-update incremental berdasarkan mtime file,
+    sehingga hanya dokumen baru/berubah yang di-chunk ulang.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(self.root, INDEX_DIRNAME, "bm25.json")
+        self._lock = threading.RLock()
+        self._analyze = None
+        self.documents = {}   # rel_path -> {"mtime", "project", "chunks": [{"text", "tf", "length"}]}
+        self._postings = {}   # term -> {(rel_path, chunk_no): tf}
+        self._total_length = 0
+        self._n_chunks = 0
+        self._last_refresh = None
+        self._load()
+
+    def _tokens(self, text):
+        if self._analyze is None:
+            self._analyze = _analyzer()
+        return [t for t in self._analyze(text) if t not in STOPWORDS and len(t) > 1]
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self.documents = json.load(f)["documents"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Retrieval index unreadable, rebuilding: {str(e)}")
+            self.documents = {}
+        for rel_path, doc in self.documents.items():
+            self._add_postings(rel_path, doc)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents}, f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def _add_postings(self, rel_path, doc):
+        for chunk_no, chunk in enumerate(doc["chunks"]):
+            for term, tf in chunk["tf"].items():
+                self._postings.setdefault(term, {})[(rel_path, chunk_no)] = tf
+            self._total_length += chunk["length"]
+            self._n_chunks += 1
+
+    def _remove_postings(self, rel_path):
+        doc = self.documents.get(rel_path)
+        if doc is None:
+            return
+        for chunk_no, chunk in enumerate(doc["chunks"]):
+            for term in chunk["tf"]:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop((rel_path, chunk_no), None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= chunk["length"]
+            self._n_chunks -= 1
+
+    def _index_file(self, path):
+        rel_path = os.path.relpath(path, self.root)
+        with open(path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        chunks = []
+        for passage in split_ocr_text(text, PASSAGE_TOKENS):
+            tokens = self._tokens(passage)
+            if tokens:
+                chunks.append({"text": passage.strip(), "tf": dict(Counter(tokens)), "length": len(tokens)})
+        parts = rel_path.split(os.sep)
+        doc = {"mtime": os.stat(path).st_mtime, "project": parts[0] if len(parts) > 1 else "", "chunks": chunks}
+        self._remove_postings(rel_path)
+        self.documents[rel_path] = doc
+        self._add_postings(rel_path, doc)
+
+    def refresh(self):
+        """
+        Sinkronkan index dengan file .txt di disk (baru, berubah, terhapus).
+
+        Returns:
+            dict: jumlah dokumen yang di-index ulang dan dihapus
+        """
+        with self._lock:
+            seen = set()
+            updated = 0
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for name in filenames:
+                    if not name.lower().endswith(".txt") or name.startswith((".", "~$")):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    rel_path = os.path.relpath(path, self.root)
+                    seen.add(rel_path)
+                    doc = self.documents.get(rel_path)
+                    if doc is None or doc["mtime"] != os.stat(path).st_mtime:
+                        self._index_file(path)
+                        updated += 1
+            removed = [p for p in self.documents if p not in seen]
+            for rel_path in removed:
+                self._remove_postings(rel_path)
+                del self.documents[rel_path]
+            if updated or removed:
+                self._save()
+                logger.info(f"Retrieval index refreshed: {updated} indexed, {len(removed)} removed")
+            self._last_refresh = time.monotonic()
+            return {"indexed": updated, "removed": len(removed)}
+
+    def _ensure_fresh(self, max_age=REFRESH_INTERVAL_SECONDS):
+        if self._last_refresh is None or time.monotonic() - self._last_refresh > max_age:
+            self.refresh()
+
+    def mark_stale(self):
+        self._last_refresh = None
+
+    def search(self, query, k=5, project=None, document=None):
+        """
+        Top-k passage paling relevan untuk query (BM25).
+
+        Args:
+            query: pertanyaan user
+            k: jumlah passage
+            project: batasi ke satu project (subfolder temp_uploads)
+            document: batasi ke satu dokumen (nama file .txt)
+
+        Returns:
+            list: dict passage (path, chunk, score, text), skor menurun
+        """
+        self._ensure_fresh()
+        with self._lock:
+            if not self._n_chunks:
+                return []
+            avg_length = self._total_length / self._n_chunks
+            scores = {}
+            for term in set(self._tokens(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (self._n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+                for (rel_path, chunk_no), tf in postings.items():
+                    doc = self.documents[rel_path]
+                    if project is not None and doc["project"] != project:
+                        continue
+                    if document is not None and os.path.basename(rel_path) != document:
+                        continue
+                    length = doc["chunks"][chunk_no]["length"]
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[(rel_path, chunk_no)] = scores.get((rel_path, chunk_no), 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [
+                {
+                    "path": rel_path,
+                    "chunk": chunk_no,
+                    "score": round(score, 4),
+                    "text": self.documents[rel_path]["chunks"][chunk_no]["text"]
+                }
+                for (rel_path, chunk_no), score in top
+            ]
+
+    def document_tokens(self, rel_paths):
+        """Perkiraan token dokumen utuh (pembanding ukuran prompt tanpa retrieval)."""
+        with self._lock:
+            return sum(
+                estimate_tokens(chunk["text"])
+                for rel_path in rel_paths if rel_path in self.documents
+                for chunk in self.documents[rel_path]["chunks"]
+            )
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_retrieval_index(root=DEFAULT_ROOT):
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = RetrievalIndex(root)
+        return _indexes[root]
+
+
+@subscribe
+def _on_file_changed(path):
+    # Upload .txt baru: index di-refresh pada query berikutnya tanpa menunggu interval
+    if path.lower().endswith(".txt"):
+        with _indexes_lock:
+            indexes = list(_indexes.values())
+        for index in indexes:
+            if path.startswith(index.root + os.sep):
+                index.mark_stale()
+
+
+def format_passages(passages):
+    """Gabungkan passage menjadi konteks prompt, dengan label sumber untuk sitasi."""
+    return "\n\n".join(
+        f"[{i + 1}] ({p['path']}, bagian {p['chunk'] + 1})\n{p['text']}"
+        for i, p in enumerate(passages)
+    )
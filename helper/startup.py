@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import importlib
+import threading
+from datetime import datetime
+from loguru import logger
+from utils import LAZY_IMPORT_TIMINGS
+
+PROCESS_STARTED = time.time()
+# Modul berat yang dipantau di laporan startup (sudah ter-import atau belum)
+HEAVY_MODULES = ("numpy", "pandas", "lightgbm", "sklearn", "PIL.Image", "httpx", "pyarrow")
+WARMUP_KINDS = ("bahan_pokok", "ihk")
+
+ROUTER_IMPORT_TIMINGS = {}
+
+_state = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "duration_seconds": None,
+    "models": {}
+}
+_state_lock = threading.Lock()
+
+
+def record_router_import(name, seconds):
+    ROUTER_IMPORT_TIMINGS[name] = seconds
+
+
+class LazyRouters:
+    """
+    Router di-import dan didaftarkan ke app saat request pertama ke path miliknya, bukan saat
+    proses start. Halaman docs/OpenAPI memuat semua router agar dokumentasinya tetap lengkap.
+
+    Args:
+        app: FastAPI app
+        routers: dict nama modul di package routes -> tuple prefix path yang dilayani router itu
+    """
+
+    def __init__(self, app, routers, package="routes"):
+        self.app = app
+        self.routers = dict(routers)
+        self.package = package
+        self.loaded = set()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return [name for name in self.routers if name not in self.loaded]
+
+    def load(self, name):
+        with self._lock:
+            if name in self.loaded:
+                return
+            started = time.perf_counter()
+            module = importlib.import_module(f"{self.package}.{name}")
+            record_router_import(name, time.perf_counter() - started)
+            for route in module.router.routes:
+                if not route.path.startswith(self.routers[name]):
+                    logger.warning(f"Route {route.path} di router {name} tidak cocok dengan prefix lazy-nya")
+            self.app.include_router(module.router)
+            # Skema OpenAPI di-cache FastAPI; dibangun ulang dengan route yang baru
+            self.app.openapi_schema = None
+            self.loaded.add(name)
+        logger.info(f"Router {name} loaded in {ROUTER_IMPORT_TIMINGS[name] * 1000:.1f}ms")
+
+    def load_all(self):
+        for name in self.pending:
+            self.load(name)
+
+    def load_for_path(self, path):
+        if path in (self.app.openapi_url, self.app.docs_url, self.app.redoc_url):
+            return self.load_all()
+        for name in self.pending:
+            if path.startswith(self.routers[name]):
+                self.load(name)
+
+
+class LazyRouterMiddleware:
+    """ASGI middleware yang memuat router (LazyRouters) sebelum request pertama ke path-nya di-route."""
+
+    def __init__(self, app, routers):
+        self.app = app
+        self.routers = routers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and len(self.routers.loaded) < len(self.routers.routers):
+            self.routers.load_for_path(scope["path"])
+        await self.app(scope, receive, send)
+
+
+def warmup_regions():
+    """Region yang di-warm saat startup (env WARMUP_REGIONS, dipisah koma; default: model global)."""
+    return [r.strip() for r in os.getenv("WARMUP_REGIONS", "default").split(",") if r.strip()]
+
+
+def _warm_model(kind, region):
+    from helper.model_store import get_model_store
+
+    model_data = get_model_store().get(kind, region)
+    # Satu forecast kecil: memaksa import pandas/lightgbm dan load semua booster (lazy)
+    if kind == "bahan_pokok":
+        from helper.bahan_pokok import load_model_and_forecast
+        load_model_and_forecast(1, model_data=model_data)
+    else:
+        from helper.ihk import forecast_multiple_periods
+        today = datetime.today()
+        forecast_multiple_periods(today.year, today.month, 1, model_data=model_data)
+
+
+def warm_models():
+    """
+    Load dan jalankan forecast kecil untuk setiap model yang dikonfigurasi. Model yang filenya
+    tidak ada dilewati (deployment tanpa model tertentu); error lain membuat service tidak ready.
+    """
+    with _state_lock:
+        _state["started_at"] = time.time()
+
+    results = {}
+    for kind in WARMUP_KINDS:
+        for region in warmup_regions():
+            key = f"{kind}:{region}"
+            started = time.perf_counter()
+            try:
+                _warm_model(kind, region)
+                results[key] = {"status": "warm", "seconds": round(time.perf_counter() - started, 3)}
+            except FileNotFoundError:
+                results[key] = {"status": "missing"}
+            except Exception as e:
+                logger.error(f"Warmup failed for {key}: {str(e)}")
+                results[key] = {"status": "error", "error": str(e)}
+
+    with _state_lock:
+        _state["models"] = results
+        _state["finished_at"] = time.time()
+        _state["duration_seconds"] = round(_state["finished_at"] - _state["started_at"], 3)
+        _state["ready"] = all(r["status"] != "error" for r in results.values())
+    logger.info(f"Model warmup finished in {_state['duration_seconds']}s: {results}")
+    return readiness()
+
+
+def readiness():
+    with _state_lock:
+        return dict(_state)
+
+
+def startup_report(lazy_routers=None):
+    """Waktu import router, import lazy yang sudah terjadi, dan status modul berat."""
+    return {
+        "process_uptime_seconds": round(time.time() - PROCESS_STARTED, 3),
+        "router_import_ms": {k: round(v * 1000, 1) for k, v in ROUTER_IMPORT_TIMINGS.items()},
+        "router_import_total_ms": round(sum(ROUTER_IMPORT_TIMINGS.values()) * 1000, 1),
+        "routers_not_loaded": lazy_routers.pending if lazy_routers is not None else [],
+        "lazy_import_ms": {
+            k: (round(v * 1000, 1) if v is not None else None) for k, v in sorted(LAZY_IMPORT_TIMINGS.items())
+        },
+        "heavy_modules_loaded": {name: name in sys.modules for name in HEAVY_MODULES},
+        "warmup": readiness()
+    }
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from loguru import logger
+from helper.bahan_pokok import TARGET_MAPPING, CALENDAR_FEATURES, _calendar_features, read_actuals, drop_forecast_rows
+from helper.model_store import native_model_path, resolve_model_path, data_path, normalize_region
+from helper.model_artifact import write_native, read_native, load_model, artifact_size, MANIFEST_NAME
+
+REGISTRY_DIR = "./models/registry"
+DEFAULT_LAG_PERIODS = [1, 7, 14, 30]
+DEFAULT_ROLLING_WINDOWS = [7, 14, 30]
+DEFAULT_PARAM_GRID = {
+    "num_leaves": [15, 31],
+    "learning_rate": [0.05, 0.1],
+    "min_data_in_leaf": [10, 20],
+}
+BASE_PARAMS = {"objective": "regression", "verbose": -1, "num_threads": 1}
+ROLLING_STATS = ("mean", "std", "min", "max")
+
+
+def feature_columns(target_columns, lag_periods, rolling_windows):
+    """Urutan kolom fitur yang dipakai saat training maupun serving."""
+    cols = []
+    for target_col in target_columns:
+        cols.extend(f"{target_col}_lag_{lag}" for lag in lag_periods)
+        for window in rolling_windows:
+            cols.extend(f"{target_col}_rolling_{stat}_{window}" for stat in ROLLING_STATS)
+    return cols + list(CALENDAR_FEATURES)
+
+
+def build_feature_matrix(history, target_columns, lag_periods, rolling_windows):
+    """
+    Lag dan rolling features untuk seluruh histori sekaligus (semua target dalam satu array),
+    dengan konvensi yang sama dengan recursive_forecast(): rolling atas nilai sebelum hari itu.
+
+    Args:
+        history: DataFrame harian dengan kolom Tanggal dan kolom target
+        target_columns: nama target
+        lag_periods: daftar lag (hari)
+        rolling_windows: daftar window rolling (hari)
+
+    Returns:
+        tuple: (matrix fitur float64 [n_rows, n_features], list nama kolom). Baris awal yang
+        belum punya lookback lengkap berisi NaN.
+    """
+    values = history[target_columns].to_numpy(dtype=np.float64)
+    n_rows, n_targets = values.shape
+    per_target = len(lag_periods) + len(rolling_windows) * len(ROLLING_STATS)
+    X = np.full((n_rows, n_targets * per_target + len(CALENDAR_FEATURES)), np.nan)
+
+    # Nilai "kemarin" untuk setiap baris; rolling window di atas array ini = shift(1).rolling(w)
+    shifted = np.full_like(values, np.nan)
+    shifted[1:] = values[:-1]
+
+    blocks = {}
+    for lag in lag_periods:
+        lagged = np.full_like(values, np.nan)
+        if lag < n_rows:
+            lagged[lag:] = values[:-lag]
+        blocks[("lag", lag)] = lagged
+
+    for window in rolling_windows:
+        if window > n_rows:
+            for stat in ROLLING_STATS:
+                blocks[(stat, window)] = np.full_like(values, np.nan)
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(shifted, window, axis=0)
+        for stat in ROLLING_STATS:
+            rolled = np.full_like(values, np.nan)
+            rolled[window - 1:] = getattr(windows, stat)(axis=-1)
+            blocks[(stat, window)] = rolled
+
+    col = 0
+    for t in range(n_targets):
+        for lag in lag_periods:
+            X[:, col] = blocks[("lag", lag)][:, t]
+            col += 1
+        for window in rolling_windows:
+            for stat in ROLLING_STATS:
+                X[:, col] = blocks[(stat, window)][:, t]
+                col += 1
+
+    calendar = _calendar_features(history["Tanggal"])
+    for name in CALENDAR_FEATURES:
+        X[:, col] = calendar[name]
+        col += 1
+
+    return X, feature_columns(target_columns, lag_periods, rolling_windows)
+
+
+def load_training_history(excel_path, target_columns=None, until=None, model_data=None):
+    """
+    Histori harian dari workbook harga; hari kosong diisi nilai terakhir seperti saat refresh.
+    Jika model_data diberikan, baris forecast model itu yang tertulis di workbook dibuang dulu.
+    """
+    target_columns = target_columns or list(TARGET_MAPPING)
+    until = pd.Timestamp(until) if until is not None else pd.Timestamp(pd.Timestamp.today().date())
+    actuals = read_actuals(excel_path, target_columns, until=until)
+    if model_data is not None:
+        actuals = drop_forecast_rows(actuals, model_data)
+    targets = [t for t in target_columns if t in actuals.columns]
+
+    full_dates = pd.date_range(actuals["Tanggal"].min(), actuals["Tanggal"].max(), freq="D")
+    # Harga 0 berarti tidak ada data (log-target tidak terdefinisi), diperlakukan seperti hari kosong
+    history = actuals.set_index("Tanggal").reindex(full_dates)[targets].replace(0, np.nan).ffill().bfill()
+    return history.rename_axis("Tanggal").reset_index(), targets
+
+
+def expand_param_grid(param_grid):
+    keys = sorted(param_grid)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(param_grid[k] for k in keys))]
+
+
+# State per worker process: matrix fitur dikirim sekali saat worker start, bukan per job
+_worker_X = None
+_worker_Y = None
+
+
+def _init_worker(X, Y):
+    global _worker_X, _worker_Y
+    _worker_X = X
+    _worker_Y = Y
+
+
+def _cv_job(target_idx, params, n_splits, num_boost_round, early_stopping_rounds):
+    """Time-series CV satu kombinasi (target, params). Jalan di process pool."""
+    import lightgbm as lgb
+    from sklearn.model_selection import TimeSeriesSplit
+
+    X, y = _worker_X, _worker_Y[:, target_idx]
+    scores = []
+    best_iterations = []
+    for train_idx, valid_idx in TimeSeriesSplit(n_splits=n_splits).split(X):
+        train_set = lgb.Dataset(X[train_idx], y[train_idx], free_raw_data=True)
+        valid_set = lgb.Dataset(X[valid_idx], y[valid_idx], reference=train_set)
+        booster = lgb.train(
+            {**BASE_PARAMS, **params}, train_set,
+            num_boost_round=num_boost_round,
+            valid_sets=[valid_set],
+            callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)]
+        )
+        pred = np.exp(booster.predict(X[valid_idx], num_iteration=booster.best_iteration))
+        actual = np.exp(y[valid_idx])
+        scores.append(float(np.mean(np.abs(pred - actual) / actual)))
+        best_iterations.append(booster.best_iteration or num_boost_round)
+    return {
+        "target_idx": target_idx,
+        "params": params,
+        "mape": float(np.mean(scores)),
+        "best_iteration": int(np.mean(best_iterations))
+    }
+
+
+def _fit_job(target_idx, params, num_boost_round):
+    """Fit final satu target pada seluruh data; booster dikirim balik sebagai string model."""
+    import lightgbm as lgb
+
+    train_set = lgb.Dataset(_worker_X, _worker_Y[:, target_idx])
+    booster = lgb.train({**BASE_PARAMS, **params}, train_set, num_boost_round=num_boost_round)
+    return target_idx, booster.model_to_string()
+
+
+def train_models(history, target_columns, lag_periods=DEFAULT_LAG_PERIODS, rolling_windows=DEFAULT_ROLLING_WINDOWS,
+                 param_grid=DEFAULT_PARAM_GRID, n_splits=3, num_boost_round=1000, early_stopping_rounds=50,
+                 max_workers=None, history_rows=60):
+    """
+    Training semua komoditas secara paralel: grid search dengan time-series CV per target,
+    lalu fit final dengan parameter terbaik. Setiap (target, params) adalah satu job di process pool.
+
+    Args:
+        history: DataFrame harian (Tanggal + kolom target)
+        target_columns: target yang dilatih
+        param_grid: dict nama parameter LightGBM -> kandidat nilai
+        n_splits: jumlah fold TimeSeriesSplit
+        max_workers: jumlah proses (default: jumlah core)
+        history_rows: panjang buffer last_data untuk forecast rekursif
+
+    Returns:
+        dict: model_data dengan format yang sama seperti pickle yang dipakai serving
+    """
+    import lightgbm as lgb
+
+    X_all, feature_cols = build_feature_matrix(history, target_columns, lag_periods, rolling_windows)
+    lookback = max(list(lag_periods) + list(rolling_windows))
+    history_rows = max(history_rows, lookback)
+    valid_rows = ~np.isnan(X_all).any(axis=1)
+    X = np.ascontiguousarray(X_all[valid_rows])
+    Y = np.log(history[target_columns].to_numpy(dtype=np.float64)[valid_rows])
+    if len(X) < (n_splits + 1) * 2:
+        raise ValueError(f"Histori terlalu pendek untuk training ({len(X)} baris setelah lookback {lookback} hari)")
+
+    candidates = expand_param_grid(param_grid)
+    logger.info(f"Training {len(target_columns)} targets on {X.shape[0]} rows x {X.shape[1]} features, "
+                f"{len(candidates)} param sets, {n_splits}-fold time-series CV")
+
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(X, Y)) as pool:
+        cv_futures = [
+            pool.submit(_cv_job, t, params, n_splits, num_boost_round, early_stopping_rounds)
+            for t in range(len(target_columns)) for params in candidates
+        ]
+        best = {}
+        for future in cv_futures:
+            result = future.result()
+            t = result["target_idx"]
+            if t not in best or result["mape"] < best[t]["mape"]:
+                best[t] = result
+
+        fit_futures = [
+            pool.submit(_fit_job, t, best[t]["params"], best[t]["best_iteration"])
+            for t in range(len(target_columns))
+        ]
+        model_strings = dict(future.result() for future in fit_futures)
+
+    forecast_results = {}
+    for t, target_col in enumerate(target_columns):
+        forecast_results[target_col] = {
+            "model": lgb.Booster(model_str=model_strings[t]),
+            "params": best[t]["params"],
+            "cv_mape": best[t]["mape"],
+            "num_boost_round": best[t]["best_iteration"]
+        }
+    logger.info(f"Training finished in {time.time() - started:.1f}s")
+
+    last_data = pd.DataFrame(X_all[-history_rows:], columns=feature_cols)
+    last_data.insert(0, "Tanggal", history["Tanggal"].iloc[-history_rows:].to_numpy())
+    for target_col in target_columns:
+        last_data[target_col] = history[target_col].iloc[-history_rows:].to_numpy()
+
+    return {
+        "target_columns": list(target_columns),
+        "feature_cols": feature_cols,
+        "feature_index": {col: i for i, col in enumerate(feature_cols)},
+        "lag_periods": list(lag_periods),
+        "rolling_windows": list(rolling_windows),
+        "last_data": last_data,
+        "forecast_results": forecast_results,
+        "trained_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "training_rows": int(X.shape[0])
+    }
+
+
+def _sha256_file(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_artifact(model_data, kind="bahan_pokok", region=None, registry_dir=REGISTRY_DIR):
+    """
+    Simpan model sebagai artifact versi baru di registry: <registry>/<kind>/<region>/<version>/
+    berisi model/ (format native, lihat helper.model_artifact) dan manifest.json
+    (checksum, fitur, metrik CV).
+
+    Returns:
+        dict: manifest artifact
+    """
+    region_name = normalize_region(region) or "default"
+    # Suffix acak: dua training dalam detik yang sama tidak saling menimpa artifact
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    artifact_dir = os.path.join(registry_dir, kind, region_name, version)
+    os.makedirs(artifact_dir, exist_ok=False)
+
+    # Manifest native memuat sha256 setiap booster/array, jadi hash-nya mengunci seluruh artifact
+    write_native(model_data, os.path.join(artifact_dir, "model"))
+    native_manifest = os.path.join(artifact_dir, "model", MANIFEST_NAME)
+
+    manifest = {
+        "kind": kind,
+        "region": region_name,
+        "version": version,
+        "format": "native",
+        "sha256": _sha256_file(native_manifest),
+        "size": artifact_size(os.path.join(artifact_dir, "model")),
+        "target_columns": model_data["target_columns"],
+        "feature_cols": model_data["feature_cols"],
+        "lag_periods": model_data["lag_periods"],
+        "rolling_windows": model_data["rolling_windows"],
+        "trained_at": model_data.get("trained_at"),
+        "metrics": {
+            t: {"cv_mape": r.get("cv_mape"), "params": r.get("params"), "num_boost_round": r.get("num_boost_round")}
+            for t, r in model_data["forecast_results"].items()
+        }
+    }
+    with open(os.path.join(artifact_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Artifact written: {artifact_dir} (sha256={manifest['sha256'][:12]})")
+    return {**manifest, "path": artifact_dir}
+
+
+def load_artifact(artifact_dir):
+    """Load model dari artifact registry setelah checksum manifest native diverifikasi."""
+    with open(os.path.join(artifact_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    model_dir = os.path.join(artifact_dir, "model")
+    if _sha256_file(os.path.join(model_dir, MANIFEST_NAME)) != manifest["sha256"]:
+        raise ValueError(f"Checksum artifact {artifact_dir} tidak cocok dengan manifest")
+    return read_native(model_dir)
+
+
+def publish_artifact(artifact_dir, kind="bahan_pokok", region=None):
+    """Pasang artifact sebagai model aktif; ModelStore me-reload karena mtime manifest berubah."""
+    target = native_model_path(kind, region)
+    model_data = load_artifact(artifact_dir)
+    write_native(model_data, target)
+    logger.info(f"Published {artifact_dir} -> {target}")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training model forecasting harga bahan pokok")
+    parser.add_argument("--region", default=None, help="kode region (default: model global)")
+    parser.add_argument("--excel", default=None, help="workbook harga harian (default: temp_uploads/<region>/)")
+    parser.add_argument("--targets", default=None, help="daftar target dipisah koma (default: semua)")
+    parser.add_argument("--until", default=None, help="tanggal data terakhir (YYYY-MM-DD)")
+    parser.add_argument("--splits", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    parser.add_argument("--publish", action="store_true", help="pasang hasil training sebagai model aktif")
+    args = parser.parse_args()
+
+    excel_path = args.excel or data_path("Harga_pangan_harian.xlsx", args.region)
+    targets = args.targets.split(",") if args.targets else None
+    # Forecast yang ditulis model aktif ke workbook tidak boleh jadi label training
+    active_path = resolve_model_path("bahan_pokok", args.region)
+    active_model = load_model(active_path) if os.path.exists(active_path) else None
+    history, target_columns = load_training_history(excel_path, targets, until=args.until, model_data=active_model)
+
+    model_data = train_models(history, target_columns, n_splits=args.splits, max_workers=args.workers)
+    manifest = write_artifact(model_data, region=args.region, registry_dir=args.registry)
+    if args.publish:
+        publish_artifact(manifest["path"], region=args.region)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import re
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+import aiofiles
+from loguru import logger
+from helper.file_events import notify_file_changed
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_ROOT = "./temp_uploads"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Field teks (mis. project) ditampung di memori, jadi dibatasi jauh lebih kecil dari file
+MAX_FIELD_BYTES = int(os.getenv("MAX_UPLOAD_FIELD_BYTES", str(64 * 1024)))
+
+_MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    uploaded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads(sha256);
+"""
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def safe_filename(filename):
+    """Buang komponen path dan karakter berbahaya dari nama file upload."""
+    name = os.path.basename(filename.replace("\\", "/")).strip()
+    name = re.sub(r"[\x00-\x1f/]", "", name).lstrip(".")
+    return name
+
+
+class UploadManifest:
+    """Manifest hash konten per file upload, dipakai untuk deduplikasi."""
+
+    def __init__(self, root=UPLOAD_ROOT):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.root, ".upload_manifest.sqlite"), check_same_thread=False)
+        self._conn.executescript(_MANIFEST_SCHEMA)
+
+    def hash_of(self, path):
+        """Hash konten terakhir yang tercatat, None jika file sudah diubah di luar upload."""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256, mtime FROM uploads WHERE path = ?", (path,)).fetchone()
+        if row is None or not os.path.isfile(path) or os.stat(path).st_mtime != row[1]:
+            return None
+        return row[0]
+
+    def path_with_hash(self, sha256):
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM uploads WHERE sha256 = ?", (sha256,)).fetchall()
+        for (path,) in rows:
+            if self.hash_of(path) == sha256:
+                return path
+        return None
+
+    def record(self, path, sha256, size):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)",
+                               (path, sha256, size, os.stat(path).st_mtime, time.time()))
+            self._conn.commit()
+
+
+_manifest = None
+
+
+def get_upload_manifest():
+    global _manifest
+    if _manifest is None:
+        _manifest = UploadManifest()
+    return _manifest
+
+
+class _FilePart:
+    def __init__(self, field_name, filename, tmp_path):
+        self.field_name = field_name
+        self.filename = filename
+        self.tmp_path = tmp_path
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.pending = []
+        self.handle = None
+
+
+async def receive_multipart_upload(request, root=UPLOAD_ROOT, max_bytes=MAX_UPLOAD_BYTES,
+                                   max_field_bytes=MAX_FIELD_BYTES):
+    """
+    Terima upload multipart/form-data secara streaming: body dibaca per chunk, ditulis ke disk
+    dan di-hash saat itu juga, tanpa menampung file utuh di memori.
+
+    Returns:
+        tuple: (list _FilePart yang sudah selesai ditulis ke file sementara, dict field teks)
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise ValueError("Content-Type harus multipart/form-data")
+
+    incoming_dir = os.path.join(os.path.abspath(root), ".incoming")
+    os.makedirs(incoming_dir, exist_ok=True)
+
+    files = []
+    fields = {}
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "part": None, "field": None}
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["part"] = None
+        state["field"] = None
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode()
+        filename = disposition.get(b"filename")
+        if filename is not None:
+            tmp_path = os.path.join(incoming_dir, f"{uuid.uuid4().hex}.part")
+            state["part"] = _FilePart(name, filename.decode(), tmp_path)
+            files.append(state["part"])
+        else:
+            state["field"] = name
+            fields[name] = b""
+
+    def on_part_data(data, start, end):
+        part = state["part"]
+        if part is not None:
+            chunk = bytes(data[start:end])
+            part.hasher.update(chunk)
+            part.size += len(chunk)
+            if part.size > max_bytes:
+                raise UploadTooLarge(f"File melebihi batas {max_bytes} bytes")
+            part.pending.append(chunk)
+        elif state["field"] is not None:
+            if len(fields[state["field"]]) + (end - start) > max_field_bytes:
+                raise UploadTooLarge(f"Field {state['field']} melebihi batas {max_field_bytes} bytes")
+            fields[state["field"]] += data[start:end]
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            # Tulis data yang sudah di-parse ke disk secara async sebelum chunk berikutnya dibaca
+            for part in files:
+                if part.pending:
+                    if part.handle is None:
+                        part.handle = await aiofiles.open(part.tmp_path, "wb")
+                    await part.handle.write(b"".join(part.pending))
+                    part.pending = []
+        parser.finalize()
+    except Exception:
+        for part in files:
+            if part.handle is not None:
+                await part.handle.close()
+            if os.path.exists(part.tmp_path):
+                os.remove(part.tmp_path)
+        raise
+
+    for part in files:
+        if part.handle is None:
+            part.handle = await aiofiles.open(part.tmp_path, "wb")
+        await part.handle.close()
+
+    return files, {k: v.decode("utf-8", errors="replace") for k, v in fields.items()}
+
+
+def commit_upload(part, project="", root=UPLOAD_ROOT):
+    """
+    Pindahkan file sementara ke lokasi akhir dengan deduplikasi berdasarkan hash konten.
+
+    - konten sama dengan file tujuan: file sementara dibuang, tidak ada invalidasi cache
+    - selain itu file dipindah (atomic), manifest dicatat dan subscriber cache diberi tahu
+
+    Returns:
+        dict: informasi file hasil upload
+    """
+    manifest = get_upload_manifest()
+    root = os.path.abspath(root)
+    filename = safe_filename(part.filename)
+    project = safe_filename(project) if project else ""
+    if not filename:
+        os.remove(part.tmp_path)
+        raise ValueError("Nama file tidak valid")
+
+    target_dir = os.path.join(root, project) if project else root
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, filename)
+    sha256 = part.hasher.hexdigest()
+
+    result = {"filename": filename, "project": project, "path": target, "sha256": sha256, "size": part.size}
+
+    if manifest.hash_of(target) == sha256:
+        os.remove(part.tmp_path)
+        logger.info(f"Duplicate upload skipped: {target}")
+        return {**result, "status": "duplicate"}
+
+    existed = os.path.isfile(target)
+    # Konten yang sama di path lain hanya dilaporkan; tidak di-hardlink karena helper Excel
+    # menulis ulang file di tempat dan akan ikut mengubah salinan lainnya
+    duplicate_of = manifest.path_with_hash(sha256)
+    os.replace(part.tmp_path, target)
+
+    manifest.record(target, sha256, part.size)
+    notify_file_changed(target)
+
+    logger.info(f"Upload stored: {target} ({part.size} bytes, sha256={sha256[:12]})")
+    return {**result, "status": "updated" if existed else "created", "duplicate_of": duplicate_of}
+
+
+def commit_uploads(parts, project="", root=UPLOAD_ROOT):
+    """
+    commit_upload() untuk semua part. Jika satu part gagal, file sementara part yang belum
+    di-commit (termasuk yang gagal) dihapus dari .incoming sebelum error diteruskan.
+    """
+    uploaded = []
+    try:
+        for part in parts:
+            uploaded.append(commit_upload(part, project=project, root=root))
+    finally:
+        for part in parts[len(uploaded):]:
+            if os.path.exists(part.tmp_path):
+                os.remove(part.tmp_path)
+    return uploaded
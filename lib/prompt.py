@@ -7,4 +7,49 @@ Answer user queries based on the contract details provided.:
 - Accept_reject_status: {Accept_reject_status}
 
 Answer user query in detail in Bahasa Indonesia but preserve the IFRS 15 5 Step Model English term and provide the precise calculation.
-'''
\ No newline at end of file
+'''
+
+waspang_extraction_prompt = '''
+You are an expert Document Checker. Extract the key information from the "Laporan Pekerjaan Selesai 100%" (Waspang report) below.
+
+Document content:
+{ocr_result}
+
+Return ONLY a JSON object with these keys:
+- "nomor_dokumen": document number
+- "tanggal": document date
+- "nama_proyek": project name
+- "lokasi": project location
+- "pelaksana": contractor name
+- "waspang": supervisor (Waspang) name
+- "status_pekerjaan": work completion status
+If a value is not present in the document, use null.
+'''
+
+sign_check_prompt_multimodal = '''
+You are an expert Document Checker. Look at the signature area of this document image.
+Return ONLY a JSON object with these keys:
+- "signed_waspang": true if the Waspang signature is present, otherwise false
+- "signed_pelaksana": true if the Pelaksana signature is present, otherwise false
+- "notes": short explanation in Bahasa Indonesia
+'''
+
+contract_qa_prompt = '''
+You are an expert Document Checker specialised in contract review and IFRS 15 revenue recognition.
+Answer the user question using ONLY the contract and BA (Berita Acara) excerpts below. Each excerpt is labelled
+with its source in square brackets.
+
+Contract excerpts:
+{ocr_result}
+
+Pre-computed IFRS 15 figures (transaction price allocation and revenue recognition schedule):
+{calculation}
+
+User question: {question}
+
+Answer in detail in Bahasa Indonesia but preserve the IFRS 15 5 Step Model English terms
+(term of contract, contract value, term of payment, performance obligation, transaction price).
+When pre-computed figures are given, use them as-is for amounts and dates and only explain them; do not
+recalculate. Otherwise provide the precise calculation. Cite the excerpt numbers you used, e.g. [1], [3].
+If the excerpts do not contain the answer, say so explicitly.
+'''
@@ -0,0 +1,269 @@
+import os
+import time
+import heapq
+import asyncio
+import hashlib
+import logging
+import itertools
+from contextlib import asynccontextmanager
+from llm_engine import telkomllm_call_ocr, telkommultimodal_call, telkommnanonets_call, telkomllm_extract_json
+
+logger = logging.getLogger(__name__)
+
+# Kelas prioritas: angka kecil dilayani lebih dulu
+PRIORITIES = {"interactive": 0, "batch": 1}
+CHARS_PER_TOKEN = 3.5
+# Token per gambar (multimodal/Nanonets) dan perkiraan panjang completion per request
+IMAGE_TOKENS = int(os.getenv("LLM_IMAGE_TOKENS", "1000"))
+COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "1500"))
+
+# Budget per backend upstream, bisa di-override lewat env <BACKEND>_MAX_CONCURRENCY / <BACKEND>_TOKENS_PER_MINUTE
+DEFAULT_BUDGETS = {
+    "llm": {"max_concurrency": 4, "tokens_per_minute": 60000},
+    "lmm": {"max_concurrency": 2, "tokens_per_minute": 30000},
+    "nanonets": {"max_concurrency": 2, "tokens_per_minute": 30000},
+}
+
+
+def estimate_request_tokens(*texts, images=0):
+    """Perkiraan token satu request: prompt + gambar + completion."""
+    chars = sum(len(t) for t in texts if isinstance(t, str))
+    return int(chars / CHARS_PER_TOKEN) + images * IMAGE_TOKENS + COMPLETION_TOKENS
+
+
+class _Backend:
+    """Antrian prioritas + slot concurrency + token bucket (tokens per minute) untuk satu upstream."""
+
+    def __init__(self, name, max_concurrency, tokens_per_minute):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.active = 0
+        self.queue = []
+        self._seq = itertools.count()
+        self._timer = None
+        self.stats = {"dispatched": 0, "tokens_reserved": 0,
+                      "wait_seconds": {p: 0.0 for p in PRIORITIES}, "served": {p: 0 for p in PRIORITIES}}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _pump(self):
+        """Beri slot ke antrian terdepan selama concurrency dan token masih cukup."""
+        self._timer = None
+        while self.queue and self.active < self.max_concurrency:
+            rank, _, entry = self.queue[0]
+            if entry["future"].done():  # pemanggil sudah batal
+                heapq.heappop(self.queue)
+                continue
+            self._refill()
+            need = min(entry["tokens"], self.capacity)
+            if self.tokens < need:
+                # Antrian terdepan menunggu token; yang di belakang tidak boleh menyalip
+                delay = (need - self.tokens) / self.rate
+                logger.debug(f"{self.name}: waiting {delay:.2f}s for token budget ({len(self.queue)} queued)")
+                self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            heapq.heappop(self.queue)
+            self.tokens -= need
+            self.active += 1
+            self.stats["dispatched"] += 1
+            self.stats["tokens_reserved"] += need
+            self.stats["served"][entry["priority"]] += 1
+            self.stats["wait_seconds"][entry["priority"]] += time.monotonic() - entry["queued_at"]
+            entry["future"].set_result(True)
+
+    def enqueue(self, priority, tokens):
+        entry = {
+            "future": asyncio.get_running_loop().create_future(),
+            "priority": priority,
+            "tokens": tokens,
+            "queued_at": time.monotonic()
+        }
+        item = [PRIORITIES[priority], next(self._seq), entry]
+        entry["item"] = item
+        heapq.heappush(self.queue, item)
+        if self._timer is None:
+            self._pump()
+        return entry
+
+    def promote(self, entry, priority):
+        """Naikkan prioritas request yang masih antri (mis. request interactive ikut menunggu hasilnya)."""
+        if PRIORITIES[priority] < entry["item"][0] and not entry["future"].done():
+            entry["item"][0] = PRIORITIES[priority]
+            entry["priority"] = priority
+            heapq.heapify(self.queue)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._pump()
+
+    def release(self):
+        self.active -= 1
+        if self._timer is None:
+            self._pump()
+
+    def snapshot(self):
+        self._refill()
+        return {
+            "active": self.active,
+            "queued": sum(1 for _, _, e in self.queue if not e["future"].done()),
+            "max_concurrency": self.max_concurrency,
+            "tokens_per_minute": self.capacity,
+            "tokens_available": int(self.tokens),
+            **self.stats
+        }
+
+
+class LLMDispatcher:
+    """
+    Dispatcher pusat untuk semua panggilan upstream LLM:
+
+    - per backend: batas concurrency dan budget tokens-per-minute
+    - prioritas: "interactive" selalu dilayani sebelum "batch"
+    - singleflight: request identik yang sedang berjalan tidak dikirim ulang, hasilnya dipakai bersama
+    """
+
+    def __init__(self, budgets=None):
+        budgets = budgets or DEFAULT_BUDGETS
+        self._backends = {}
+        for name, budget in budgets.items():
+            prefix = name.upper()
+            self._backends[name] = _Backend(
+                name,
+                int(os.getenv(f"{prefix}_MAX_CONCURRENCY", budget["max_concurrency"])),
+                int(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", budget["tokens_per_minute"]))
+            )
+        self._inflight = {}
+        self.coalesced = 0
+
+    @asynccontextmanager
+    async def slot(self, backend, priority="interactive", tokens=COMPLETION_TOKENS):
+        """Tahan satu slot backend selama blok berjalan (dipakai juga untuk response streaming)."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority harus salah satu dari {list(PRIORITIES)}")
+        state = self._backends[backend]
+        entry = state.enqueue(priority, tokens)
+        try:
+            await entry["future"]
+        except asyncio.CancelledError:
+            # Dibatalkan tepat setelah slot diberikan: kembalikan slotnya
+            if entry["future"].done() and not entry["future"].cancelled():
+                state.release()
+            raise
+        try:
+            yield
+        finally:
+            state.release()
+
+    async def _run(self, backend, fn, args, kwargs, priority, tokens, holder):
+        state = self._backends[backend]
+        entry = state.enqueue(priority, tokens)
+        holder["entry"] = entry
+        try:
+            await entry["future"]
+        except asyncio.CancelledError:
+            if entry["future"].done() and not entry["future"].cancelled():
+                state.release()
+            raise
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            state.release()
+
+    async def call(self, backend, fn, *args, priority="interactive", tokens=None, coalesce=True, **kwargs):
+        """
+        Jalankan fn(*args, **kwargs) setelah mendapat slot dan budget token di backend.
+
+        Args:
+            backend: "llm", "lmm" atau "nanonets"
+            fn: fungsi async dari llm_engine
+            priority: "interactive" atau "batch"
+            tokens: perkiraan token request (default: dari panjang argumen teks)
+            coalesce: gabungkan dengan request identik yang sedang berjalan
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority harus salah satu dari {list(PRIORITIES)}")
+        tokens = tokens if tokens is not None else estimate_request_tokens(*args)
+
+        key = None
+        if coalesce:
+            digest = hashlib.sha256(repr((fn.__qualname__, args, sorted(kwargs.items()))).encode()).hexdigest()
+            key = (backend, digest)
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                task, holder = inflight
+                self.coalesced += 1
+                logger.debug(f"Coalesced identical {backend} request ({fn.__name__})")
+                if "entry" in holder:
+                    self._backends[backend].promote(holder["entry"], priority)
+                return await self._wait(task, holder)
+
+        holder = {"waiters": 0}
+        task = asyncio.ensure_future(self._run(backend, fn, args, kwargs, priority, tokens, holder))
+        if key is not None:
+            self._inflight[key] = (task, holder)
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await self._wait(task, holder)
+
+    @staticmethod
+    async def _wait(task, holder):
+        # shield: pemanggil yang batal tidak membatalkan request yang masih ditunggu pemanggil lain;
+        # request baru dibatalkan jika tidak ada lagi yang menunggu hasilnya
+        holder["waiters"] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            holder["waiters"] -= 1
+            if holder["waiters"] == 0:
+                task.cancel()
+            raise
+
+    def stats(self):
+        return {
+            "backends": {name: b.snapshot() for name, b in self._backends.items()},
+            "in_flight_unique": len(self._inflight),
+            "coalesced": self.coalesced
+        }
+
+
+_dispatcher = None
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = LLMDispatcher()
+    return _dispatcher
+
+
+async def llm_call_ocr(extraction_prompt, ocr_result, reasoning=False, priority="interactive"):
+    return await get_dispatcher().call(
+        "llm", telkomllm_call_ocr, extraction_prompt, ocr_result, reasoning,
+        priority=priority, tokens=estimate_request_tokens(extraction_prompt, ocr_result)
+    )
+
+
+async def llm_extract_json(extraction_prompt, ocr_result, priority="interactive"):
+    return await get_dispatcher().call(
+        "llm", telkomllm_extract_json, extraction_prompt, ocr_result,
+        priority=priority, tokens=estimate_request_tokens(extraction_prompt, ocr_result)
+    )
+
+
+async def multimodal_call(extraction_prompt, img_base64, mime_type="image/jpeg", priority="interactive"):
+    return await get_dispatcher().call(
+        "lmm", telkommultimodal_call, extraction_prompt, img_base64, mime_type,
+        priority=priority, tokens=estimate_request_tokens(extraction_prompt, images=1)
+    )
+
+
+async def nanonets_call(img_base64, mime_type="image/png", priority="interactive"):
+    return await get_dispatcher().call(
+        "nanonets", telkommnanonets_call, img_base64, mime_type,
+        priority=priority, tokens=estimate_request_tokens(images=1)
+    )
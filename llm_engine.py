@@ -1,51 +1,62 @@
 import os
 import json
-import httpx
-from dotenv import load_dotenv
 import logging
+from utils import StreamingJsonExtractor, lazy_import
+
+httpx = lazy_import("httpx")
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-load_dotenv('.env')
+_config = None
+
+
+def get_llm_config():
+    """
+    Load .env dan endpoint LLM/LMM/Nanonets saat pertama dipakai, bukan saat modul di-import,
+    sehingga start/reload API tidak membayar biaya ini untuk traffic non-LLM.
+    """
+    global _config
+    if _config is None:
+        from dotenv import load_dotenv
 
-URL_CUSTOM_LLM = os.getenv('URL_CUSTOM_LLM_APILOGY')
-TOKEN_CUSTOM_LLM = os.getenv('TOKEN_CUSTOM_LLM_APILOGY')
+        load_dotenv('.env')
 
-URL_CUSTOM_LMM = os.getenv('URL_CUSTOM_LMM')
-TOKEN_CUSTOM_LMM = os.getenv('TOKEN_CUSTOM_LMM')
+        _config = {
+            "URL_CUSTOM_LLM": os.getenv('URL_CUSTOM_LLM_APILOGY'),
+            "TOKEN_CUSTOM_LLM": os.getenv('TOKEN_CUSTOM_LLM_APILOGY'),
+            "URL_CUSTOM_LMM": os.getenv('URL_CUSTOM_LMM'),
+            "TOKEN_CUSTOM_LMM": os.getenv('TOKEN_CUSTOM_LMM'),
+            "URL_CUSTOM_NANONETS": os.getenv('URL_CUSTOM_NANONETS'),
+            "TOKEN_CUSTOM_NANONETS": os.getenv('TOKEN_CUSTOM_NANONETS'),
+        }
 
-URL_CUSTOM_NANONETS = os.getenv('URL_CUSTOM_NANONETS')
-TOKEN_CUSTOM_NANONETS = os.getenv('TOKEN_CUSTOM_NANONETS')
+        # Debug: Print loaded environment variables (masked)
+        for key, value in _config.items():
+            logger.debug(f"{key} loaded: {'Yes' if value else 'No'}")
+    return _config
 
-# Debug: Print loaded environment variables (masked)
-logger.debug(f"URL_CUSTOM_LLM loaded: {'Yes' if URL_CUSTOM_LLM else 'No'}")
-logger.debug(f"TOKEN_CUSTOM_LLM loaded: {'Yes' if TOKEN_CUSTOM_LLM else 'No'}")
-logger.debug(f"URL_CUSTOM_LMM loaded: {'Yes' if URL_CUSTOM_LMM else 'No'}")
-logger.debug(f"TOKEN_CUSTOM_LMM loaded: {'Yes' if TOKEN_CUSTOM_LMM else 'No'}")
-logger.debug(f"URL_CUSTOM_NANONETS loaded: {'Yes' if URL_CUSTOM_NANONETS else 'No'}")
-logger.debug(f"TOKEN_CUSTOM_NANONETS loaded: {'Yes' if TOKEN_CUSTOM_NANONETS else 'No'}")
 
 async def telkomllm_call_ocr(extraction_prompt, ocr_result, reasoning=False):
     """
     Makes an asynchronous API call to the Telkom LLM API.
     """
     try:
+        config = get_llm_config()
+
         # Validate environment variables
-        if not URL_CUSTOM_LLM:
+        if not config["URL_CUSTOM_LLM"]:
             error_msg = "URL_CUSTOM_LLM_APILOGY not found in environment variables"
             logger.error(error_msg)
             return {"error": error_msg}
         
-        if not TOKEN_CUSTOM_LLM:
+        if not config["TOKEN_CUSTOM_LLM"]:
             error_msg = "TOKEN_CUSTOM_LLM_APILOGY not found in environment variables"
             logger.error(error_msg)
             return {"error": error_msg}
 
         # API endpoint and payload setup
-        url = URL_CUSTOM_LLM
-        token = TOKEN_CUSTOM_LLM
+        url = config["URL_CUSTOM_LLM"]
+        token = config["TOKEN_CUSTOM_LLM"]
         payload = {
             "messages": [
                 {
@@ -104,25 +115,27 @@ async def telkomllm_call_ocr(extraction_prompt, ocr_result, reasoning=False):
         logger.error(error_msg)
         return {"error": error_msg}
 
-async def telkommultimodal_call(extraction_prompt, img_base64):
+async def telkommultimodal_call(extraction_prompt, img_base64, mime_type="image/jpeg"):
     """
     Makes an asynchronous API call to the Telkom Multimodal API.
     """
     try:
+        config = get_llm_config()
+
         # Validate environment variables
-        if not URL_CUSTOM_LMM:
+        if not config["URL_CUSTOM_LMM"]:
             error_msg = "URL_CUSTOM_LMM not found in environment variables"
             logger.error(error_msg)
             return {"error": error_msg}
         
-        if not TOKEN_CUSTOM_LMM:
+        if not config["TOKEN_CUSTOM_LMM"]:
             error_msg = "TOKEN_CUSTOM_LMM not found in environment variables"
             logger.error(error_msg)
             return {"error": error_msg}
 
         # API endpoint and payload setup
-        url = URL_CUSTOM_LMM
-        token = TOKEN_CUSTOM_LMM
+        url = config["URL_CUSTOM_LMM"]
+        token = config["TOKEN_CUSTOM_LMM"]
         headers = {
             "Accept": "application/json",
             "Content-Type": "application/json",
@@ -140,7 +153,7 @@ async def telkommultimodal_call(extraction_prompt, img_base64):
                         },
                         {
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{img_base64}"
+                                "url": f"data:{mime_type};base64,{img_base64}"
                             },
                             "type": "image_url"
                         }
@@ -191,24 +204,26 @@ async def telkommultimodal_call(extraction_prompt, img_base64):
         logger.error(error_msg)
         return {"error": error_msg}
 
-async def telkommnanonets_call(img_base64):
+async def telkommnanonets_call(img_base64, mime_type="image/png"):
     """
     Makes an asynchronous API call to the Telkom Nanonets API.
     """
     try:
+        config = get_llm_config()
+
         # Validate environment variables
-        if not URL_CUSTOM_NANONETS:
+        if not config["URL_CUSTOM_NANONETS"]:
             error_msg = "URL_CUSTOM_NANONETS not found in environment variables"
             logger.error(error_msg)
             return {"error": error_msg}
         
-        if not TOKEN_CUSTOM_NANONETS:
+        if not config["TOKEN_CUSTOM_NANONETS"]:
             error_msg = "TOKEN_CUSTOM_NANONETS not found in environment variables"
             logger.error(error_msg)
             return {"error": error_msg}
 
-        url = URL_CUSTOM_NANONETS
-        token = TOKEN_CUSTOM_NANONETS
+        url = config["URL_CUSTOM_NANONETS"]
+        token = config["TOKEN_CUSTOM_NANONETS"]
         headers = {
             "Accept": "application/json",
             "Content-Type": "application/json",
@@ -221,7 +236,7 @@ async def telkommnanonets_call(img_base64):
                     "content": [
                         {
                             "image_url": {
-                                "url": f"data:image/png;base64,{img_base64}"
+                                "url": f"data:{mime_type};base64,{img_base64}"
                             },
                             "type": "image_url"
                         }
@@ -271,4 +286,129 @@ async def telkommnanonets_call(img_base64):
     except Exception as e:
         error_msg = f"Unexpected error in telkommnanonets_call: {type(e).__name__}: {str(e)}"
         logger.error(error_msg)
-        return {"error": error_msg}
\ No newline at end of file
+        return {"error": error_msg}
+
+
+class LLMStreamError(Exception):
+    """Raised when the upstream LLM stream cannot be opened or is malformed."""
+
+
+async def telkomllm_stream_ocr(extraction_prompt, ocr_result, stop_on_json=False, max_tokens=20000):
+    """
+    Streaming version of telkomllm_call_ocr. Yields content deltas as they arrive (SSE).
+    If stop_on_json is True, the stream is closed as soon as the first top-level
+    JSON object in the output is complete, so the upstream stops generating tokens.
+    """
+    config = get_llm_config()
+    if not config["URL_CUSTOM_LLM"]:
+        raise LLMStreamError("URL_CUSTOM_LLM_APILOGY not found in environment variables")
+    if not config["TOKEN_CUSTOM_LLM"]:
+        raise LLMStreamError("TOKEN_CUSTOM_LLM_APILOGY not found in environment variables")
+
+    payload = {
+        "messages": [
+            {
+                "role": "system",
+                "content": extraction_prompt.format(
+                    ocr_result=ocr_result
+                ),
+            }
+        ],
+        "max_tokens": max_tokens,
+        "temperature": 0,
+        "stream": True
+    }
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "x-api-key": config["TOKEN_CUSTOM_LLM"]
+    }
+
+    extractor = StreamingJsonExtractor() if stop_on_json else None
+    # Timeout berlaku per-read, bukan untuk seluruh completion
+    timeout = httpx.Timeout(60.0, read=60.0)
+
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async with client.stream("POST", config["URL_CUSTOM_LLM"], json=payload, headers=headers) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode(errors="replace")
+                    logger.error(f"API Error {response.status_code}: {body}")
+                    raise LLMStreamError(f"API call failed with status {response.status_code}: {body}")
+
+                async for line in response.aiter_lines():
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        event = json.loads(data)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping malformed SSE chunk: {data[:100]}")
+                        continue
+
+                    choices = event.get("choices") or []
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta") or {}
+                    content = delta.get("content")
+                    if not content:
+                        continue
+
+                    yield content
+
+                    if extractor is not None and extractor.feed(content) is not None:
+                        logger.debug("JSON object complete, closing stream early")
+                        break
+    except httpx.TimeoutException as e:
+        raise LLMStreamError(f"Request timeout: {str(e)}") from e
+    except httpx.RequestError as e:
+        raise LLMStreamError(f"Request error: {str(e)}") from e
+
+
+async def telkomllm_call_ocr_streamed(extraction_prompt, ocr_result, stop_on_json=True):
+    """
+    Drop-in alternative to telkomllm_call_ocr that uses the streaming endpoint and
+    returns the accumulated content (optionally cut at the end of the JSON object).
+    """
+    try:
+        parts = []
+        async for content in telkomllm_stream_ocr(extraction_prompt, ocr_result, stop_on_json=stop_on_json):
+            parts.append(content)
+        return "".join(parts)
+    except LLMStreamError as e:
+        logger.error(str(e))
+        return {"error": str(e)}
+    except Exception as e:
+        error_msg = f"Unexpected error in telkomllm_call_ocr_streamed: {type(e).__name__}: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}
+
+
+async def telkomllm_extract_json(extraction_prompt, ocr_result):
+    """
+    Streams the completion and parses the first JSON object incrementally.
+    Returns the parsed object as soon as it closes, without buffering or
+    re-scanning the full response. Falls back to the raw text if no object is found.
+    """
+    extractor = StreamingJsonExtractor()
+    parts = []
+    stream = telkomllm_stream_ocr(extraction_prompt, ocr_result)
+    try:
+        async for content in stream:
+            parts.append(content)
+            result = extractor.feed(content)
+            if result is not None:
+                # Tutup stream agar upstream berhenti generate token
+                await stream.aclose()
+                return result
+        # Tidak ada objek JSON lengkap, kembalikan teks apa adanya
+        return "".join(parts)
+    except LLMStreamError as e:
+        logger.error(str(e))
+        return {"error": str(e)}
+    except Exception as e:
+        error_msg = f"Unexpected error in telkomllm_extract_json: {type(e).__name__}: {str(e)}"
+        logger.error(error_msg)
+        return {"error": error_msg}
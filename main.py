@@ -1,12 +1,28 @@
+import os
 import sys
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import (
-    clustering,
-    ihk_forecast,
-    bahan_pokok,
-)
 from loguru import logger
+from helper.startup import LazyRouters, LazyRouterMiddleware, warm_models
+from helper.document_index import watch_document_index
+from helper.profiling import ProfilingMiddleware
+
+# Router -> prefix path yang dilayaninya. Router di-import saat request pertama ke salah satu
+# prefix-nya (LAZY_ROUTERS=false: semua di-import saat start); router system selalu dimuat
+# agar /health dan /ready langsung tersedia.
+ROUTERS = {
+    "ihk_forecast": ("/wjes/forecasting_ihk", "/wjes/download_forecast_ihk"),
+    "clustering": ("/wjes/clustering_twitter",),
+    "bahan_pokok": ("/wjes/forecasting_bahan_pokok", "/wjes/forecast_regions", "/wjes/refresh_bahan_pokok_model",
+                    "/wjes/bahan_pokok_anomalies", "/wjes/backtest_report", "/wjes/download_forecast_bahan_pokok"),
+    "documents": ("/wjes/ingest_documents", "/wjes/document_checklist", "/wjes/contract_qa", "/wjes/ifrs15_schedule"),
+    "uploads": ("/wjes/upload",),
+    "system": ("/health", "/ready", "/wjes/startup_report", "/wjes/llm_dispatch_stats", "/wjes/admin/"),
+    "history": ("/wjes/history",),
+}
+EAGER_ROUTERS = ("system",)
 
 app = FastAPI(
     title='WJES',
@@ -22,12 +38,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include all routers
-app.include_router(ihk_forecast.router)
-app.include_router(clustering.router)
-app.include_router(bahan_pokok.router)
+# Router di-load lazy; waktu import tiap router dicatat untuk /wjes/startup_report.
+# Dependency berat (pandas, numpy, lightgbm, PIL, httpx) di bawahnya juga di-import lazy.
+app.state.lazy_routers = LazyRouters(app, ROUTERS)
+if os.getenv("LAZY_ROUTERS", "true").lower() == "true":
+    for name in EAGER_ROUTERS:
+        app.state.lazy_routers.load(name)
+else:
+    app.state.lazy_routers.load_all()
+app.add_middleware(LazyRouterMiddleware, routers=app.state.lazy_routers)
+
+# Profiling per request (opt-in lewat X-Profile + X-Admin-Key atau PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Document index di-update incremental di background, bukan scan per request
+    app.state.document_index_watcher = asyncio.create_task(watch_document_index())
+    # Warmup model di thread terpisah; /ready baru 200 setelah selesai, /health tidak menunggu
+    app.state.model_warmup = asyncio.get_running_loop().run_in_executor(None, warm_models)
+
 
-# Setup logging
+# Setup logging (stdlib logging dipakai llm_engine/llm_dispatcher), dikonfigurasi sekali saat start
+logging.basicConfig(level=logging.DEBUG)
 logger.add(sys.stderr, level="TRACE")
 logger.add(sys.stderr, format="{time} | {level} | {message}")
 logger.add("/log/wjes.log", rotation="1 hour")
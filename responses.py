@@ -0,0 +1,59 @@
+# responses.py
+import json
+from typing import Any
+from fastapi.responses import JSONResponse
+from utils import lazy_import
+
+np = lazy_import("numpy")
+
+try:
+    import orjson
+except ImportError:  # orjson opsional, fallback ke json standar
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse dengan encoder orjson (support NumPy array langsung), fallback ke json."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_default, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+
+RESPONSE_FORMATS = ("json", "columnar")
+
+
+def columnar_bahan_pokok(forecast_results):
+    """
+    Hasil load_model_and_forecast() dalam layout kolumnar:
+    satu array tanggal bersama + satu array nilai per target.
+    """
+    dates = None
+    values = {}
+    for target, df_out in forecast_results.items():
+        if dates is None:
+            dates = df_out["Tanggal"].dt.strftime('%Y-%m-%d').tolist()
+        values[target] = df_out[f"Forecast_{target}"].to_numpy().round(0)
+    return {"tanggal": dates or [], "values": values}
+
+
+def columnar_ihk(forecast_df):
+    """Hasil forecast IHK dalam layout kolumnar: array periode bersama + satu array per target."""
+    target_cols = [col for col in forecast_df.columns if col not in ['Tahun', 'Bulan']]
+    return {
+        "periods": forecast_df.index.tolist(),
+        "tahun": forecast_df["Tahun"].to_numpy(),
+        "bulan": forecast_df["Bulan"].tolist(),
+        "values": {col: forecast_df[col].to_numpy(dtype=np.float64).round(4) for col in target_cols}
+    }
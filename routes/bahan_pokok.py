@@ -1,32 +1,75 @@
 import pickle
-import numpy as np
-import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException
-from dependencies import get_api_key
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from dependencies import rate_limit
 from datetime import datetime, timedelta
 from loguru import logger
-from helper.bahan_pokok import update_excel_with_forecast, load_model_and_forecast
+from helper.bahan_pokok import (
+    TARGET_MAPPING,
+    update_excel_with_forecast,
+    load_model_and_forecast,
+    forecast_fleet,
+    refresh_model_with_actuals
+)
+from helper.model_store import get_model_store, data_path, list_regions, resolve_model_path
+from helper.model_artifact import load_model, save_model
+from helper.excel_export import stream_workbook, XLSX_MEDIA_TYPE
+from helper.response_cache import cached_json_response, get_response_cache, model_fingerprint, data_version
+from helper.anomaly import score_daily_batch, Z_THRESHOLD, FORECAST_TOLERANCE
+from responses import FastJSONResponse, RESPONSE_FORMATS, columnar_bahan_pokok
+from pydantic import BaseModel
 
 router = APIRouter(tags=["Forecasting"])
 
+
+class AnomalyBatch(BaseModel):
+    date: Optional[str] = None
+    prices: Optional[Dict[str, Optional[float]]] = None
+    region: Optional[str] = None
+    commit: bool = True
+
+
+def _forecast_summary(forecast_results, format):
+    if format == "columnar":
+        return columnar_bahan_pokok(forecast_results)
+    summary = {}
+    for target, df_out in forecast_results.items():
+        tanggal = df_out['Tanggal'].dt.strftime('%Y-%m-%d').tolist()
+        # Round to integer like in Excel
+        predicted = df_out[f"Forecast_{target}"].round(0).tolist()
+        summary[target] = [
+            {"tanggal": t, "predicted_value": v} for t, v in zip(tanggal, predicted)
+        ]
+    return summary
+
+
 @router.get("/wjes/forecasting_bahan_pokok_with_excel")
-async def forecasting_bahan_pokok_with_excel(days: int = 1, x_api_key: str = Depends(get_api_key)):
+async def forecasting_bahan_pokok_with_excel(days: int = 1, region: str = None, format: str = "json",
+                                             x_api_key: str = Depends(rate_limit("forecast"))):
     """
     Forecast H+1 dan langsung update ke Excel file
     
     Args:
         days: jumlah hari forecast (default: 1 untuk H+1)
+        region: kode kabupaten/kota (model ./models/<region>/), kosong = model default
+        format: "json" (default) atau "columnar" (array tanggal bersama + satu array nilai per target)
     """
     try:
+        if format not in RESPONSE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format harus salah satu dari {list(RESPONSE_FORMATS)}")
+
         today = datetime.today()
         logger.info(f"Starting {days}-day forecast with Excel update from: {today.strftime('%Y-%m-%d')}")
 
         # Path file Excel
-        excel_path = "./temp_uploads/Harga_pangan_harian.xlsx"
-        output_path = "./temp_uploads/Harga_pangan_harian.xlsx"
+        excel_path = data_path("Harga_pangan_harian.xlsx", region)
+        output_path = data_path("Harga_pangan_harian.xlsx", region)
 
-        # Load model dan forecast
-        forecast_results = load_model_and_forecast(n_days=days, model_path="./models/lgbm_forecasting_hph_model.pkl")
+        # Load model (lazy, di-cache per region) dan forecast
+        model_data = get_model_store().get("bahan_pokok", region)
+        forecast_results = load_model_and_forecast(n_days=days, model_data=model_data)
 
         # Update Excel dengan hasil forecast
         update_status = update_excel_with_forecast(
@@ -43,21 +86,13 @@ async def forecasting_bahan_pokok_with_excel(days: int = 1, x_api_key: str = Dep
             "status": "success",
             "forecast_date": today.strftime('%Y-%m-%d'),
             "forecast_period": f"{days} days",
+            "region": region or "default",
             "excel_update": update_status,
             "forecast_summary": {}
         }
 
         # Add forecast summary
-        for target, df_out in forecast_results.items():
-            forecast_list = []
-            for _, row in df_out.iterrows():
-                forecast_dict = {
-                    "tanggal": row['Tanggal'].strftime('%Y-%m-%d'),
-                    "predicted_value": round(row[f"Forecast_{target}"], 0)  # Round to integer like in Excel
-                }
-                forecast_list.append(forecast_dict)
-            
-            response["forecast_summary"][target] = forecast_list
+        response["forecast_summary"] = _forecast_summary(forecast_results, format)
 
         response["summary"] = {
             "total_targets": len(forecast_results),
@@ -67,11 +102,326 @@ async def forecasting_bahan_pokok_with_excel(days: int = 1, x_api_key: str = Dep
             "new_rows_added": update_status["extended_rows"]
         }
 
-        return response
+        return FastJSONResponse(response)
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except FileNotFoundError as e:
         logger.error(f"File not found: {str(e)}")
         raise HTTPException(status_code=404, detail="Required file not found (model or Excel)")
     except Exception as e:
         logger.error(f"Error in forecasting_bahan_pokok_with_excel: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.get("/wjes/forecasting_bahan_pokok_only")
+async def forecasting_bahan_pokok_only(request: Request, days: int = 1, region: str = None, format: str = "json",
+                                       x_api_key: str = Depends(rate_limit("forecast"))):
+    """
+    Forecast bahan pokok tanpa update Excel (hanya return hasil), untuk polling dashboard.
+    Response punya ETag (model + data + parameter): If-None-Match yang cocok mendapat 304
+    tanpa forecast ulang, dan body di-cache terkompresi (gzip/br).
+
+    Args:
+        days: jumlah hari forecast (1-365)
+        region: kode kabupaten/kota, kosong = model default
+        format: "json" (default) atau "columnar"
+    """
+    try:
+        if format not in RESPONSE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format harus salah satu dari {list(RESPONSE_FORMATS)}")
+        if days < 1 or days > 365:
+            raise HTTPException(status_code=400, detail="days harus antara 1-365")
+
+        today = datetime.today()
+        excel_path = data_path("Harga_pangan_harian.xlsx", region)
+        etag_parts = ("forecasting_bahan_pokok_only", model_fingerprint("bahan_pokok", region),
+                      data_version(excel_path), region or "default", days, format, today.strftime('%Y-%m-%d'))
+
+        def build():
+            logger.info(f"Bahan pokok forecast only: {days} days, region {region or 'default'}")
+            model_data = get_model_store().get("bahan_pokok", region)
+            forecast_results = load_model_and_forecast(n_days=days, model_data=model_data)
+            return {
+                "status": "success",
+                "forecast_date": today.strftime('%Y-%m-%d'),
+                "forecast_period": f"{days} days",
+                "region": region or "default",
+                "forecast_summary": _forecast_summary(forecast_results, format),
+                "summary": {
+                    "total_targets": len(forecast_results),
+                    "total_days": days,
+                    "targets_forecasted": list(forecast_results.keys())
+                }
+            }
+
+        return await cached_json_response(request, etag_parts, build, paths=[excel_path])
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Model region tidak ditemukan")
+    except Exception as e:
+        logger.error(f"Error in forecasting_bahan_pokok_only: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.get("/wjes/forecast_regions")
+async def forecast_regions(x_api_key: str = Depends(rate_limit("default"))):
+    """
+    Daftar region yang punya model forecast dan status model yang sedang resident di memori
+    """
+    return {
+        "status": "success",
+        "regions": {
+            "bahan_pokok": list_regions("bahan_pokok"),
+            "ihk": list_regions("ihk")
+        },
+        "model_store": get_model_store().stats(),
+        "response_cache": get_response_cache().stats()
+    }
+
+
+
+@router.get("/wjes/forecasting_bahan_pokok_fleet")
+async def forecasting_bahan_pokok_fleet(days: int = 7, regions: str = None, targets: str = None,
+                                        format: str = "json", x_api_key: str = Depends(rate_limit("forecast"))):
+    """
+    Forecast semua region x semua komoditas dalam satu pass (tanpa update Excel)
+
+    Args:
+        days: jumlah hari forecast
+        regions: daftar region dipisah koma (default: semua region yang punya model)
+        targets: daftar komoditas dipisah koma (default: semua)
+        format: "json" (kolumnar) atau "arrow" (Arrow IPC stream, perlu pyarrow)
+    """
+    try:
+        if days < 1 or days > 365:
+            raise HTTPException(status_code=400, detail="days harus antara 1-365")
+        if format not in ("json", "arrow"):
+            raise HTTPException(status_code=400, detail="format harus 'json' atau 'arrow'")
+
+        region_list = regions.split(",") if regions else list_regions("bahan_pokok")
+        target_list = targets.split(",") if targets else None
+
+        store = get_model_store()
+        model_datas = {region: store.get("bahan_pokok", region) for region in region_list}
+        result = forecast_fleet(model_datas, n_days=days, targets=target_list)
+        values = result["values"].round(0)
+
+        if format == "arrow":
+            try:
+                import pyarrow as pa
+            except ImportError:
+                raise HTTPException(status_code=400, detail="Format arrow membutuhkan pyarrow")
+            table = pa.table({
+                "region": pa.array(result["region"]).dictionary_encode(),
+                "target": pa.array(result["target"]).dictionary_encode(),
+                "start_date": pa.array(result["start_date"]),
+                "values": pa.FixedSizeListArray.from_arrays(pa.array(values.ravel(), type=pa.float32()), days)
+            })
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return Response(content=sink.getvalue().to_pybytes(), media_type="application/vnd.apache.arrow.stream")
+
+        return FastJSONResponse({
+            "status": "success",
+            "forecast_period": f"{days} days",
+            "layout": "columnar",
+            "series": {
+                "region": result["region"],
+                "target": result["target"],
+                "start_date": result["start_date"]
+            },
+            "values": values,
+            "summary": {
+                "total_series": len(result["target"]),
+                "total_regions": len(model_datas),
+                "total_days": days
+            }
+        })
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Model region tidak ditemukan")
+    except Exception as e:
+        logger.error(f"Error in forecasting_bahan_pokok_fleet: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+
+@router.post("/wjes/refresh_bahan_pokok_model")
+async def refresh_bahan_pokok_model(region: str = None, refit: bool = False, until: str = None,
+                                    x_api_key: str = Depends(rate_limit("forecast"))):
+    """
+    Tambahkan harga aktual terbaru dari Harga_pangan_harian.xlsx ke histori model,
+    sehingga forecast berikutnya mulai dari data terbaru tanpa retrain penuh.
+
+    Args:
+        region: kode kabupaten/kota, kosong = model default
+        refit: lanjutkan boosting tiap target pada window terbaru (init_model)
+        until: tanggal aktual terakhir (YYYY-MM-DD), default hari ini
+    """
+    try:
+        # Refresh dari model asli di disk, bukan salinan ringkas (float32) milik ModelStore,
+        # supaya presisi histori yang disimpan tidak turun setiap kali refresh
+        path = resolve_model_path("bahan_pokok", region)
+        model_data = load_model(path)
+        refreshed, summary = refresh_model_with_actuals(
+            model_data,
+            excel_path=data_path("Harga_pangan_harian.xlsx", region),
+            until=until,
+            refit=refit
+        )
+
+        if summary["new_days"] > 0:
+            # ModelStore me-reload otomatis karena mtime file berubah
+            save_model(refreshed, path)
+
+        return {
+            "status": "success",
+            "region": region or "default",
+            "refresh": summary
+        }
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Required file not found (model or Excel)")
+    except Exception as e:
+        logger.error(f"Error in refresh_bahan_pokok_model: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.post("/wjes/bahan_pokok_anomalies")
+async def bahan_pokok_anomalies(request: AnomalyBatch, x_api_key: str = Depends(rate_limit("forecast"))):
+    """
+    Deteksi lonjakan harga harian semua komoditas sekaligus, terhadap statistik rolling
+    (window sama dengan fitur model) dan terhadap prediksi model untuk tanggal tersebut.
+
+    Args:
+        date: tanggal batch (YYYY-MM-DD), default hari ini
+        prices: harga per komoditas (nama target model atau nama kolom Excel);
+            kosong = baris tanggal tersebut di Harga_pangan_harian.xlsx
+        region: kode kabupaten/kota, kosong = model default
+        commit: masukkan batch ke statistik rolling setelah di-skor
+    """
+    try:
+        model_data = get_model_store().get("bahan_pokok", request.region)
+        # Baca workbook dan forecast model dijalankan di threadpool, bukan di event loop
+        result = await run_in_threadpool(
+            score_daily_batch,
+            model_data,
+            request.region,
+            request.date or datetime.today().strftime('%Y-%m-%d'),
+            prices=request.prices,
+            excel_path=data_path("Harga_pangan_harian.xlsx", request.region),
+            commit=request.commit
+        )
+        anomalies = [t for t, flagged in zip(result["targets"], result["anomaly"]) if flagged]
+        return FastJSONResponse({
+            "status": "success",
+            "region": request.region or "default",
+            "layout": "columnar",
+            "scores": result,
+            "anomalies": anomalies,
+            "summary": {
+                "total_targets": len(result["targets"]),
+                "total_anomalies": len(anomalies),
+                "thresholds": {"z": Z_THRESHOLD, "forecast_tolerance": FORECAST_TOLERANCE}
+            }
+        })
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Required file not found (model or Excel)")
+    except Exception as e:
+        logger.error(f"Error in bahan_pokok_anomalies: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.get("/wjes/backtest_report")
+async def backtest_report(kind: str = "bahan_pokok", region: str = None,
+                          x_api_key: str = Depends(rate_limit("default"))):
+    """
+    Hasil rolling-origin backtest terakhir (MAPE/RMSE per komoditas dan horizon).
+    Backtest dijalankan offline: python -m helper.backtest <bahan_pokok|ihk> --region <region>
+
+    Args:
+        kind: "bahan_pokok" atau "ihk"
+        region: kode kabupaten/kota, kosong = model default
+    """
+    try:
+        if kind not in ("bahan_pokok", "ihk"):
+            raise HTTPException(status_code=400, detail="kind harus 'bahan_pokok' atau 'ihk'")
+        from helper.backtest import read_report
+        return {
+            "status": "success",
+            "report": read_report(kind, region)
+        }
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Belum ada hasil backtest untuk region ini")
+    except Exception as e:
+        logger.error(f"Error in backtest_report: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.get("/wjes/download_forecast_bahan_pokok")
+async def download_forecast_bahan_pokok(days: int = 7, region: str = None,
+                                        x_api_key: str = Depends(rate_limit("forecast"))):
+    """
+    Forecast bahan pokok sebagai file Excel (layout sama dengan Harga_pangan_harian.xlsx),
+    di-stream langsung ke client tanpa menyimpan file di temp_uploads.
+
+    Args:
+        days: jumlah hari forecast
+        region: kode kabupaten/kota, kosong = model default
+    """
+    try:
+        if days < 1 or days > 365:
+            raise HTTPException(status_code=400, detail="days harus antara 1-365")
+
+        model_data = get_model_store().get("bahan_pokok", region)
+        forecast_results = load_model_and_forecast(n_days=days, model_data=model_data)
+
+        targets = list(forecast_results)
+        dates = forecast_results[targets[0]]["Tanggal"].to_numpy() if targets else []
+        columns = {"No": range(1, len(dates) + 1), "Tanggal": dates}
+        for target in targets:
+            columns[TARGET_MAPPING.get(target, target)] = forecast_results[target][f"Forecast_{target}"].to_numpy().round(0)
+
+        filename = f"forecast_bahan_pokok_{region or 'default'}_{datetime.today().strftime('%Y%m%d')}.xlsx"
+        return StreamingResponse(
+            stream_workbook(list(columns), zip(*columns.values())),
+            media_type=XLSX_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Model region tidak ditemukan")
+    except Exception as e:
+        logger.error(f"Error in download_forecast_bahan_pokok: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
@@ -1,36 +1,104 @@
+import json
+import time
+from functools import partial
 from fastapi import APIRouter, Depends, HTTPException
-from dependencies import get_api_key
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from dependencies import rate_limit
 from utils import json_parse
-from pathlib import Path
-import base64
 from loguru import logger
-from llm_engine import telkomllm_call_ocr, telkommultimodal_call
+from llm_engine import telkomllm_stream_ocr, LLMStreamError
+from llm_dispatcher import get_dispatcher, multimodal_call, llm_extract_json, estimate_request_tokens, PRIORITIES
+from lib.prompt import waspang_extraction_prompt, sign_check_prompt_multimodal
+from helper.image_preprocess import preprocess_image_async, estimate_upload_saving_ms
+from helper.ocr_chunking import extract_chunked
+from helper.document_ingest import convert_pdf_to_text_async
+from helper.document_index import get_document_index
 
 router = APIRouter(tags=["Clustering"])
 
 @router.get("/wjes/clustering_twitter")
-async def clustering_twitter(x_api_key: str = Depends(get_api_key)):
-    temp_dir = Path("temp_uploads")
+async def clustering_twitter(max_long_edge: int = 1600, max_image_kb: int = 400, priority: str = "interactive",
+                             x_api_key: str = Depends(rate_limit("llm"))):
+    """
+    Ekstraksi laporan Waspang + cek tanda tangan.
+
+    Args:
+        priority: "interactive" (default) atau "batch"; panggilan batch ke upstream LLM
+            selalu mengalah ke request interactive
+    """
+    if priority not in PRIORITIES:
+        raise HTTPException(400, f"priority harus salah satu dari {list(PRIORITIES)}")
+    index = get_document_index()
     base = "Laporan Pekerjaan Selesai 100"
-    txt = next(temp_dir.glob(f"{base}*.txt"), None)
-    img = next(temp_dir.glob(f"{base}*.jpg"), None)
-    if not txt: raise HTTPException(404, "Text not found")
+    txt = await run_in_threadpool(index.find_first, base, ".txt")
+    pdf = await run_in_threadpool(index.find_first, base, ".pdf")
+    img = await run_in_threadpool(index.find_first, base, ".jpg")
+    if not txt and not pdf: raise HTTPException(404, "Text not found")
     if not img: raise HTTPException(404, "Image not found")
 
-    with open(txt, "r", encoding="utf-8") as f:
-        text = f.read()
+    start = time.perf_counter()
 
-    info = await telkomllm_call_ocr(waspang_extraction_prompt, text)
-    parsed_info = json_parse(info)
+    if txt:
+        with open(txt, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        # Belum ada hasil ekstraksi, convert PDF secara lokal (hasil di-cache)
+        text = (await convert_pdf_to_text_async(pdf))["text"]
 
-    with open(img, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode()
+    # Dokumen panjang dipecah per halaman/section dan diekstrak paralel;
+    # objek JSON tiap chunk di-parse selama streaming
+    parsed_info = await extract_chunked(waspang_extraction_prompt, text,
+                                        call=partial(llm_extract_json, priority=priority))
 
-    # sign = await telkommultimodal_call(sign_check_prompt_multimodal, b64)
-    # parsed_sign = json_parse(sign)
+    # Tanda tangan cukup dicek dari gambar grayscale yang sudah diperkecil
+    processed = await preprocess_image_async(
+        img,
+        max_long_edge=max_long_edge,
+        grayscale=True,
+        max_bytes=max_image_kb * 1024
+    )
+    image_stats = processed["stats"]
+    image_stats["estimated_upload_saving_ms"] = estimate_upload_saving_ms(image_stats)
+    logger.info(f"Image preprocessing: {image_stats['original_bytes']} -> "
+                f"{image_stats['processed_bytes']} bytes in {image_stats['preprocess_ms']} ms")
+
+    sign = await multimodal_call(sign_check_prompt_multimodal, processed["base64"], priority=priority)
+    parsed_sign = json_parse(sign)
+
+    image_stats["end_to_end_ms"] = round((time.perf_counter() - start) * 1000, 2)
 
     return {
         "status": "success",
         "laporan_info": parsed_info,
-        "signature_verification": parsed_sign
-    }
\ No newline at end of file
+        "signature_verification": parsed_sign,
+        "image_preprocessing": image_stats
+    }
+
+
+@router.get("/wjes/clustering_twitter_stream")
+async def clustering_twitter_stream(x_api_key: str = Depends(rate_limit("llm"))):
+    """
+    Stream hasil ekstraksi laporan Waspang ke client sebagai Server-Sent Events.
+    Stream berhenti begitu objek JSON hasil ekstraksi sudah lengkap.
+    """
+    base = "Laporan Pekerjaan Selesai 100"
+    txt = await run_in_threadpool(get_document_index().find_first, base, ".txt")
+    if not txt: raise HTTPException(404, "Text not found")
+
+    with open(txt, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    async def event_stream():
+        try:
+            # Stream tetap lewat dispatcher agar ikut budget concurrency/token backend LLM
+            tokens = estimate_request_tokens(waspang_extraction_prompt, text)
+            async with get_dispatcher().slot("llm", tokens=tokens):
+                async for content in telkomllm_stream_ocr(waspang_extraction_prompt, text, stop_on_json=True):
+                    yield f"data: {json.dumps({'content': content})}\n\n"
+        except LLMStreamError as e:
+            logger.error(f"Error in clustering_twitter_stream: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
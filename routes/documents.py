@@ -0,0 +1,202 @@
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from dependencies import rate_limit
+from pathlib import Path
+from loguru import logger
+from helper.document_ingest import convert_pdf_to_text_async, find_pending_pdfs
+from helper.document_index import get_document_index
+from helper.retrieval import get_retrieval_index, format_passages
+from helper.ocr_chunking import estimate_tokens
+from helper.ifrs15 import compute_ifrs15, format_calculation
+from llm_dispatcher import llm_call_ocr
+from utils import json_parse
+from lib.prompt import contract_qa_prompt
+
+router = APIRouter(tags=["Documents"])
+
+
+class ChecklistRequest(BaseModel):
+    items: List[str]
+    projects: Optional[List[str]] = None
+    fuzzy: bool = False
+
+
+class ContractQuestion(BaseModel):
+    question: str
+    project: Optional[str] = None
+    document: Optional[str] = None
+    top_k: int = Field(6, ge=1, le=20)
+    contract: Optional[Dict[str, Any]] = None
+
+
+class IFRS15Request(BaseModel):
+    contracts: List[Dict[str, Any]]
+    frequency: str = "monthly"
+
+
+@router.post("/wjes/ingest_documents")
+async def ingest_documents(filename: str = None, x_api_key: str = Depends(rate_limit("llm"))):
+    """
+    Convert PDF di temp_uploads menjadi teks (.txt) secara lokal (text layer / OCR tesseract).
+
+    Args:
+        filename: nama file PDF tertentu, kosongkan untuk memproses semua PDF yang belum dikonversi
+    """
+    try:
+        temp_dir = Path("temp_uploads")
+        if filename:
+            pdf_path = (temp_dir / filename).resolve()
+            if temp_dir.resolve() not in pdf_path.parents:
+                raise HTTPException(status_code=400, detail="Invalid filename")
+            if not pdf_path.exists():
+                raise HTTPException(status_code=404, detail=f"File tidak ditemukan: {filename}")
+            pdfs = [pdf_path]
+        else:
+            pdfs = find_pending_pdfs(temp_dir)
+
+        results = []
+        for pdf in pdfs:
+            converted = await convert_pdf_to_text_async(pdf)
+            results.append({
+                "file": str(pdf),
+                "output_path": converted["output_path"],
+                "pages": converted["pages"],
+                "sources": converted["sources"]
+            })
+
+        return {
+            "status": "success",
+            "converted": results,
+            "summary": {"total_documents": len(results)}
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in ingest_documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.post("/wjes/document_checklist")
+async def document_checklist(request: ChecklistRequest, x_api_key: str = Depends(rate_limit("default"))):
+    """
+    Cek kelengkapan checklist dokumen untuk banyak project sekaligus dari document index.
+
+    Args:
+        items: item checklist (mis. "BA Test Commissioning", "Hasil ukur OTDR")
+        projects: nama subfolder project di temp_uploads (default: semua project)
+        fuzzy: terima nama file yang mirip jika nama persisnya tidak ditemukan
+    """
+    try:
+        # Query SQLite index dijalankan di threadpool, bukan di event loop
+        index = get_document_index()
+        projects = request.projects
+        if projects is None:
+            projects = await run_in_threadpool(index.list_projects)
+        results = await run_in_threadpool(index.check_checklist, request.items, projects=projects,
+                                          fuzzy=request.fuzzy)
+
+        complete = [p for p, items in results.items() if all(i["exists"] for i in items)]
+        return {
+            "status": "success",
+            "checklist": results,
+            "summary": {
+                "total_projects": len(results),
+                "complete_projects": len(complete),
+                "incomplete_projects": len(results) - len(complete)
+            }
+        }
+
+    except ValueError as e:
+        logger.error(f"Validation error in document_checklist: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in document_checklist: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.post("/wjes/contract_qa")
+async def contract_qa(request: ContractQuestion, x_api_key: str = Depends(rate_limit("llm"))):
+    """
+    Tanya jawab kontrak (IFRS 15) dengan retrieval: hanya passage paling relevan dari dokumen
+    kontrak/BA yang dikirim ke LLM, bukan dokumen utuh.
+
+    Args:
+        question: pertanyaan (mis. "Berapa nilai kontrak dan termin pembayarannya?")
+        project: batasi pencarian ke satu project (subfolder temp_uploads)
+        document: batasi ke satu dokumen .txt
+        top_k: jumlah passage yang dipakai sebagai konteks (1-20)
+        contract: field kontrak hasil ekstraksi (opsional); jika diisi, alokasi dan jadwal IFRS 15
+            dihitung lokal dan LLM hanya menjelaskan angkanya
+    """
+    try:
+        # Load/refresh index (baca file .txt) dan scoring BM25 dijalankan di threadpool, bukan di event loop
+        index = await run_in_threadpool(get_retrieval_index)
+        passages = await run_in_threadpool(index.search, request.question, k=request.top_k,
+                                           project=request.project, document=request.document)
+        if not passages:
+            raise HTTPException(status_code=404, detail="Tidak ada dokumen yang relevan dengan pertanyaan")
+
+        context = format_passages(passages)
+        # Pertanyaan di-escape karena prompt diformat ulang oleh llm_engine dengan ocr_result
+        question = request.question.replace("{", "{{").replace("}", "}}")
+        calculation = "(tidak ada)"
+        if request.contract is not None:
+            try:
+                calculation = format_calculation(compute_ifrs15([request.contract]))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Field kontrak tidak valid: {str(e)}")
+            calculation = calculation.replace("{", "{{").replace("}", "}}")
+        prompt = contract_qa_prompt.format(question=question, calculation=calculation, ocr_result="{ocr_result}")
+        answer = await llm_call_ocr(prompt, context)
+        if isinstance(answer, dict) and "error" in answer:
+            raise HTTPException(status_code=502, detail=answer["error"])
+
+        sources = sorted({p["path"] for p in passages})
+        full_document_tokens = await run_in_threadpool(index.document_tokens, sources)
+        return {
+            "status": "success",
+            "answer": json_parse(answer) if isinstance(answer, str) and answer.lstrip().startswith("{") else answer,
+            "sources": [{k: p[k] for k in ("path", "chunk", "score")} for p in passages],
+            "prompt_tokens": {
+                "context": estimate_tokens(context),
+                "full_documents": full_document_tokens
+            }
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in contract_qa: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+
+@router.post("/wjes/ifrs15_schedule")
+async def ifrs15_schedule(request: IFRS15Request, x_api_key: str = Depends(rate_limit("default"))):
+    """
+    Alokasi transaction price (relatif terhadap standalone selling price) dan jadwal pengakuan
+    pendapatan IFRS 15 untuk banyak kontrak sekaligus, dihitung lokal tanpa LLM.
+
+    Args:
+        contracts: field kontrak hasil ekstraksi (json_parse), mis. {"nomor_kontrak", "nilai_kontrak",
+            "tanggal_mulai", "tanggal_selesai", "performance_obligations": [{"name", "ssp", "recognition"}]}
+        frequency: "monthly" atau "quarterly"
+    """
+    try:
+        result = compute_ifrs15(request.contracts, frequency=request.frequency)
+        return {
+            "status": "success",
+            **result,
+            "summary": {
+                "total_contracts": len(result["contracts"]),
+                "total_periods": len(result["portfolio"]["periods"])
+            }
+        }
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in ifrs15_schedule: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
@@ -0,0 +1,73 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
+from dependencies import rate_limit
+from loguru import logger
+from helper.history import HISTORY_SOURCES, get_history
+from helper.model_store import data_path
+from helper.response_cache import cached_json_response, data_version
+
+router = APIRouter(tags=["History"])
+
+
+def _parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"{name} harus berformat YYYY-MM-DD")
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+
+@router.get("/wjes/history")
+async def history(request: Request, kind: str = "bahan_pokok", commodities: str = None, start: str = None,
+                  end: str = None, granularity: str = None, stats: str = "mean", region: str = None,
+                  x_api_key: str = Depends(rate_limit("default"))):
+    """
+    Histori harga bahan pokok / IHK untuk chart, tanpa mengunduh workbook.
+    Query range dijawab dari index tanggal terurut (binary search); weekly/monthly dari rollup
+    yang diperbarui inkremental saat workbook berubah. Response punya ETag (versi workbook + parameter).
+
+    Args:
+        kind: "bahan_pokok" (daily/weekly/monthly) atau "ihk" (monthly)
+        commodities: daftar komoditas dipisah koma (nama target model atau header Excel), kosong = semua
+        start, end: rentang tanggal YYYY-MM-DD (inklusif), kosong = seluruh histori
+        granularity: default granularity asli workbook (daily untuk bahan pokok, monthly untuk IHK)
+        stats: statistik rollup dipisah koma: mean, min, max, last, count
+        region: kode kabupaten/kota, kosong = workbook default
+    """
+    try:
+        if kind not in HISTORY_SOURCES:
+            raise HTTPException(status_code=400, detail=f"kind harus salah satu dari {list(HISTORY_SOURCES)}")
+        granularity = granularity or HISTORY_SOURCES[kind][2][0]
+        start_date, end_date = _parse_date(start, "start"), _parse_date(end, "end")
+        commodity_list, stat_list = _split(commodities), _split(stats) or ["mean"]
+
+        excel_path = data_path(HISTORY_SOURCES[kind][0], region)
+        etag_parts = ("history", kind, region or "default", data_version(excel_path), commodity_list,
+                      start_date, end_date, granularity, stat_list)
+
+        def build():
+            index = get_history(kind, region)
+            return {
+                "status": "success",
+                "kind": kind,
+                "region": region or "default",
+                **index.query(commodity_list, start_date, end_date, granularity, stat_list)
+            }
+
+        return await cached_json_response(request, etag_parts, build, paths=[excel_path])
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Workbook histori tidak ditemukan")
+    except Exception as e:
+        logger.error(f"Error in history: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
@@ -1,24 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 from helper.ihk import (
     get_next_month_forecast, 
     load_and_forecast_with_excel_update, 
     forecast_multiple_periods_with_excel_update,
-    load_model_and_forecast
+    load_model_and_forecast,
+    forecast_multiple_periods,
+    COLUMN_MAPPING
 )
-from dependencies import get_api_key
+from helper.excel_export import stream_workbook, XLSX_MEDIA_TYPE
+from dependencies import rate_limit
+from helper.model_store import get_model_store, data_path
+from helper.response_cache import cached_json_response, model_fingerprint, data_version
+from responses import FastJSONResponse, RESPONSE_FORMATS, columnar_ihk
 from loguru import logger
 import os
 
 router = APIRouter(tags=["IHK Forecasting"])
 
 
+def _forecast_values(forecast_df, format):
+    if format == "columnar":
+        return columnar_ihk(forecast_df)
+    return forecast_df.round(4).to_dict(orient="index")
+
+
+def _check_format(format):
+    if format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format harus salah satu dari {list(RESPONSE_FORMATS)}")
+
+
 @router.get("/wjes/forecasting_ihk_update_excel")
-async def forecasting_ihk_update_excel(x_api_key: str = Depends(get_api_key)):
+async def forecasting_ihk_update_excel(region: str = None, format: str = "json",
+                                       x_api_key: str = Depends(rate_limit("forecast"))):
     """
     Forecasting IHK untuk bulan depan dan update Excel secara otomatis
+
+    Args:
+        region: kode kabupaten/kota (model ./models/<region>/), kosong = model default
+        format: "json" (default) atau "columnar" (array periode bersama + satu array per target)
     """
     try:
+        _check_format(format)
+
         # Get current date info
         now = datetime.now()
         current_year = now.year
@@ -34,17 +59,17 @@ async def forecasting_ihk_update_excel(x_api_key: str = Depends(get_api_key)):
         logger.info(f"Memulai forecast IHK untuk bulan depan: {next_year}-{next_month:02d}")
 
         # Check file paths
-        excel_path = "./temp_uploads/IHK.xlsx"
-        output_path = "./temp_uploads/IHK_updated.xlsx"
+        excel_path = data_path("IHK.xlsx", region)
+        output_path = data_path("IHK_updated.xlsx", region)
         
         if not os.path.exists(excel_path):
             raise HTTPException(status_code=404, detail=f"File Excel tidak ditemukan: {excel_path}")
 
         # Use the helper function for next month forecast
         result = get_next_month_forecast(
-            model_path='./models/lgbm_forecasting_model.pkl',
             excel_path=excel_path,
-            output_path=output_path
+            output_path=output_path,
+            model_data=get_model_store().get("ihk", region)
         )
 
         forecast_df = result["forecast_result"]
@@ -56,36 +81,49 @@ async def forecasting_ihk_update_excel(x_api_key: str = Depends(get_api_key)):
 
         logger.info(f"IHK forecast dan Excel update berhasil: {output_path}")
 
-        return {
+        return FastJSONResponse({
             "status": "success",
             "forecast_type": "Next Month IHK Forecast with Excel Update",
             "forecast_date": now.strftime('%Y-%m-%d'),
+            "region": region or "default",
             "forecast_period": f"{next_year}-{next_month:02d}",
             "excel_update": excel_update,
-            "forecast_values": forecast_df.round(4).to_dict(orient="index"),
+            "forecast_values": _forecast_values(forecast_df, format),
             "summary": {
                 "total_targets": len([col for col in forecast_df.columns if col not in ['Tahun', 'Bulan']]),
                 "excel_updates": excel_update["updates_count"],
                 "new_excel_rows": excel_update["added_rows"],
                 "processed_periods": excel_update["processed_periods"]
             }
-        }
+        })
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Required file not found (model or Excel)")
     except Exception as e:
         logger.error(f"Error in forecasting_ihk_update_excel: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
 @router.post("/wjes/forecasting_ihk_custom")
-async def forecasting_ihk_custom(tahun: int, bulan: int, x_api_key: str = Depends(get_api_key)):
+async def forecasting_ihk_custom(tahun: int, bulan: int, region: str = None, format: str = "json",
+                                 x_api_key: str = Depends(rate_limit("forecast"))):
     """
     Forecasting IHK untuk periode tertentu dan update Excel
     
     Args:
         tahun: Tahun yang akan diprediksi (contoh: 2025)
         bulan: Bulan yang akan diprediksi (1-12)
+        region: kode kabupaten/kota, kosong = model default
+        format: "json" (default) atau "columnar"
     """
     try:
+        _check_format(format)
+
         if not (1 <= bulan <= 12):
             raise HTTPException(status_code=400, detail="Bulan harus antara 1-12")
         
@@ -95,8 +133,8 @@ async def forecasting_ihk_custom(tahun: int, bulan: int, x_api_key: str = Depend
         logger.info(f"Custom IHK forecast untuk: {tahun}-{bulan:02d}")
 
         # Check file paths
-        excel_path = "./temp_uploads/IHK.xlsx"
-        output_path = "./temp_uploads/IHK_updated.xlsx"
+        excel_path = data_path("IHK.xlsx", region)
+        output_path = data_path("IHK_updated.xlsx", region)
         
         if not os.path.exists(excel_path):
             raise HTTPException(status_code=404, detail=f"File Excel tidak ditemukan: {excel_path}")
@@ -107,7 +145,7 @@ async def forecasting_ihk_custom(tahun: int, bulan: int, x_api_key: str = Depend
             bulan=bulan,
             excel_path=excel_path,
             output_path=output_path,
-            model_path='./models/lgbm_forecasting_model.pkl'
+            model_data=get_model_store().get("ihk", region)
         )
 
         forecast_df = result["forecast_result"]
@@ -116,21 +154,29 @@ async def forecasting_ihk_custom(tahun: int, bulan: int, x_api_key: str = Depend
         if excel_update["status"] == "error":
             raise HTTPException(status_code=500, detail=excel_update["message"])
 
-        return {
+        return FastJSONResponse({
             "status": "success",
             "forecast_type": "Custom Period IHK Forecast",
             "forecast_date": datetime.now().strftime('%Y-%m-%d'),
+            "region": region or "default",
             "forecast_period": f"{tahun}-{bulan:02d}",
             "excel_update": excel_update,
-            "forecast_values": forecast_df.round(4).to_dict(orient="index"),
+            "forecast_values": _forecast_values(forecast_df, format),
             "summary": {
                 "total_targets": len([col for col in forecast_df.columns if col not in ['Tahun', 'Bulan']]),
                 "excel_updates": excel_update["updates_count"],
                 "new_excel_rows": excel_update["added_rows"],
                 "processed_periods": excel_update["processed_periods"]
             }
-        }
+        })
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Required file not found (model or Excel)")
     except Exception as e:
         logger.error(f"Error in forecasting_ihk_custom: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
@@ -138,7 +184,8 @@ async def forecasting_ihk_custom(tahun: int, bulan: int, x_api_key: str = Depend
 
 @router.post("/wjes/forecasting_ihk_multiple")
 async def forecasting_ihk_multiple(start_tahun: int, start_bulan: int, n_periods: int = 6,
-                                  x_api_key: str = Depends(get_api_key)):
+                                  region: str = None, format: str = "json",
+                                  x_api_key: str = Depends(rate_limit("forecast"))):
     """
     Forecasting IHK untuk beberapa periode sekaligus dan update Excel
     
@@ -146,8 +193,12 @@ async def forecasting_ihk_multiple(start_tahun: int, start_bulan: int, n_periods
         start_tahun: Tahun mulai forecast
         start_bulan: Bulan mulai forecast (1-12)
         n_periods: Jumlah periode yang akan diprediksi (default: 6)
+        region: kode kabupaten/kota, kosong = model default
+        format: "json" (default) atau "columnar"
     """
     try:
+        _check_format(format)
+
         if not (1 <= start_bulan <= 12):
             raise HTTPException(status_code=400, detail="Bulan harus antara 1-12")
         
@@ -160,8 +211,8 @@ async def forecasting_ihk_multiple(start_tahun: int, start_bulan: int, n_periods
         logger.info(f"Multiple IHK forecast: {n_periods} periods from {start_tahun}-{start_bulan:02d}")
 
         # Check file paths
-        excel_path = "./temp_uploads/IHK.xlsx"
-        output_path = "./temp_uploads/IHK_updated.xlsx"
+        excel_path = data_path("IHK.xlsx", region)
+        output_path = data_path("IHK_updated.xlsx", region)
         
         if not os.path.exists(excel_path):
             raise HTTPException(status_code=404, detail=f"File Excel tidak ditemukan: {excel_path}")
@@ -173,7 +224,7 @@ async def forecasting_ihk_multiple(start_tahun: int, start_bulan: int, n_periods
             n_periods=n_periods,
             excel_path=excel_path,
             output_path=output_path,
-            model_path='./models/lgbm_forecasting_model.pkl'
+            model_data=get_model_store().get("ihk", region)
         )
 
         forecast_df = result["forecast_result"]
@@ -182,14 +233,15 @@ async def forecasting_ihk_multiple(start_tahun: int, start_bulan: int, n_periods
         if excel_update["status"] == "error":
             raise HTTPException(status_code=500, detail=excel_update["message"])
 
-        return {
+        return FastJSONResponse({
             "status": "success",
             "forecast_type": "Multiple Periods IHK Forecast",
             "forecast_date": datetime.now().strftime('%Y-%m-%d'),
+            "region": region or "default",
             "forecast_periods": n_periods,
             "start_period": f"{start_tahun}-{start_bulan:02d}",
             "excel_update": excel_update,
-            "forecast_values": forecast_df.round(4).to_dict(orient="index"),
+            "forecast_values": _forecast_values(forecast_df, format),
             "summary": {
                 "total_targets": len([col for col in forecast_df.columns if col not in ['Tahun', 'Bulan']]),
                 "total_periods": n_periods,
@@ -197,19 +249,35 @@ async def forecasting_ihk_multiple(start_tahun: int, start_bulan: int, n_periods
                 "new_excel_rows": excel_update["added_rows"],
                 "processed_periods": excel_update["processed_periods"]
             }
-        }
+        })
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Required file not found (model or Excel)")
     except Exception as e:
         logger.error(f"Error in forecasting_ihk_multiple: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
 @router.get("/wjes/forecasting_ihk_only")
-async def forecasting_ihk_only(x_api_key: str = Depends(get_api_key)):
+async def forecasting_ihk_only(request: Request, region: str = None, format: str = "json",
+                               x_api_key: str = Depends(rate_limit("forecast"))):
     """
-    Forecasting IHK untuk bulan depan tanpa update Excel (hanya return hasil)
+    Forecasting IHK untuk bulan depan tanpa update Excel (hanya return hasil).
+    Response punya ETag (model + data + parameter): polling dengan If-None-Match mendapat 304
+    tanpa forecast ulang, dan body di-cache terkompresi (gzip/br).
+
+    Args:
+        region: kode kabupaten/kota, kosong = model default
+        format: "json" (default) atau "columnar"
     """
     try:
+        _check_format(format)
+
         # Get next month
         now = datetime.now()
         current_year = now.year
@@ -221,27 +289,87 @@ async def forecasting_ihk_only(x_api_key: str = Depends(get_api_key)):
             next_month = 1
             next_year += 1
 
-        logger.info(f"IHK forecast only untuk: {next_year}-{next_month:02d}")
+        excel_path = data_path("IHK.xlsx", region)
+        etag_parts = ("forecasting_ihk_only", model_fingerprint("ihk", region), data_version(excel_path),
+                      region or "default", format, now.strftime('%Y-%m-%d'))
+
+        def build():
+            logger.info(f"IHK forecast only untuk: {next_year}-{next_month:02d}")
+
+            # Generate forecast only (no Excel update)
+            forecast_df = load_model_and_forecast(
+                tahun=next_year,
+                bulan=next_month,
+                model_data=get_model_store().get("ihk", region)
+            )
+
+            return {
+                "status": "success",
+                "forecast_type": "Next Month IHK Forecast Only",
+                "forecast_date": now.strftime('%Y-%m-%d'),
+                "region": region or "default",
+                "forecast_period": f"{next_year}-{next_month:02d}",
+                "forecast_values": _forecast_values(forecast_df, format),
+                "summary": {
+                    "total_targets": len([col for col in forecast_df.columns if col not in ['Tahun', 'Bulan']]),
+                    "forecast_period": f"{next_year}-{next_month:02d}"
+                }
+            }
 
-        # Generate forecast only (no Excel update)
-        forecast_df = load_model_and_forecast(
-            tahun=next_year,
-            bulan=next_month,
-            model_path='./models/lgbm_forecasting_model.pkl'
-        )
+        return await cached_json_response(request, etag_parts, build, paths=[excel_path])
 
-        return {
-            "status": "success",
-            "forecast_type": "Next Month IHK Forecast Only",
-            "forecast_date": now.strftime('%Y-%m-%d'),
-            "forecast_period": f"{next_year}-{next_month:02d}",
-            "forecast_values": forecast_df.round(4).to_dict(orient="index"),
-            "summary": {
-                "total_targets": len([col for col in forecast_df.columns if col not in ['Tahun', 'Bulan']]),
-                "forecast_period": f"{next_year}-{next_month:02d}"
-            }
-        }
-        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Model region tidak ditemukan")
     except Exception as e:
         logger.error(f"Error in forecasting_ihk_only: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+@router.get("/wjes/download_forecast_ihk")
+async def download_forecast_ihk(start_tahun: int, start_bulan: int, n_periods: int = 6, region: str = None,
+                                x_api_key: str = Depends(rate_limit("forecast"))):
+    """
+    Forecast IHK beberapa periode sebagai file Excel (header sama dengan IHK.xlsx),
+    di-stream langsung ke client tanpa menyimpan file di temp_uploads.
+
+    Args:
+        start_tahun: Tahun mulai forecast
+        start_bulan: Bulan mulai forecast (1-12)
+        n_periods: Jumlah periode (1-24)
+        region: kode kabupaten/kota, kosong = model default
+    """
+    try:
+        if not (1 <= start_bulan <= 12):
+            raise HTTPException(status_code=400, detail="Bulan harus antara 1-12")
+        if n_periods < 1 or n_periods > 24:
+            raise HTTPException(status_code=400, detail="n_periods harus antara 1-24")
+
+        forecast_df = forecast_multiple_periods(
+            start_tahun, start_bulan, n_periods,
+            model_data=get_model_store().get("ihk", region)
+        )
+        target_cols = [col for col in forecast_df.columns if col not in ['Tahun', 'Bulan']]
+        headers = ['Tahun', 'Bulan'] + [COLUMN_MAPPING.get(col, col) for col in target_cols]
+        rows = forecast_df[['Tahun', 'Bulan'] + target_cols].round(2).itertuples(index=False, name=None)
+
+        filename = f"forecast_ihk_{region or 'default'}_{start_tahun}{start_bulan:02d}_{n_periods}.xlsx"
+        return StreamingResponse(
+            stream_workbook(headers, rows),
+            media_type=XLSX_MEDIA_TYPE,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(status_code=404, detail="Model region tidak ditemukan")
+    except Exception as e:
+        logger.error(f"Error in download_forecast_ihk: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
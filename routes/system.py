@@ -0,0 +1,85 @@
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse
+from dependencies import rate_limit
+from helper.profiling import is_admin, list_profiles, profile_file
+from helper.startup import readiness, startup_report
+from llm_dispatcher import get_dispatcher
+
+router = APIRouter(tags=["System"])
+
+
+@router.get("/health")
+async def health():
+    """Liveness: proses hidup dan event loop merespons (tidak menunggu model)."""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness: 200 hanya setelah model selesai di-warm saat startup."""
+    state = readiness()
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "not_ready", "warmup": state})
+    return {"status": "ready", "warmup": state}
+
+
+@router.get("/wjes/startup_report")
+async def get_startup_report(request: Request, x_api_key: str = Depends(rate_limit("default"))):
+    """Laporan waktu import router/modul berat dan status warmup model."""
+    return {
+        "status": "success",
+        "report": startup_report(getattr(request.app.state, "lazy_routers", None))
+    }
+
+
+@router.get("/wjes/llm_dispatch_stats")
+async def llm_dispatch_stats(x_api_key: str = Depends(rate_limit("default"))):
+    """Antrian, slot aktif, budget token dan jumlah request yang digabung (singleflight) per backend LLM."""
+    return {
+        "status": "success",
+        "dispatcher": get_dispatcher().stats()
+    }
+
+
+def _require_admin(x_admin_key):
+    if not is_admin(x_admin_key):
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+
+@router.get("/wjes/admin/profiles")
+async def get_profiles(
+    x_admin_key: Optional[str] = Header(None),
+    x_api_key: str = Depends(rate_limit("default"))
+):
+    """Daftar profile request yang tersimpan di ring (terbaru dulu)."""
+    _require_admin(x_admin_key)
+    return {
+        "status": "success",
+        "profiles": list_profiles()
+    }
+
+
+@router.get("/wjes/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|folded)$"),
+    x_admin_key: Optional[str] = Header(None),
+    x_api_key: str = Depends(rate_limit("default"))
+):
+    """
+    Detail satu profile: json (metadata + top alokasi tracemalloc) atau folded
+    (collapsed stacks, langsung untuk flamegraph.pl/speedscope).
+    """
+    _require_admin(x_admin_key)
+    try:
+        if format == "folded":
+            return FileResponse(profile_file(profile_id, ".folded"), media_type="text/plain",
+                                filename=f"{profile_id}.folded")
+        with open(profile_file(profile_id, ".json")) as f:
+            return {"status": "success", "profile": json.load(f)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} tidak ditemukan")
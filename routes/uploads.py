@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from dependencies import rate_limit
+from loguru import logger
+from helper.upload_store import receive_multipart_upload, commit_uploads, UploadTooLarge
+
+router = APIRouter(tags=["Uploads"])
+
+
+@router.post("/wjes/upload")
+async def upload_files(request: Request, x_api_key: str = Depends(rate_limit("default"))):
+    """
+    Upload file (workbook IHK/harga pangan, laporan Waspang, gambar, PDF) ke temp_uploads.
+
+    Form fields:
+        file: satu atau lebih file (multipart/form-data)
+        project: subfolder project tujuan (opsional)
+    """
+    try:
+        parts, fields = await receive_multipart_upload(request)
+        if not parts:
+            raise HTTPException(status_code=400, detail="Tidak ada file pada request")
+
+        project = fields.get("project", "")
+        # os.replace, update manifest SQLite dan notifikasi cache dijalankan di threadpool
+        uploaded = await run_in_threadpool(commit_uploads, parts, project=project)
+
+        return {
+            "status": "success",
+            "files": uploaded,
+            "summary": {
+                "total_files": len(uploaded),
+                "stored": len([f for f in uploaded if f["status"] != "duplicate"]),
+                "duplicates": len([f for f in uploaded if f["status"] == "duplicate"])
+            }
+        }
+
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in upload_files: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Test dijalankan dari root repo (python -m pytest), modul aplikasi di-import dari sana
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TARGETS = ["Beras_Premium", "Bawang_Merah", "Cabai_Rawit_Merah"]
+LAG_PERIODS = [1, 7]
+ROLLING_WINDOWS = [3, 10]
+CALENDAR = ["year", "month", "day", "dayofweek", "quarter", "weekofyear"]
+
+
+def _feature_cols():
+    cols = list(CALENDAR)
+    for target in TARGETS:
+        cols += [f"{target}_lag_{lag}" for lag in LAG_PERIODS]
+        for window in ROLLING_WINDOWS:
+            cols += [f"{target}_rolling_{stat}_{window}" for stat in ("mean", "std", "min", "max")]
+    return cols
+
+
+@pytest.fixture(scope="session")
+def synthetic_model():
+    """Model bahan pokok kecil (3 target, booster LightGBM asli) dengan layout sama seperti model produksi."""
+    lgb = pytest.importorskip("lightgbm")
+    rng = np.random.default_rng(0)
+    feature_cols = _feature_cols()
+
+    dates = pd.date_range("2024-01-01", periods=40, freq="D")
+    last_data = pd.DataFrame({"Tanggal": dates})
+    for i, target in enumerate(TARGETS):
+        last_data[target] = 10000 * (i + 1) + rng.normal(0, 300, len(dates)).cumsum()
+    for col in feature_cols:
+        if col not in CALENDAR:
+            base = col.split("_lag_")[0].split("_rolling_")[0]
+            last_data[col] = last_data[base] * rng.uniform(0.9, 1.1, len(dates))
+
+    forecast_results = {}
+    for i, target in enumerate(TARGETS):
+        X = rng.normal(0, 1, (400, len(feature_cols))) * 1000 + 10000 * (i + 1)
+        y = np.log(np.abs(X[:, feature_cols.index(f"{target}_lag_1")]) + rng.normal(0, 50, 400) ** 2)
+        booster = lgb.train({"objective": "regression", "num_leaves": 7, "verbose": -1, "seed": i},
+                            lgb.Dataset(X, y), num_boost_round=25)
+        forecast_results[target] = {"model": booster}
+
+    return {
+        "target_columns": list(TARGETS),
+        "feature_cols": feature_cols,
+        "lag_periods": list(LAG_PERIODS),
+        "rolling_windows": list(ROLLING_WINDOWS),
+        "last_data": last_data,
+        "forecast_results": forecast_results,
+    }
@@ -0,0 +1,64 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from helper import anomaly
+from helper.anomaly import AnomalyDetector, RollingWindow
+
+
+def per_series_window(values, window):
+    """Mean/std populasi atas `window` nilai non-NaN terakhir per series, dengan deque (referensi)."""
+    buffers = [deque(maxlen=window) for _ in range(values.shape[1])]
+    means, stds = [], []
+    for row in values:
+        for buf, x in zip(buffers, row):
+            if not np.isnan(x):
+                buf.append(x)
+        means.append([np.mean(buf) if buf else 0.0 for buf in buffers])
+        stds.append([np.std(buf) if buf else 0.0 for buf in buffers])
+    return np.array(means), np.array(stds)
+
+
+def test_rolling_window_matches_per_series_deque(monkeypatch):
+    # Resync lebih sering agar jalur hitung ulang dari buffer ikut teruji
+    monkeypatch.setattr(anomaly, "RESYNC_EVERY", 37)
+    rng = np.random.default_rng(1)
+    values = 20000 + rng.normal(0, 500, size=(400, 6)).cumsum(axis=0)
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[:, 5] = np.nan  # series tanpa data sama sekali
+
+    for window in (3, 10, 30):
+        stat = RollingWindow(values.shape[1], window)
+        means, stds = [], []
+        for row in values:
+            stat.update(row)
+            means.append(stat.mean.copy())
+            stds.append(stat.std.copy())
+        ref_mean, ref_std = per_series_window(values, window)
+        np.testing.assert_allclose(means, ref_mean, rtol=1e-9, atol=1e-6)
+        np.testing.assert_allclose(stds, ref_std, rtol=1e-6, atol=1e-4)
+
+
+def test_zero_prices_are_not_ingested(synthetic_model):
+    detector = AnomalyDetector(synthetic_model)
+    before = {w: (s.mean.copy(), s.count.copy()) for w, s in detector.stats.items()}
+    previous = detector.previous.copy()
+
+    values = np.array([[0.0, np.nan, 0.0]])
+    detector.push([detector.last_date + pd.Timedelta(days=1)], values)
+
+    for window, stat in detector.stats.items():
+        np.testing.assert_array_equal(stat.mean, before[window][0])
+        np.testing.assert_array_equal(stat.count, before[window][1])
+    np.testing.assert_array_equal(detector.previous, previous)
+
+
+def test_forecast_rows_are_recognised(synthetic_model):
+    detector = AnomalyDetector(synthetic_model)
+    dates = pd.date_range(detector.model_last_date + pd.Timedelta(days=1), periods=6, freq="D")
+    rows = np.round(detector.forecast_path(6), 0)
+    rows[3] += 1  # harga aktual yang kebetulan dekat forecast
+    rows[4, 0] = np.nan  # forecast dengan satu komoditas kosong
+
+    assert detector.forecast_rows(dates, rows).tolist() == [True, True, True, False, True, True]
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from helper import backtest
+from helper.compact import MONTH_NAMES
+from helper.training import build_feature_matrix
+
+TARGETS = ["Beras_Premium", "Bawang_Merah"]
+
+
+def test_origin_fill_uses_only_history_up_to_origin(monkeypatch):
+    rng = np.random.default_rng(2)
+    dates = pd.date_range("2024-01-01", periods=150, freq="D")
+    history = pd.DataFrame({t: 10000 + rng.normal(0, 50, len(dates)).cumsum() for t in TARGETS})
+    history.insert(0, "Tanggal", dates)
+    X, feature_cols = build_feature_matrix(history, TARGETS, [1, 7], [3, 10])
+
+    # last_data model yang dilatih sampai baris `cutoff`, dengan konvensi train_models()
+    cutoff, hist_len = 99, 40
+    rows = slice(cutoff - hist_len + 1, cutoff + 1)
+    last_data = pd.DataFrame(X[rows], columns=feature_cols)
+    last_data.insert(0, "Tanggal", dates[rows])
+    for t in TARGETS:
+        last_data[t] = history[t].to_numpy()[rows]
+    model_data = {
+        "target_columns": TARGETS, "feature_cols": feature_cols, "lag_periods": [1, 7], "rolling_windows": [3, 10],
+        "last_data": last_data, "forecast_results": {t: {"model": None} for t in TARGETS},
+    }
+    monkeypatch.setattr(backtest, "load_model", lambda path: model_data)
+
+    values = np.ascontiguousarray(history[TARGETS].to_numpy().T)
+    backtest._init_worker("model", values, dates.to_numpy(), TARGETS)
+
+    # Di origin = akhir data training, fill sama dengan fill serving dari last_data
+    template_fill = backtest._worker["template"][0]["fill"]
+    np.testing.assert_allclose(backtest._origin_fill(cutoff, hist_len), template_fill, rtol=1e-12)
+
+    # Origin sebelumnya tidak terpengaruh data sesudahnya
+    earlier = backtest._origin_fill(60, hist_len)
+    changed = values.copy()
+    changed[:, 61:] *= 2
+    backtest._init_worker("model", changed, dates.to_numpy(), TARGETS)
+    np.testing.assert_array_equal(backtest._origin_fill(60, hist_len), earlier)
+
+
+class _LastValueModel:
+    """Model IHK tiruan: prediksi = lag 1 (cukup untuk menguji pemilihan origin)."""
+
+    def __init__(self, target_cols):
+        self.target_cols = target_cols
+
+    def predict(self, features):
+        return features[[f"{col}_lag1" for col in self.target_cols]].to_numpy()
+
+
+def test_ihk_backtest_starts_after_training_end(tmp_path):
+    rng = np.random.default_rng(4)
+    target_cols = ["Umum", "Pakaian_dan_Alas_Kaki"]
+    periods = pd.period_range("2020-01", periods=48, freq="M")
+    history = pd.DataFrame({
+        "Tahun": periods.year,
+        "Bulan": [MONTH_NAMES[m - 1] for m in periods.month],
+        "Umum": 100 + rng.normal(0, 0.5, len(periods)).cumsum(),
+        "Pakaian dan Alas Kaki": 100 + rng.normal(0, 0.5, len(periods)).cumsum(),
+    })
+    path = tmp_path / "IHK.xlsx"
+    history.to_excel(path, index=False)
+
+    # Model dilatih sampai 2022-06 (baris 29), last_data disimpan float32 seperti ModelStore
+    values = history[["Umum", "Pakaian dan Alas Kaki"]].to_numpy()
+    model_data = {
+        "model": _LastValueModel(target_cols),
+        "target_cols": target_cols,
+        "last_data": pd.Series(values[29].astype(np.float32), index=target_cols, name=29),
+        "second_last_data": pd.Series(values[28].astype(np.float32), index=target_cols, name=28),
+    }
+
+    report = backtest.backtest_ihk(model_data, str(path), horizon=3)
+    assert report["training_end"] == "2022-06"
+    assert report["origins"]["first"] == "2022-06"
+    assert report["in_sample"] is False
+
+    report = backtest.backtest_ihk(model_data, str(path), horizon=3, in_sample=True)
+    assert report["origins"]["first"] == "2020-02"
+    assert report["in_sample"] is True
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from helper.bahan_pokok import (TARGET_MAPPING, forecast_fleet, load_model_and_forecast, model_forecast_path,
+                                 refresh_model_with_actuals)
+
+
+def per_row_forecast(model_data, n_days):
+    """Loop per-row per-hari dari implementasi awal load_model_and_forecast (referensi)."""
+    results = {}
+    feature_cols = model_data["feature_cols"]
+    last_values = model_data["last_data"].copy()
+    forecast_dates = pd.date_range(start=last_values["Tanggal"].iloc[-1] + pd.Timedelta(days=1),
+                                   periods=n_days, freq="D")
+    for target_col in model_data["target_columns"]:
+        model = model_data["forecast_results"][target_col]["model"]
+        forecasted = []
+        for day in range(n_days):
+            date = forecast_dates[day]
+            row = {"year": date.year, "month": date.month, "day": date.day, "dayofweek": date.dayofweek,
+                   "quarter": date.quarter, "weekofyear": date.isocalendar().week}
+            for lag in model_data["lag_periods"]:
+                if day < lag:
+                    lag_idx = len(last_values) - lag + day
+                    row[f"{target_col}_lag_{lag}"] = last_values.iloc[max(lag_idx, 0)][target_col]
+                else:
+                    row[f"{target_col}_lag_{lag}"] = forecasted[day - lag]
+            for window in model_data["rolling_windows"]:
+                if day == 0:
+                    window_data = last_values[target_col].tail(window).values
+                elif day >= window:
+                    window_data = forecasted[day - window:day]
+                else:
+                    window_data = last_values[target_col].tail(window - day).tolist() + forecasted[:day]
+                row[f"{target_col}_rolling_mean_{window}"] = np.mean(window_data)
+                row[f"{target_col}_rolling_std_{window}"] = np.std(window_data)
+                row[f"{target_col}_rolling_min_{window}"] = np.min(window_data)
+                row[f"{target_col}_rolling_max_{window}"] = np.max(window_data)
+            for col in feature_cols:
+                if col not in row:
+                    row[col] = last_values[col].mean() if col in last_values.columns else 0
+            X = pd.DataFrame([row])[feature_cols]
+            forecasted.append(np.exp(model.predict(X, num_iteration=model.best_iteration)[0]))
+        results[target_col] = np.array(forecasted)
+    return forecast_dates, results
+
+
+def test_vectorized_forecast_matches_per_row_loop(synthetic_model):
+    n_days = 15  # melewati lag dan window terpanjang
+    dates, expected = per_row_forecast(synthetic_model, n_days)
+    results = load_model_and_forecast(n_days=n_days, model_data=synthetic_model)
+
+    assert list(results) == synthetic_model["target_columns"]
+    for target, values in expected.items():
+        df = results[target]
+        pd.testing.assert_index_equal(pd.DatetimeIndex(df["Tanggal"]), dates, check_names=False)
+        np.testing.assert_array_equal(df[f"Forecast_{target}"].to_numpy(), values)
+
+
+def test_fleet_forecast_matches_per_region(synthetic_model):
+    shifted = dict(synthetic_model)
+    shifted["last_data"] = synthetic_model["last_data"].assign(
+        Tanggal=synthetic_model["last_data"]["Tanggal"] + pd.Timedelta(days=3))
+    fleet = forecast_fleet({"a": synthetic_model, "b": shifted}, n_days=10, targets=["Bawang_Merah"])
+
+    assert fleet["region"] == ["a", "b"]
+    assert fleet["start_date"] == ["2024-02-10", "2024-02-13"]
+    for row, model_data in enumerate((synthetic_model, shifted)):
+        _, expected = per_row_forecast(model_data, 10)
+        np.testing.assert_array_equal(fleet["values"][row], expected["Bawang_Merah"])
+
+
+def test_refresh_skips_forecast_rows_in_workbook(synthetic_model, tmp_path):
+    targets = synthetic_model["target_columns"]
+    last_date = synthetic_model["last_data"]["Tanggal"].iloc[-1]
+    dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=6, freq="D")
+    # Hari 1-3 harga aktual, hari 4-6 forecast model yang pernah ditulis route with_excel
+    values = np.round(model_forecast_path(synthetic_model, targets, 6), 0)
+    values[:3] += 250
+    path = tmp_path / "Harga_pangan_harian.xlsx"
+    workbook = pd.DataFrame({TARGET_MAPPING.get(t, t): values[:, i] for i, t in enumerate(targets)})
+    workbook.insert(0, "Tanggal", dates.strftime("%d/%m/%y"))
+    workbook.to_excel(path, index=False)
+
+    refreshed, summary = refresh_model_with_actuals(synthetic_model, excel_path=str(path), until=dates[-1])
+
+    assert summary["new_days"] == 3
+    assert refreshed["last_data"]["Tanggal"].iloc[-1] == dates[2]
+    np.testing.assert_array_equal(refreshed["last_data"][targets].to_numpy()[-3:], values[:3])
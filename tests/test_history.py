@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper.history import ROLLUP_STATS, HistoryIndex, rollup
+
+
+def _daily(n_days=200, n_columns=3, seed=3):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2023-12-27", periods=n_days, freq="D")
+    values = 10000 + rng.normal(0, 100, size=(n_days, n_columns)).cumsum(axis=0)
+    values[rng.random(values.shape) < 0.15] = np.nan
+    values[40:55, 1] = np.nan  # minggu/bulan tanpa data untuk satu kolom
+    return days, values
+
+
+def pandas_rollup(days, values, granularity):
+    """Agregat per periode dengan groupby pandas (referensi): minggu mulai Senin, bulan mulai tanggal 1."""
+    freq = "W-SUN" if granularity == "weekly" else "M"
+    periods = days.to_period(freq).start_time
+    grouped = pd.DataFrame(values).groupby(periods)
+    return grouped.mean(), grouped.min(), grouped.max(), grouped.last(), grouped.count()
+
+
+@pytest.mark.parametrize("granularity", ["weekly", "monthly"])
+def test_rollup_matches_pandas_groupby(granularity):
+    days, values = _daily()
+    keys, stats = rollup(days.to_numpy().astype("datetime64[D]"), values, granularity)
+    mean, minimum, maximum, last, count = pandas_rollup(days, values, granularity)
+
+    np.testing.assert_array_equal(keys, mean.index.to_numpy().astype("datetime64[D]"))
+    np.testing.assert_allclose(stats["mean"], mean.to_numpy(), rtol=1e-12)
+    np.testing.assert_array_equal(stats["min"], minimum.to_numpy())
+    np.testing.assert_array_equal(stats["max"], maximum.to_numpy())
+    np.testing.assert_array_equal(stats["last"], last.to_numpy())
+    np.testing.assert_array_equal(stats["count"], count.to_numpy())
+
+
+def test_incremental_refresh_matches_full_recompute(monkeypatch):
+    days, values = _daily()
+    days = days.to_numpy().astype("datetime64[D]")
+    index = HistoryIndex("bahan_pokok", "unused.xlsx")
+
+    monkeypatch.setattr(index, "_read", lambda: (days[:150], values[:150], ["a", "b", "c"]))
+    index.refresh(1)
+    # Baris baru ditambahkan dan baris terakhir lama ditimpa (mis. forecast diganti aktual)
+    changed = values.copy()
+    changed[149] += 7
+    monkeypatch.setattr(index, "_read", lambda: (days, changed, ["a", "b", "c"]))
+    assert index.refresh(2) == len(days) - 149
+
+    for granularity in ("weekly", "monthly"):
+        keys, stats = rollup(days, changed, granularity)
+        np.testing.assert_array_equal(index.rollups[granularity][0], keys)
+        for stat in ROLLUP_STATS:
+            np.testing.assert_allclose(index.rollups[granularity][1][stat], stats[stat], rtol=1e-12)
+
+
+def test_zero_prices_are_missing(tmp_path):
+    path = tmp_path / "Harga_pangan_harian.xlsx"
+    pd.DataFrame({
+        "No": [1, 2, 3, 4],
+        "Tanggal": ["01/01/24", "02/01/24", "03/01/24", "04/01/24"],
+        "Beras Premium": [15000, 0, 15200, 0],
+    }).to_excel(path, index=False)
+    index = HistoryIndex("bahan_pokok", str(path))
+    index.refresh(1)
+
+    monthly = index.query(granularity="monthly", stats=("mean", "min", "count"))["values"]
+    column = index.columns[0]
+    assert monthly["mean"][column].tolist() == [15100.0]
+    assert monthly["min"][column].tolist() == [15000.0]
+    assert monthly["count"][column].tolist() == [2]
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from helper.ifrs15 import _largest_remainder, compute_ifrs15, parse_amount
+
+
+def per_group_largest_remainder(exact_cents, group, group_totals):
+    """Largest remainder per grup dengan loop biasa (referensi)."""
+    result = np.floor(exact_cents).astype(np.int64)
+    for g, total in enumerate(group_totals):
+        rows = [i for i in range(len(group)) if group[i] == g]
+        shortfall = total - sum(result[i] for i in rows)
+        # Sisa pecahan terbesar dulu, tie: urutan asli
+        ranked = sorted(rows, key=lambda i: (-(exact_cents[i] - np.floor(exact_cents[i])), i))
+        for i in ranked[:shortfall]:
+            result[i] += 1
+    return result
+
+
+def test_largest_remainder_matches_per_group_loop():
+    rng = np.random.default_rng(0)
+    group = np.sort(rng.integers(0, 40, size=300))
+    group_totals = rng.integers(1, 10**12, size=40)
+    weights = rng.random(300)
+    # Grup tanpa PO tidak ikut dibandingkan
+    present = np.bincount(group, minlength=40) > 0
+    group_totals = np.where(present, group_totals, 0)
+    weight_totals = np.bincount(group, weights=weights, minlength=40)
+    exact = group_totals[group] * weights / weight_totals[group]
+
+    rounded = _largest_remainder(exact, group, group_totals)
+
+    np.testing.assert_array_equal(rounded, per_group_largest_remainder(exact, group, group_totals))
+    np.testing.assert_array_equal(np.bincount(group, weights=rounded, minlength=40).astype(np.int64), group_totals)
+
+
+def test_largest_remainder_ties_follow_original_order():
+    # 100 sen dibagi tiga sama rata: sisa 1 sen ke PO pertama
+    exact = np.full(3, 100 / 3)
+    rounded = _largest_remainder(exact, np.zeros(3, dtype=np.int64), np.array([100]))
+    assert rounded.tolist() == [34, 33, 33]
+
+
+def test_schedule_sums_to_allocation_per_contract():
+    contracts = [
+        {
+            "contract_id": "K1",
+            "transaction_price": "Rp 1.000.000.000,-",
+            "start_date": "2024-01-15",
+            "end_date": "2024-12-31",
+            "performance_obligations": [
+                {"name": "Instalasi", "standalone_selling_price": "300 juta", "recognition": "point_in_time",
+                 "date": "2024-03-01"},
+                {"name": "Maintenance", "standalone_selling_price": "900 juta"},
+            ],
+        },
+        {"contract_id": "K2", "transaction_price": "1,2 M", "start_date": "2024-02-01", "end_date": "2025-01-31"},
+    ]
+    result = compute_ifrs15(contracts)
+    for contract, price in zip(result["contracts"], (1e9, 1.2e9)):
+        assert sum(a["allocated_price"] for a in contract["allocation"]) == pytest.approx(price, abs=0.001)
+        assert sum(contract["schedule"].values()) == pytest.approx(price, abs=0.001)
+    assert result["contracts"][0]["allocation"][0]["allocated_price"] == 250_000_000
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Rp 1.000.000.000,-", 1e9),
+    ("Rp 1.000.000.-", 1e6),
+    ("Rp 1.200.000.000,50", 1_200_000_000.5),
+    ("1,2 M", 1.2e9),
+    ("1,2 miliar", 1.2e9),
+    ("1.5 juta", 1.5e6),
+    ("IDR 500.000", 5e5),
+    ("Rp 500 ribu", 5e5),
+    ("750rb", 7.5e5),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("text", ["100 m", "10m2", "USD 500", "Rp 5 ribuan"])
+def test_parse_amount_rejects_unknown_units(text):
+    with pytest.raises(ValueError):
+        parse_amount(text)
@@ -1,14 +1,91 @@
 # utils.py
+import re
 import json
-from typing import Dict, Any, Union
+from typing import Dict, Any, Union, Optional
 from pathlib import Path
 import os
+import sys
+import time
+import types
+import importlib
+import threading
+
+try:
+    import orjson
+except ImportError:  # orjson opsional, fallback ke json standar
+    orjson = None
+
+
+# Waktu import (detik) saat proxy lazy_import pertama dipakai; None = belum pernah dipakai,
+# ~0 = modul sudah lebih dulu di-import jalur lain (mis. saat unpickle model)
+LAZY_IMPORT_TIMINGS: Dict[str, Optional[float]] = {}
+
+
+class _LazyModule(types.ModuleType):
+    """Proxy modul yang baru di-import saat atributnya pertama kali diakses."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(self.__name__)
+                LAZY_IMPORT_TIMINGS[self.__name__] = time.perf_counter() - started
+                self.__dict__["_lazy_module"] = module
+        return self._lazy_module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._lazy_module or self._load(), attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Import modul berat (pandas, numpy, PIL, httpx) secara lazy: import sebenarnya terjadi
+    saat atribut pertama dipakai, bukan saat modul pemanggil di-import.
+    Jika modul sudah selesai di-import, modul aslinya yang dikembalikan; modul yang masih
+    di-import thread lain (mis. warmup) tetap lewat proxy agar menunggu import-nya selesai.
+    """
+    module = sys.modules.get(name)
+    if module is not None and not getattr(getattr(module, "__spec__", None), "_initializing", False):
+        return module
+    LAZY_IMPORT_TIMINGS.setdefault(name, None)
+    return _LazyModule(name)
+
+
+def fast_json_loads(text: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
 
 def json_parse(json_str: str) -> Union[Dict[str, Any], str]:
     if isinstance(json_str, dict):
         return json_str
     if not isinstance(json_str, str):
         return str(json_str)
+    json_str = _strip_code_fence(json_str)
+    start = json_str.find("{")
+    end = json_str.rfind("}") + 1
+    if start == -1 or end <= start:
+        return json_str
+    try:
+        return fast_json_loads(json_str)
+    except ValueError:
+        return json_str
+
+
+def extract_first_json_object(text: str) -> Optional[Any]:
+    """
+    Objek JSON top-level pertama di dalam teks (mis. output LLM dengan teks pembuka/penutup),
+    None jika tidak ada. Berbeda dengan json_parse yang mengembalikan seluruh nilai JSON.
+    """
+    return StreamingJsonExtractor().feed(_strip_code_fence(text))
+
+
+def _strip_code_fence(json_str: str) -> str:
     json_str = json_str.strip()
     if json_str.startswith("```json"):
         json_str = json_str[7:].strip()
@@ -16,32 +93,121 @@ def json_parse(json_str: str) -> Union[Dict[str, Any], str]:
         json_str = json_str[3:].strip()
     if json_str.endswith("```"):
         json_str = json_str[:-3].strip()
-    start = json_str.find("{")
-    end = json_str.rfind("}") + 1
-    if start == -1 or end <= start:
-        return json_str
-    try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        return json_str
+    return json_str
+
+
+CHECKLIST_FILENAME_MAPPING = {
+    "BA Test Commissioning": "Berita Acara Commissioning Test BACT Document Content.txt",
+    "BA Test Commisioning": "Berita Acara Commissioning Test BACT Document Content.txt",
+    "Laporan 100% Waspang": "Laporan Pekerjaan Selesai 100.txt",
+    "BoQ hasil opname": "Lampiran Berita Acara Commissioning Test Bill of Quantity BoQ.txt",
+    "Hasil ukur OTDR": "Hasil Ukur OTDR.txt",
+    "Hasil ukur Power Meter": "Evidence Pengukuran OPM.txt"
+}
+
+def check_files_in_directory(list_ok, directory, fuzzy=False):
+    # Dijawab dari DocumentIndex (in-memory), bukan os.path.isfile per item
+    from helper.document_index import get_document_index
+    index = get_document_index(directory)
+    return index.check_checklist(list_ok, projects=[""], fuzzy=fuzzy)[""]
+
+
+_OUTSIDE_STRING = re.compile(r'["{}]')
+_INSIDE_STRING = re.compile(r'["\\]')
+
+
+class StreamingJsonExtractor:
+    """
+    Ekstraksi objek JSON top-level pertama dari teks yang datang bertahap (streaming).
+    Melacak kedalaman kurung kurawal dan status string, sehingga objek bisa langsung
+    di-decode begitu kurung penutupnya tiba, tanpa menunggu atau menscan ulang seluruh output.
+    """
+
+    def __init__(self, loads=fast_json_loads):
+        self._loads = loads
+        self._parts = []
+        self.depth = 0
+        self.in_string = False
+        self.started = False
+        self.complete = False
+        self.result: Optional[Any] = None
+        self._segment_start = 0
+        self._pending_escape = False
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """
+        Proses satu potongan teks. Return objek hasil decode jika objek sudah lengkap, else None.
+        """
+        if self.complete:
+            return self.result
+
+        pos = 0
+        n = len(chunk)
+        if self._pending_escape:
+            self._pending_escape = False
+            pos = 1
+        while pos < n:
+            if not self.started:
+                start = chunk.find("{", pos)
+                if start == -1:
+                    return None
+                self.started = True
+                self.depth = 1
+                self._segment_start = start
+                pos = start + 1
+                continue
+
+            if self.in_string:
+                m = _INSIDE_STRING.search(chunk, pos)
+                if m is None:
+                    break
+                if m.group() == "\\":
+                    # Lewati karakter yang di-escape (bisa jatuh di chunk berikutnya)
+                    if m.end() >= n:
+                        self._pending_escape = True
+                        pos = n
+                        break
+                    pos = m.end() + 1
+                    continue
+                self.in_string = False
+                pos = m.end()
+                continue
+
+            m = _OUTSIDE_STRING.search(chunk, pos)
+            if m is None:
+                break
+            ch = m.group()
+            pos = m.end()
+            if ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    self._parts.append(chunk[self._segment_start:pos])
+                    if self._finish():
+                        return self.result
+                    # Bukan JSON valid, cari objek berikutnya di sisa chunk
+                    continue
+
+        if self.started:
+            self._parts.append(chunk[self._segment_start:])
+            self._segment_start = 0
+        return None
 
-def check_files_in_directory(list_ok, directory):
-    filename_mapping = {
-        "BA Test Commissioning": "Berita Acara Commissioning Test BACT Document Content.txt",
-        "BA Test Commisioning": "Berita Acara Commissioning Test BACT Document Content.txt",
-        "Laporan 100% Waspang": "Laporan Pekerjaan Selesai 100.txt",
-        "BoQ hasil opname": "Lampiran Berita Acara Commissioning Test Bill of Quantity BoQ.txt",
-        "Hasil ukur OTDR": "Hasil Ukur OTDR.txt",
-        "Hasil ukur Power Meter": "Evidence Pengukuran OPM.txt"
-    }
-    directory = os.path.abspath(directory)
-    result = []
-    for item in list_ok:
-        expected_file = filename_mapping.get(item)
-        if expected_file is None:
-            result.append({"item": item, "exists": False, "note": "No mapping defined"})
-            continue
-        full_path = os.path.join(directory, expected_file)
-        found = os.path.isfile(full_path)
-        result.append({"item": item, "exists": found})
-    return result
\ No newline at end of file
+    def _finish(self) -> bool:
+        try:
+            self.result = self._loads(self.raw)
+            self.complete = True
+            return True
+        except ValueError:
+            self._parts = []
+            self.started = False
+            self.in_string = False
+            self.depth = 0
+            return False